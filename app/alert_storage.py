@@ -0,0 +1,341 @@
+"""
+Alert storage: monthly partitions on Postgres and the retention job.
+
+On Postgres the alerts table is partitioned by range of created_at, one
+partition per calendar month (alerts_yYYYYmMM) plus alerts_default for rows
+outside every range. Migration 0005 converts an existing table (see
+partition_alerts_table); AlertMaintenance keeps ALERT_PARTITION_MONTHS_AHEAD
+months of partitions ready and drops old ones once retention has emptied
+them. Feeds bound created_at (ALERT_FEED_DAYS) so the planner skips
+partitions outside the window. SQLite keeps one plain table.
+
+A unique index on a partitioned table must include created_at, so the
+one-alert-per-tourist-per-incident rule (uq_alerts_incident_tourist) is a
+unique index on each partition instead. It holds within a month; a fan-out
+re-run that straddles a month boundary is stopped by the outbox instead,
+which rolls back a superseded run (see fanout.py).
+
+Retention removes the alerts of incidents resolved more than
+ALERT_RETENTION_RESOLVED_DAYS ago and of tourists whose trip ended more than
+ALERT_RETENTION_TRIP_DAYS ago, copying them to alerts_archive first unless
+ALERT_ARCHIVE is off. It works in batches of ALERT_RETENTION_BATCH_SIZE rows,
+each its own short transaction that skips rows locked by other writers.
+"""
+import logging
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.schema import CreateIndex
+
+from config import (
+    ALERT_ARCHIVE,
+    ALERT_MAINTENANCE_INTERVAL_SECONDS,
+    ALERT_PARTITION_MONTHS_AHEAD,
+    ALERT_RETENTION_BATCH_SIZE,
+    ALERT_RETENTION_RESOLVED_DAYS,
+    ALERT_RETENTION_TRIP_DAYS,
+    MIGRATION_BATCH_SIZE,
+)
+from .alerts import feed_window_start
+from .database import SessionLocal, engine as default_engine
+from .etag import ALERTS, touch
+from .models import Alert, AlertArchive, Incident, TouristProfile
+from .utils import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Bounds one maintenance run; what is left over is picked up by the next one
+MAX_BATCHES_PER_RUN = 100
+PARTITION_NAME = re.compile(r"^alerts_y(\d{4})m(\d{2})$")
+# Alerts with no created_at sort here, into the default partition
+MISSING_CREATED_AT = datetime(1970, 1, 1)
+
+
+# ----------------------
+# Postgres partitions
+# ----------------------
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"alerts_y{month.year:04d}m{month.month:02d}"
+
+
+def create_partition(conn, month: date, parent: str = "alerts", unique: bool = True) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    if unique:
+        create_partition_unique_index(conn, partition_name(month))
+
+
+def create_partition_unique_index(conn, partition: str) -> None:
+    """uq_alerts_incident_tourist, on one partition."""
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {partition}_incident_tourist_key ON {partition} (incident_id, tourist_id)"
+    ))
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('alerts')")).scalar() == "p"
+
+
+def partition_tables(conn) -> List[str]:
+    """Every partition of alerts, the default one included."""
+    return list(conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('alerts')"
+    )).scalars())
+
+
+def monthly_partitions(conn) -> List[date]:
+    months = []
+    for name in partition_tables(conn):
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def partition_alerts_table(engine, batch_size: int = MIGRATION_BATCH_SIZE) -> None:
+    """
+    Replace a plain alerts table by a partitioned copy. Rows are copied in
+    keyset batches while the application keeps writing to the old table;
+    the final catch-up, read-flag resync and swap run in one transaction
+    holding an exclusive lock, which lasts only as long as that remainder.
+    """
+    columns = ", ".join(column.name for column in Alert.__table__.columns)
+    copied_columns = columns.replace("created_at", "COALESCE(created_at, :missing)")
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            return
+        oldest = conn.execute(text("SELECT min(created_at) FROM alerts")).scalar()
+
+    current = month_start(datetime.utcnow())
+    first = month_start(oldest) if oldest and oldest > MISSING_CREATED_AT else current
+    # The unique index goes on each partition once duplicates are gone (migration 0007)
+    indexes = [index for index in Alert.__table__.indexes if not index.unique]
+
+    with engine.begin() as conn:
+        # A copy left by an interrupted run is incomplete; the old table is still authoritative
+        conn.execute(text("DROP TABLE IF EXISTS alerts_partitioned"))
+        conn.execute(text("CREATE TABLE alerts_partitioned (LIKE alerts INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"))
+        # A partitioned table's unique keys must include the partition column
+        conn.execute(text("ALTER TABLE alerts_partitioned ADD CONSTRAINT alerts_partitioned_pkey PRIMARY KEY (alert_id, created_at)"))
+        conn.execute(text(
+            "ALTER TABLE alerts_partitioned ADD FOREIGN KEY (incident_id) "
+            "REFERENCES incidents (incident_id) ON DELETE CASCADE"
+        ))
+        conn.execute(text(
+            "ALTER TABLE alerts_partitioned ADD FOREIGN KEY (tourist_id) "
+            "REFERENCES tourist_profiles (tourist_id) ON DELETE CASCADE"
+        ))
+        month = first
+        while month <= add_months(current, ALERT_PARTITION_MONTHS_AHEAD):
+            create_partition(conn, month, parent="alerts_partitioned", unique=False)
+            month = add_months(month, 1)
+        conn.execute(text("CREATE TABLE alerts_partitioned_default PARTITION OF alerts_partitioned DEFAULT"))
+        for index in indexes:
+            # Built under a temporary name; the old table's index keeps the real one until the swap
+            ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+            conn.execute(text(ddl.replace(f"INDEX {index.name} ON alerts ",
+                                          f"INDEX {index.name}_p ON alerts_partitioned ", 1)))
+
+    copy_batch = text(
+        f"WITH batch AS (SELECT {copied_columns} FROM alerts "
+        f"WHERE (created_at, alert_id) > (:after_created, :after_id) "
+        f"ORDER BY created_at, alert_id LIMIT :limit) "
+        f"INSERT INTO alerts_partitioned ({columns}) SELECT * FROM batch RETURNING created_at, alert_id"
+    )
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"INSERT INTO alerts_partitioned ({columns}) SELECT {copied_columns} FROM alerts WHERE created_at IS NULL"
+        ), {"missing": MISSING_CREATED_AT})
+
+    def copy_after(conn, cursor):
+        while True:
+            keys = conn.execute(copy_batch, {"missing": MISSING_CREATED_AT, "after_created": cursor[0],
+                                             "after_id": cursor[1], "limit": batch_size}).all()
+            if not keys:
+                return cursor
+            cursor = max(keys)
+
+    cursor = (MISSING_CREATED_AT, "00000000-0000-0000-0000-000000000000")
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            keys = conn.execute(copy_batch, {"missing": MISSING_CREATED_AT, "after_created": cursor[0],
+                                             "after_id": cursor[1], "limit": batch_size}).all()
+        if not keys:
+            break
+        cursor = max(keys)
+        copied += len(keys)
+        logger.info("Copied %s alerts into the partitioned table", copied)
+
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE alerts IN ACCESS EXCLUSIVE MODE"))
+        copy_after(conn, cursor)
+        # Alerts only ever go from unread to read; carry over reads made during the copy
+        conn.execute(text(
+            "UPDATE alerts_partitioned AS p SET is_read = true FROM alerts AS a "
+            "WHERE NOT p.is_read AND a.is_read AND a.alert_id = p.alert_id"
+        ))
+        conn.execute(text("DROP TABLE alerts"))
+        conn.execute(text("ALTER TABLE alerts_partitioned RENAME TO alerts"))
+        conn.execute(text("ALTER TABLE alerts RENAME CONSTRAINT alerts_partitioned_pkey TO alerts_pkey"))
+        conn.execute(text("ALTER TABLE alerts_partitioned_default RENAME TO alerts_default"))
+        for index in indexes:
+            conn.execute(text(f"ALTER INDEX {index.name}_p RENAME TO {index.name}"))
+
+
+# ----------------------
+# Maintenance job
+# ----------------------
+class AlertMaintenance:
+    def __init__(self, session_factory=SessionLocal, engine=default_engine,
+                 interval: float = ALERT_MAINTENANCE_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.engine = engine
+        self._job = PeriodicJob("alert-maintenance", interval, self.run)
+        self._running = threading.Lock()
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+        self.expired = 0
+
+    def start(self) -> None:
+        self._job.start()
+
+    def stop(self) -> None:
+        self._job.stop()
+
+    def run(self) -> dict:
+        """One maintenance pass: partitions ahead, expired alerts, empty old partitions."""
+        if not self._running.acquire(blocking=False):
+            return {"skipped": "already running"}
+        try:
+            started = datetime.utcnow()
+            summary = {"started_at": started.isoformat(), "partitions_created": [], "expired": {},
+                       "partitions_dropped": []}
+            partitioned = self.engine.dialect.name == "postgresql" and self._partitioned()
+            if partitioned:
+                summary["partitions_created"] = self.ensure_partitions(started)
+            summary["expired"] = self.expire_alerts(started)
+            if partitioned:
+                summary["partitions_dropped"] = self.drop_empty_partitions(started)
+            self.runs += 1
+            self.last_run = summary
+            if any(summary["expired"].values()) or summary["partitions_dropped"]:
+                logger.info("Alert maintenance: %s", summary)
+            return summary
+        finally:
+            self._running.release()
+
+    def _partitioned(self) -> bool:
+        with self.engine.connect() as conn:
+            return is_partitioned(conn)
+
+    def ensure_partitions(self, now: datetime) -> List[str]:
+        current = month_start(now)
+        with self.engine.connect() as conn:
+            existing = set(monthly_partitions(conn))
+        created = []
+        for offset in range(ALERT_PARTITION_MONTHS_AHEAD + 1):
+            month = add_months(current, offset)
+            if month in existing:
+                continue
+            try:
+                with self.engine.begin() as conn:
+                    create_partition(conn, month)
+                created.append(partition_name(month))
+            except Exception:
+                # Fails if alerts_default already holds rows for that month; they stay there
+                logger.exception("Could not create alert partition %s", partition_name(month))
+        return created
+
+    def drop_empty_partitions(self, now: datetime) -> List[str]:
+        """Drop monthly partitions that ended before the feed window and retention have emptied."""
+        horizon = feed_window_start(now)
+        if horizon is None:
+            return []
+        dropped = []
+        with self.engine.connect() as conn:
+            months = monthly_partitions(conn)
+        for month in months:
+            if add_months(month, 1) > horizon.date():
+                break
+            name = partition_name(month)
+            with self.engine.begin() as conn:
+                if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is not None:
+                    continue
+                conn.execute(text(f"ALTER TABLE alerts DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        return dropped
+
+    def expire_alerts(self, now: datetime) -> Dict[str, int]:
+        rules = []
+        if ALERT_RETENTION_RESOLVED_DAYS > 0:
+            resolved_before = now - timedelta(days=ALERT_RETENTION_RESOLVED_DAYS)
+            rules.append(("incident_resolved", Alert.incident_id.in_(
+                select(Incident.incident_id).where(Incident.status == "Resolved",
+                                                   Incident.updated_at < resolved_before)
+            )))
+        if ALERT_RETENTION_TRIP_DAYS > 0:
+            trip_ended_before = (now - timedelta(days=ALERT_RETENTION_TRIP_DAYS)).date()
+            rules.append(("trip_ended", Alert.tourist_id.in_(
+                select(TouristProfile.tourist_id).where(TouristProfile.trip_end < trip_ended_before)
+            )))
+
+        expired = {}
+        batches = 0
+        for reason, condition in rules:
+            expired[reason] = 0
+            while batches < MAX_BATCHES_PER_RUN:
+                count = self._expire_batch(reason, condition, now)
+                batches += 1
+                expired[reason] += count
+                if count < ALERT_RETENTION_BATCH_SIZE:
+                    break
+        self.expired += sum(expired.values())
+        return expired
+
+    def _expire_batch(self, reason: str, condition, now: datetime) -> int:
+        alerts = Alert.__table__
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(alerts).where(condition).limit(ALERT_RETENTION_BATCH_SIZE).with_for_update(skip_locked=True)
+            ).mappings().all()
+            if not rows:
+                return 0
+            if ALERT_ARCHIVE:
+                db.execute(insert(AlertArchive.__table__),
+                           [{**row, "archived_at": now, "reason": reason} for row in rows])
+            removal = delete(alerts).where(alerts.c.alert_id.in_([row["alert_id"] for row in rows]))
+            created = [row["created_at"] for row in rows if row["created_at"] is not None]
+            if len(created) == len(rows):
+                # Lets Postgres delete from the partitions these rows are in only
+                removal = removal.where(alerts.c.created_at.between(min(created), max(created)))
+            db.execute(removal)
+            touch(db, ALERTS)
+            db.commit()
+            return len(rows)
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "expired_total": self.expired, "last_run": self.last_run}
+
+
+alert_maintenance = AlertMaintenance()
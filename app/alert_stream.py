@@ -0,0 +1,228 @@
+"""
+Server-Sent Events delivery of new alerts to connected tourists.
+
+Each open stream registers a Subscriber holding a bounded queue (see sse).
+Alerts reach it in two ways:
+
+- Code that writes alerts in this process stages them on its session
+  (stage_alerts). They are published when that session commits and dropped
+  if it rolls back.
+- Alerts written by another worker process are picked up by a poller, which
+  reads recent alerts for the tourists connected here every
+  ALERT_STREAM_POLL_SECONDS.
+
+Subscribers remember which alert ids they have queued or sent, so an alert
+seen both ways, or by several polls, is delivered once. A client that falls
+ALERT_STREAM_BUFFER events behind is disconnected instead of buffered
+without bound. It then reconnects with Last-Event-ID and resumes from the
+database.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import asc, tuple_
+from sqlalchemy.orm import Session
+
+from config import (
+    ALERT_STREAM_BUFFER,
+    ALERT_STREAM_HEARTBEAT_SECONDS,
+    ALERT_STREAM_LOOKBACK_SECONDS,
+    ALERT_STREAM_POLL_SECONDS,
+)
+from .database import SessionLocal
+from .models import Alert
+from .pagination import encode_cursor
+from .sse import RETRY_HINT, EventStream, Subscriber
+from .utils import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+RESUME_PAGE_SIZE = 500
+SEEN_IDS_REMEMBERED = 4096
+
+
+def alert_event(alert_id, incident_id, title, category, distance_km, status, created_at) -> dict:
+    """An alert as sent on the stream: AlertResponse's fields plus the resume cursor."""
+    return {
+        "cursor": encode_cursor(created_at, alert_id),
+        "alert_id": str(alert_id),
+        "incident_id": str(incident_id),
+        "title": title,
+        "category": category,
+        "distance": distance_km,
+        "status": status,
+        "created_at": created_at.isoformat()
+    }
+
+
+class TouristSubscriber(Subscriber):
+    def __init__(self, tourist_id: str, loop: asyncio.AbstractEventLoop, buffer_size: int):
+        super().__init__(loop, buffer_size)
+        self.tourist_id = tourist_id
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def accepts(self, alert: dict) -> bool:
+        return self.first_sight(alert["alert_id"])
+
+    def first_sight(self, alert_id: str) -> bool:
+        """True the first time an alert id is queued or sent on this connection."""
+        if alert_id in self._seen:
+            return False
+        self._seen[alert_id] = None
+        if len(self._seen) > SEEN_IDS_REMEMBERED:
+            self._seen.popitem(last=False)
+        return True
+
+
+class AlertStream(EventStream):
+    def __init__(self, buffer_size: int = ALERT_STREAM_BUFFER, heartbeat: float = ALERT_STREAM_HEARTBEAT_SECONDS,
+                 poll_interval: float = ALERT_STREAM_POLL_SECONDS, lookback: float = ALERT_STREAM_LOOKBACK_SECONDS):
+        super().__init__(buffer_size, heartbeat)
+        self.lookback = lookback
+        self._subscribers: Dict[str, Set[TouristSubscriber]] = {}
+        self._poller = PeriodicJob("alert-stream-poller", poll_interval, self.poll_recent)
+        self.resumed = 0
+
+    def start(self) -> None:
+        self._poller.start()
+
+    def stop(self) -> None:
+        self._poller.stop()
+
+    # ----------------------
+    # Subscriptions
+    # ----------------------
+    def subscribe(self, tourist_id) -> TouristSubscriber:
+        subscriber = TouristSubscriber(str(tourist_id), asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(subscriber.tourist_id, set()).add(subscriber)
+            self.opened += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: TouristSubscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.tourist_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.tourist_id]
+            self.closed += 1
+
+    def is_subscribed(self, tourist_id) -> bool:
+        return str(tourist_id) in self._subscribers
+
+    def publish(self, alerts: List[Tuple[object, dict]]) -> None:
+        """Hand (tourist_id, alert event) pairs to their subscribers; safe from any thread."""
+        with self._lock:
+            targets = [(subscriber, alert) for tourist_id, alert in alerts
+                       for subscriber in self._subscribers.get(str(tourist_id), ())]
+        for subscriber, alert in targets:
+            subscriber.deliver(alert)
+
+    def format_event(self, alert: dict) -> str:
+        data = {key: value for key, value in alert.items() if key != "cursor"}
+        return f"id: {alert['cursor']}\nevent: alert\ndata: {json.dumps(data)}\n\n"
+
+    # ----------------------
+    # Database reads
+    # ----------------------
+    def load_since(self, tourist_id, after: Tuple[datetime, object], limit: int = RESUME_PAGE_SIZE) -> List[dict]:
+        """Alerts for tourist_id created after the (created_at, alert_id) cursor, oldest first."""
+        from .alerts import alert_listing_query
+        db = SessionLocal()
+        try:
+            rows = (
+                alert_listing_query(db)
+                .filter(Alert.tourist_id == tourist_id, tuple_(Alert.created_at, Alert.alert_id) > tuple_(*after))
+                .order_by(asc(Alert.created_at), asc(Alert.alert_id))
+                .limit(limit)
+                .all()
+            )
+            return [alert_event(*row) for row in rows]
+        finally:
+            db.close()
+
+    def poll_recent(self) -> None:
+        """Publish recent alerts for tourists connected here, including ones written by other processes."""
+        from .alerts import alert_listing_query
+        tourist_ids = list(self._subscribers)
+        if not tourist_ids:
+            return
+        since = datetime.utcnow() - timedelta(seconds=self.lookback)
+        db = SessionLocal()
+        try:
+            for start in range(0, len(tourist_ids), 500):
+                chunk = [UUID(key) for key in tourist_ids[start:start + 500]]
+                rows = (
+                    alert_listing_query(db)
+                    .add_columns(Alert.tourist_id)
+                    .filter(Alert.tourist_id.in_(chunk), Alert.created_at >= since)
+                    .order_by(asc(Alert.created_at), asc(Alert.alert_id))
+                    .all()
+                )
+                self.publish([(row.tourist_id, alert_event(*row[:7])) for row in rows])
+        finally:
+            db.close()
+
+    # ----------------------
+    # Streaming
+    # ----------------------
+    async def events(self, tourist_id, after: Optional[Tuple[datetime, object]] = None):
+        """SSE text for one connection: the backlog after `after`, then live alerts and heartbeats."""
+        subscriber = self.subscribe(tourist_id)
+        try:
+            yield RETRY_HINT
+            if after is not None:
+                self.resumed += 1
+                while True:
+                    backlog = await asyncio.to_thread(self.load_since, tourist_id, after)
+                    for alert in backlog:
+                        if subscriber.first_sight(alert["alert_id"]):
+                            self.events_sent += 1
+                            yield self.format_event(alert)
+                    if len(backlog) < RESUME_PAGE_SIZE:
+                        break
+                    after = (datetime.fromisoformat(backlog[-1]["created_at"]), UUID(backlog[-1]["alert_id"]))
+
+            # Until it overflows; the client then resumes from its Last-Event-ID
+            async for chunk in self.live(subscriber):
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = sum(len(subscribers) for subscribers in self._subscribers.values())
+            tourists = len(self._subscribers)
+        return {
+            "active_connections": active,
+            "connected_tourists": tourists,
+            "opened": self.opened,
+            "closed": self.closed,
+            "resumed": self.resumed,
+            "overflow_disconnects": self.overflow_disconnects,
+            "events_sent": self.events_sent,
+            "buffer_size": self.buffer_size,
+        }
+
+
+alert_stream = AlertStream()
+
+
+# ----------------------
+# Publishing on commit
+# ----------------------
+def stage_alerts(db: Session, rows: List[dict], title: str, category: str, status: str) -> None:
+    """Queue freshly inserted alert rows for connected tourists; they are published when db commits."""
+    staged = [
+        (row["tourist_id"], alert_event(row["alert_id"], row["incident_id"], title, category,
+                                        row["distance_km"], status, row["created_at"]))
+        for row in rows if alert_stream.is_subscribed(row["tourist_id"])
+    ]
+    alert_stream.stage_events(db, staged)
@@ -0,0 +1,163 @@
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import false, func, tuple_
+from sqlalchemy.orm import Session
+
+from config import ALERT_FEED_DAYS, ALERT_INSERT_CHUNK_SIZE, ALERT_RADIUS_KM
+from .alert_stream import stage_alerts
+from .database import dialect_insert
+from .etag import ALERTS, touch
+from .geo import parse_coordinates
+from .locations import find_nearby_tourists, get_location
+from .models import Alert, Incident
+
+
+def alert_listing_query(db: Session):
+    """Alerts joined to their incident, selecting only the columns AlertResponse needs."""
+    return db.query(
+        Alert.alert_id,
+        Alert.incident_id,
+        Incident.title,
+        Incident.category,
+        Alert.distance_km,
+        Incident.status,
+        Alert.created_at
+    ).join(Incident, Incident.incident_id == Alert.incident_id)
+
+
+def feed_window_start(now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Oldest created_at alert feeds return unless asked for more (None when
+    ALERT_FEED_DAYS is 0). The bound lets Postgres skip older partitions.
+    """
+    if ALERT_FEED_DAYS <= 0:
+        return None
+    # Whole days, so the window (and the feeds' ETags) move once a day
+    start = (now or datetime.utcnow()) - timedelta(days=ALERT_FEED_DAYS)
+    return datetime(start.year, start.month, start.day)
+
+
+# ----------------------
+# Read state
+# ----------------------
+# Badge counts stop here ("999+"), so a huge backlog costs no more than this many index entries
+UNREAD_COUNT_CAP = 999
+
+
+def unread_alerts(db: Session, tourist_id):
+    # Matches the ix_alerts_unread_tourist predicate, so only unread index entries are scanned
+    return db.query(Alert).filter(Alert.tourist_id == tourist_id, Alert.is_read == false())
+
+
+def count_unread(db: Session, tourist_id, cap: int = UNREAD_COUNT_CAP) -> Tuple[int, bool]:
+    """(unread alerts up to cap, whether there are more than cap)."""
+    query = unread_alerts(db, tourist_id)
+    window_start = feed_window_start()
+    if window_start is not None:
+        # Same window as the unread feed, so the badge matches what the list shows
+        query = query.filter(Alert.created_at >= window_start)
+    capped = query.with_entities(Alert.alert_id).limit(cap + 1).subquery()
+    count = db.query(func.count()).select_from(capped).scalar()
+    return min(count, cap), count > cap
+
+
+def mark_read(db: Session, tourist_id, up_to_alert_id=None) -> Optional[int]:
+    """
+    Mark the tourist's unread alerts as read, all of them or those no newer
+    than up_to_alert_id in feed order. Returns the number marked, or None if
+    up_to_alert_id is not one of the tourist's alerts. The caller commits.
+    """
+    query = unread_alerts(db, tourist_id)
+    if up_to_alert_id is not None:
+        bound = db.query(Alert.created_at, Alert.alert_id).filter(
+            Alert.alert_id == up_to_alert_id, Alert.tourist_id == tourist_id
+        ).first()
+        if bound is None:
+            return None
+        query = query.filter(tuple_(Alert.created_at, Alert.alert_id) <= tuple_(*bound))
+    marked = query.update({Alert.is_read: True}, synchronize_session=False)
+    if marked:
+        touch(db, ALERTS)  # the authority feed shows is_read
+    return marked
+
+
+def incident_origin(db: Session, incident: Incident):
+    """Where an incident happened: its own coordinates, else the reporter's last known position."""
+    coords = parse_coordinates(incident.latitude, incident.longitude)
+    if coords is None:
+        coords = get_location(db, incident.tourist_id)
+    return coords
+
+
+def insert_alerts(db: Session, incident_id, recipients: Iterable[Tuple[object, float]],
+                  chunk_size: Optional[int] = None, on_rows: Optional[Callable[[List[dict]], None]] = None) -> int:
+    """
+    Bulk-insert one alert per (tourist_id, distance_km) recipient.
+
+    Rows go through Core executemany in chunks of chunk_size, skipping ORM
+    object construction and the identity map, so memory stays bounded by
+    one chunk however many recipients there are. Tourists who already have
+    an alert for the incident are skipped. on_rows, if given, sees the rows
+    of each chunk that were written. Returns the number of rows written; the
+    caller commits.
+    """
+    chunk_size = chunk_size or ALERT_INSERT_CHUNK_SIZE
+    created_at = datetime.utcnow()
+    statement = dialect_insert(db, Alert.__table__)
+    upsert = statement is not None
+    if upsert:
+        # No conflict target: on Postgres the unique index lives on each partition
+        statement = statement.on_conflict_do_nothing().returning(Alert.alert_id)
+    else:
+        statement = Alert.__table__.insert()
+    recipients = iter(recipients)
+
+    alerts_created = 0
+    while True:
+        rows = [
+            {
+                "alert_id": uuid.uuid4(),
+                "incident_id": incident_id,
+                "tourist_id": tourist_id,
+                "distance_km": round(distance, 3),
+                "is_read": False,
+                "created_at": created_at,
+            }
+            for tourist_id, distance in islice(recipients, chunk_size)
+        ]
+        if not rows:
+            break
+        if upsert:
+            written = set(db.execute(statement, rows).scalars())
+            if len(written) < len(rows):
+                rows = [row for row in rows if row["alert_id"] in written]
+        else:
+            db.execute(statement, rows)
+        if on_rows is not None and rows:
+            on_rows(rows)
+        alerts_created += len(rows)
+    if alerts_created:
+        touch(db, ALERTS)
+    return alerts_created
+
+
+def create_proximity_alerts(db: Session, incident: Incident, radius_km: Optional[float] = None) -> int:
+    """
+    Alert every tourist within radius_km of the incident, carrying the real
+    distance. Returns the number of alerts written; the caller commits.
+    """
+    origin = incident_origin(db, incident)
+    if origin is None:
+        return 0
+
+    radius_km = ALERT_RADIUS_KM if radius_km is None else radius_km
+    recipients = find_nearby_tourists(db, origin[0], origin[1], radius_km,
+                                      exclude_tourist_id=incident.tourist_id)
+    # Tourists with an open alert stream get these once the caller commits
+    def stage(rows):
+        stage_alerts(db, rows, incident.title, incident.category, incident.status)
+
+    return insert_alerts(db, incident.incident_id, recipients, on_rows=stage)
@@ -0,0 +1,74 @@
+"""
+Async variants of the API routers, used when DB_MODE=async.
+
+Every route that depends on get_db is re-registered with an async endpoint
+that receives an AsyncSession and runs the original handler through
+AsyncSession.run_sync. Inside run_sync SQLAlchemy drives the async driver
+from a greenlet, so database waits yield to the event loop instead of
+occupying a threadpool thread, while the handler logic stays in one place
+for both modes. Other blocking waits in handlers must be greenlet-aware the
+same way (see PasswordHasher). Routes without a database dependency are
+kept as they are.
+"""
+import functools
+import inspect
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import get_async_db, get_db
+
+
+def _db_parameter(endpoint):
+    for parameter in inspect.signature(endpoint).parameters.values():
+        if getattr(parameter.default, "dependency", None) is get_db:
+            return parameter.name
+    return None
+
+
+def async_endpoint(endpoint):
+    name = _db_parameter(endpoint)
+    if name is None:
+        return endpoint
+
+    signature = inspect.signature(endpoint)
+    parameters = [
+        parameter.replace(default=Depends(get_async_db), annotation=AsyncSession) if parameter.name == name else parameter
+        for parameter in signature.parameters.values()
+    ]
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        db = kwargs.pop(name)
+        return await db.run_sync(lambda session: endpoint(**kwargs, **{name: session}))
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
+
+
+def async_router(router: APIRouter) -> APIRouter:
+    converted = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            converted.routes.append(route)
+            continue
+        converted.add_api_route(
+            route.path,
+            async_endpoint(route.endpoint),
+            methods=route.methods,
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=route.tags,
+            dependencies=route.dependencies,
+            summary=route.summary,
+            description=route.description,
+            response_description=route.response_description,
+            responses=route.responses,
+            deprecated=route.deprecated,
+            operation_id=route.operation_id,
+            include_in_schema=route.include_in_schema,
+            response_class=route.response_class,
+            name=route.name,
+        )
+    return converted
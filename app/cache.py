@@ -0,0 +1,178 @@
+"""
+Read-through cache for tourist and authority profiles.
+
+Profiles are read by primary key on nearly every tourist request. ProfileCache
+keeps plain-dict snapshots of them, including "not found" answers, in a
+pluggable backend. The default is an in-process LRU with a TTL. Writers must
+call the matching invalidate_* method after committing. Other uvicorn workers
+have their own cache and see the change once their entry expires, which
+PROFILE_CACHE_TTL_SECONDS bounds.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from sqlalchemy.orm import Session
+
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS
+from .models import AuthorityProfile, TouristProfile
+
+_MISSING = object()  # cached "no such profile"
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: Hashable):
+        """Return the cached value, or None on a miss."""
+
+    @abstractmethod
+    def set(self, key: Hashable, value) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LRUTTLCache(CacheBackend):
+    """Thread-safe LRU holding at most max_entries values, each for at most ttl seconds."""
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "lru-ttl",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def tourist_snapshot(profile: TouristProfile) -> dict:
+    return {
+        "tourist_id": str(profile.tourist_id),
+        "full_name": profile.full_name,
+        "document_type": profile.document_type,
+        "document_number": profile.document_number,
+        "nationality": profile.nationality,
+        "trip_start": profile.trip_start,
+        "trip_end": profile.trip_end,
+        "emergency_contact_name": profile.emergency_contact_name,
+        "emergency_contact_phone": profile.emergency_contact_phone,
+        "blockchain_id": profile.blockchain_id,
+        "safety_score": profile.safety_score
+    }
+
+
+def authority_snapshot(profile: AuthorityProfile) -> dict:
+    return {
+        "authority_id": str(profile.authority_id),
+        "full_name": profile.full_name,
+        "department": profile.department,
+        "designation": profile.designation,
+        "contact_number": profile.contact_number
+    }
+
+
+class ProfileCache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        # Bumped on every invalidation; a load that raced with a write is not cached
+        self._generation = 0
+
+    def _read_through(self, key, load) -> Optional[dict]:
+        cached = self.backend.get(key)
+        if cached is not None:
+            return None if cached is _MISSING else dict(cached)
+
+        generation = self._generation
+        value = load()
+        if generation == self._generation:
+            self.backend.set(key, _MISSING if value is None else value)
+        return None if value is None else dict(value)
+
+    def get_tourist(self, db: Session, tourist_id) -> Optional[dict]:
+        def load():
+            profile = db.query(TouristProfile).filter(TouristProfile.tourist_id == tourist_id).first()
+            return tourist_snapshot(profile) if profile else None
+        return self._read_through(("tourist", str(tourist_id)), load)
+
+    def get_authority(self, db: Session, authority_id) -> Optional[dict]:
+        def load():
+            profile = db.query(AuthorityProfile).filter(AuthorityProfile.authority_id == authority_id).first()
+            return authority_snapshot(profile) if profile else None
+        return self._read_through(("authority", str(authority_id)), load)
+
+    def tourist_exists(self, db: Session, tourist_id) -> bool:
+        return self.get_tourist(db, tourist_id) is not None
+
+    def invalidate_tourist(self, tourist_id) -> None:
+        self._generation += 1
+        self.backend.delete(("tourist", str(tourist_id)))
+
+    def invalidate_authority(self, authority_id) -> None:
+        self._generation += 1
+        self.backend.delete(("authority", str(authority_id)))
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+
+profile_cache = ProfileCache(LRUTTLCache())
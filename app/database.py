@@ -1,8 +1,26 @@
 import os
+import statistics
+import threading
+import time
+from collections import deque
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from config import (
+    ASYNC_DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_MODE,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+from .query_profiler import query_profiler
 
 load_dotenv()
 
@@ -12,7 +30,104 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set.")
 
-engine = create_engine(DATABASE_URL)
+if DB_MODE not in ("sync", "async"):
+    raise ValueError("DB_MODE must be 'sync' or 'async'.")
+
+
+# ----------------------
+# Connection pool
+# ----------------------
+class PoolStats:
+    """Checkout counters for one engine's pool; wait percentiles cover the last `window` checkouts."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, timeouts, total, longest = self.checkouts, self.timeouts, self.wait_total, self.wait_max
+
+        def ms(seconds):
+            return round(seconds * 1000, 3)
+
+        return {
+            "checkouts": checkouts,
+            "checkout_timeouts": timeouts,
+            "wait_ms_avg": ms(total / checkouts) if checkouts else None,
+            "wait_ms_max": ms(longest),
+            "wait_ms_p50": ms(statistics.median(recent)) if recent else None,
+            "wait_ms_p99": ms(recent[int(0.99 * (len(recent) - 1))]) if recent else None,
+        }
+
+
+def instrumented_pool(base, stats: PoolStats):
+    """
+    Subclass of a QueuePool class that times every checkout, i.e. the wait for
+    a free connection plus pre-ping or connect, and counts checkout timeouts.
+    Pool.recreate() rebuilds from self.__class__, so stats survive a dispose().
+    """
+    class InstrumentedPool(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except exc.TimeoutError:
+                stats.record(time.perf_counter() - start, timed_out=True)
+                raise
+            stats.record(time.perf_counter() - start)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def pool_options(url: str, base, stats: PoolStats) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}  # in-memory SQLite needs its single-connection pool
+    return {
+        "poolclass": instrumented_pool(base, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_status(engine, stats: PoolStats) -> dict:
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),  # negative while below pool_size
+            "timeout_seconds": DB_POOL_TIMEOUT,
+        })
+    status.update(stats.snapshot())
+    return status
+
+
+pool_stats = PoolStats()
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, QueuePool, pool_stats))
+query_profiler.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -21,4 +136,58 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def dialect_insert(db, table):
+    """INSERT into table with ON CONFLICT support for db's dialect, or None where it has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+# ----------------------
+# Async mode (DB_MODE=async)
+# ----------------------
+# Background workers and migrations keep using the sync engine above, so
+# async mode needs both drivers installed (e.g. psycopg2 and asyncpg).
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..., sqlite://... -> sqlite+aiosqlite://..."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}; set ASYNC_DATABASE_URL.")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+async_pool_stats = PoolStats()
+
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **pool_options(_async_url, AsyncAdaptedQueuePool, async_pool_stats))
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+    query_profiler.install(async_engine.sync_engine)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def database_pool_status() -> dict:
+    status = {"sync": pool_status(engine, pool_stats)}
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine.sync_engine, async_pool_stats)
+    return status
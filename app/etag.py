@@ -0,0 +1,70 @@
+"""
+Conditional GET for the polled feeds.
+
+Writers bump a version counter per collection, in stat_counters under the
+"version" dimension and in the same transaction as the write:
+"incidents" on every incident create or change, "alerts" on every alert
+insert, expiry or read. The incident feeds' ETag is built from those counters.
+So is the authority alert feed's, since it shows incident titles and status
+and each alert's read state.
+A tourist's alert feed is validated by an aggregate over their own alerts
+instead (count, newest, unread, and the latest updated_at of the incidents
+they were alerted about), so neither fan-outs to other tourists nor changes
+to other incidents invalidate it. A poll whose If-None-Match still matches
+is answered 304 after that lookup alone, without loading or serializing
+any rows.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Response
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from .models import Alert, Incident, StatCounter
+from .statistics import VERSION, apply_deltas
+
+INCIDENTS = "incidents"  # also bumped by statistics.record_incident_*
+ALERTS = "alerts"
+
+
+def touch(db: Session, *collections: str) -> None:
+    """Bump the version of each collection (caller commits). Best called late, as the row is shared."""
+    apply_deltas(db, {(VERSION, collection): 1 for collection in collections})
+
+
+def collection_versions(db: Session) -> Dict[str, int]:
+    return dict(db.query(StatCounter.key, StatCounter.count).filter(StatCounter.dimension == VERSION).all())
+
+
+def tourist_alerts_state(db: Session, tourist_id, since) -> tuple:
+    """(alerts, newest created_at, unread, newest incident change) of the tourist's feed window."""
+    query = db.query(
+        func.count(), func.max(Alert.created_at), func.sum(case((Alert.is_read.is_(False), 1), else_=0)),
+        func.max(Incident.updated_at)
+    ).join(Incident, Incident.incident_id == Alert.incident_id).filter(Alert.tourist_id == tourist_id)
+    if since is not None:
+        query = query.filter(Alert.created_at >= since)
+    return tuple(query.one())
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2s(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison: W/ prefixes are ignored
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified(response: Response, etag: str, if_none_match: Optional[str]) -> Optional[Response]:
+    """A 304 to return if the client holds etag; otherwise tag the response and return None."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # store, but revalidate every time
+    if _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
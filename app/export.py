@@ -0,0 +1,188 @@
+"""
+Streaming bulk export of incidents and alerts.
+
+Rows are read through a server-side cursor (yield_per, which turns on
+stream_results with psycopg2) in chunks of EXPORT_CHUNK_ROWS. Each chunk is
+encoded and handed to the response before the next is fetched, so memory
+stays at one chunk however many rows match. Only columns are selected, never
+ORM entities, so the session's identity map stays empty. Formats: NDJSON,
+CSV, and Parquet (one row group per chunk) when pyarrow is installed.
+
+An export holds one pooled connection for as long as the client keeps
+reading.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from config import EXPORT_CHUNK_ROWS
+from .database import SessionLocal
+from .models import Alert, Incident, TouristProfile
+from .pagination import IncidentFilters
+from .responses import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (name, column, type) per exported field; the type drives CSV text and the Parquet schema
+Field = Tuple[str, object, str]
+
+INCIDENT_FIELDS: List[Field] = [
+    ("incident_id", Incident.incident_id, "uuid"),
+    ("created_at", Incident.created_at, "timestamp"),
+    ("updated_at", Incident.updated_at, "timestamp"),
+    ("title", Incident.title, "string"),
+    ("description", Incident.description, "string"),
+    ("category", Incident.category, "string"),
+    ("status", Incident.status, "string"),
+    ("priority", Incident.priority, "string"),
+    ("latitude", Incident.latitude, "float"),
+    ("longitude", Incident.longitude, "float"),
+    ("tourist_id", Incident.tourist_id, "uuid"),
+    ("tourist_name", TouristProfile.full_name, "string"),
+    ("tourist_nationality", TouristProfile.nationality, "string"),
+    ("emergency_contact_name", TouristProfile.emergency_contact_name, "string"),
+    ("emergency_contact_phone", TouristProfile.emergency_contact_phone, "string"),
+]
+
+ALERT_FIELDS: List[Field] = [
+    ("alert_id", Alert.alert_id, "uuid"),
+    ("created_at", Alert.created_at, "timestamp"),
+    ("incident_id", Alert.incident_id, "uuid"),
+    ("incident_title", Incident.title, "string"),
+    ("incident_category", Incident.category, "string"),
+    ("incident_status", Incident.status, "string"),
+    ("tourist_id", Alert.tourist_id, "uuid"),
+    ("distance_km", Alert.distance_km, "float"),
+    ("is_read", Alert.is_read, "bool"),
+]
+
+
+def incident_export(filters: IncidentFilters, status: Optional[str]):
+    statement = select(*[column for _, column, _ in INCIDENT_FIELDS]).outerjoin(
+        TouristProfile, TouristProfile.tourist_id == Incident.tourist_id
+    )
+    if status:
+        statement = statement.where(Incident.status == status)
+    statement = filters.apply(statement)
+    return INCIDENT_FIELDS, statement.order_by(Incident.created_at, Incident.incident_id)
+
+
+def alert_export(filters: IncidentFilters, status: Optional[str]):
+    statement = select(*[column for _, column, _ in ALERT_FIELDS]).join(
+        Incident, Incident.incident_id == Alert.incident_id
+    )
+    if status:
+        statement = statement.where(Incident.status == status)
+    statement = filters.apply(statement, created_column=Alert.created_at)
+    return ALERT_FIELDS, statement.order_by(Alert.created_at, Alert.alert_id)
+
+
+# ----------------------
+# Encoders: one bytes chunk per row chunk
+# ----------------------
+def _text(value, kind: str) -> str:
+    if value is None:
+        return ""
+    if kind == "timestamp":
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson(fields: List[Field], chunks) -> Iterator[bytes]:
+    names = [name for name, _, _ in fields]
+    for rows in chunks:
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+
+def _csv(fields: List[Field], chunks) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in fields])
+    kinds = [kind for _, _, kind in fields]
+    for rows in chunks:
+        writer.writerows([_text(value, kind) for value, kind in zip(row, kinds)] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # header of an empty export
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _parquet(fields: List[Field], chunks) -> Iterator[bytes]:
+    types = {"uuid": pyarrow.string(), "string": pyarrow.string(), "float": pyarrow.float64(),
+             "bool": pyarrow.bool_(), "timestamp": pyarrow.timestamp("us")}
+    schema = pyarrow.schema([(name, types[kind]) for name, _, kind in fields])
+    sink = _Drain()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = [
+                pyarrow.array([None if value is None else str(value) for value in values] if kind == "uuid"
+                              else list(values), type=types[kind])
+                for values, (_, _, kind) in zip(columns, fields)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    yield sink.take()  # footer
+
+
+def check_format(export_format: str) -> str:
+    if export_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Must be one of: {', '.join(FORMATS)}")
+    if export_format == "parquet" and pyarrow is None:
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow installed on the server")
+    return FORMATS[export_format]
+
+
+def stream_export(fields: List[Field], statement, export_format: str) -> Iterator[bytes]:
+    """Encoded chunks of the statement's rows; opens and closes its own session."""
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        encode = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}[export_format]
+        for data in encode(fields, result.partitions()):
+            if data:
+                yield data
+    finally:
+        db.close()
+
+
+def export_filename(name: str, export_format: str) -> str:
+    return f"{name}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{export_format}"
@@ -0,0 +1,450 @@
+"""
+Background alert fan-out for SOS incidents.
+
+send_sos commits the incident together with an outbox entry and returns; the
+pipeline's worker threads then generate the proximity alerts. The outbox is
+pluggable: DatabaseOutbox (default) keeps jobs in the fanout_jobs table so
+pending work survives a restart and is shared between uvicorn workers, while
+MemoryOutbox is a non-durable stand-in for single-process runs.
+
+A job whose worker holds it past FANOUT_CLAIM_TIMEOUT_SECONDS is handed to
+another worker, though the first may still be running. Every claim bumps the
+job's attempts, and a run may only complete or fail the job under the attempt
+it claimed: a superseded run rolls its alerts back. The unique index on
+(incident_id, tourist_id) keeps the two runs from alerting a tourist twice
+meanwhile.
+
+Backpressure: the in-memory queue is bounded. When it is full a job simply
+stays in the outbox and the poller enqueues it once workers free up, so an
+SOS is never rejected because the broadcast backlog is long.
+"""
+import logging
+import queue
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from config import (
+    FANOUT_CLAIM_TIMEOUT_SECONDS,
+    FANOUT_MAX_ATTEMPTS,
+    FANOUT_OUTBOX,
+    FANOUT_POLL_INTERVAL_SECONDS,
+    FANOUT_QUEUE_SIZE,
+    FANOUT_RETRY_BACKOFF_SECONDS,
+    FANOUT_WORKERS,
+)
+from .alerts import create_proximity_alerts
+from .database import SessionLocal
+from .models import FanoutJob, Incident
+
+logger = logging.getLogger(__name__)
+
+
+def _job_summary(job_id, incident_id, status, attempts, alerts_created, last_error, created_at, completed_at, now):
+    finished = completed_at or now
+    return {
+        "job_id": str(job_id),
+        "incident_id": str(incident_id),
+        "status": status,
+        "attempts": attempts,
+        "alerts_created": alerts_created,
+        "last_error": last_error,
+        "created_at": created_at,
+        "completed_at": completed_at,
+        "lag_seconds": round((finished - created_at).total_seconds(), 3),
+    }
+
+
+# ----------------------
+# Outboxes
+# ----------------------
+class Outbox(ABC):
+    """Storage for fan-out jobs. Jobs move Pending -> Running -> Done, or back to Pending for a retry, or Failed."""
+
+    @abstractmethod
+    def add(self, db: Session, incident_id) -> uuid.UUID:
+        """Record a job in the caller's transaction."""
+
+    @abstractmethod
+    def due(self, limit: int) -> List[uuid.UUID]:
+        """Pending jobs whose retry time has passed, oldest first."""
+
+    @abstractmethod
+    def claim(self, job_id) -> Optional[Tuple[uuid.UUID, int]]:
+        """Mark a pending job Running; returns (incident_id, attempts), or None if another worker got it first."""
+
+    @abstractmethod
+    def complete(self, db: Session, job_id, attempts: int, alerts_created: int) -> bool:
+        """
+        Mark a job Done in the same transaction that wrote its alerts. False if
+        the job is no longer Running under this attempt (it was released and
+        claimed again); the caller must then roll back.
+        """
+
+    def committed(self, job_id, attempts: int, alerts_created: int) -> None:
+        """The transaction that completed the job has committed; outboxes outside the database mark it Done now."""
+
+    @abstractmethod
+    def fail(self, job_id, attempts: int, error: str, retry_at: Optional[datetime]) -> None:
+        """Reschedule a job for retry_at, or mark it Failed when retry_at is None; ignored if superseded."""
+
+    @abstractmethod
+    def release_stale(self, older_than: datetime) -> int:
+        """Return Running jobs claimed before older_than (their worker died) to Pending."""
+
+    @abstractmethod
+    def backlog(self) -> int:
+        ...
+
+    @abstractmethod
+    def jobs(self, limit: int, incident_id=None) -> List[dict]:
+        ...
+
+
+class DatabaseOutbox(Outbox):
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def add(self, db, incident_id):
+        job = FanoutJob(job_id=uuid.uuid4(), incident_id=incident_id)
+        db.add(job)
+        return job.job_id
+
+    def due(self, limit):
+        db = self.session_factory()
+        try:
+            rows = db.query(FanoutJob.job_id).filter(
+                FanoutJob.status == "Pending",
+                FanoutJob.available_at <= datetime.utcnow()
+            ).order_by(FanoutJob.available_at).limit(limit).all()
+            return [row.job_id for row in rows]
+        finally:
+            db.close()
+
+    def claim(self, job_id):
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(FanoutJob)
+                .where(FanoutJob.job_id == job_id, FanoutJob.status == "Pending")
+                .values(status="Running", attempts=FanoutJob.attempts + 1, claimed_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            return tuple(db.query(FanoutJob.incident_id, FanoutJob.attempts).filter(FanoutJob.job_id == job_id).one())
+        finally:
+            db.close()
+
+    def complete(self, db, job_id, attempts, alerts_created):
+        return db.execute(
+            update(FanoutJob)
+            .where(FanoutJob.job_id == job_id, FanoutJob.status == "Running", FanoutJob.attempts == attempts)
+            .values(status="Done", alerts_created=alerts_created, last_error=None, completed_at=datetime.utcnow())
+        ).rowcount > 0
+
+    def fail(self, job_id, attempts, error, retry_at):
+        values = {"last_error": error[:2000]}
+        if retry_at is None:
+            values.update(status="Failed", completed_at=datetime.utcnow())
+        else:
+            values.update(status="Pending", available_at=retry_at)
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(FanoutJob)
+                .where(FanoutJob.job_id == job_id, FanoutJob.status == "Running", FanoutJob.attempts == attempts)
+                .values(**values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def release_stale(self, older_than):
+        db = self.session_factory()
+        try:
+            released = db.execute(
+                update(FanoutJob)
+                .where(FanoutJob.status == "Running", FanoutJob.claimed_at < older_than)
+                .values(status="Pending", available_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+            return released
+        finally:
+            db.close()
+
+    def backlog(self):
+        db = self.session_factory()
+        try:
+            return db.query(FanoutJob).filter(FanoutJob.status.in_(["Pending", "Running"])).count()
+        finally:
+            db.close()
+
+    def jobs(self, limit, incident_id=None):
+        db = self.session_factory()
+        try:
+            query = db.query(
+                FanoutJob.job_id, FanoutJob.incident_id, FanoutJob.status, FanoutJob.attempts,
+                FanoutJob.alerts_created, FanoutJob.last_error, FanoutJob.created_at, FanoutJob.completed_at
+            )
+            if incident_id is not None:
+                query = query.filter(FanoutJob.incident_id == incident_id)
+            rows = query.order_by(FanoutJob.created_at.desc()).limit(limit).all()
+        finally:
+            db.close()
+        now = datetime.utcnow()
+        return [_job_summary(*row, now=now) for row in rows]
+
+
+class MemoryOutbox(Outbox):
+    """Keeps jobs in process memory; pending work is lost on restart."""
+
+    def __init__(self, max_finished: int = 1000):
+        self._jobs: Dict[uuid.UUID, dict] = {}
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def add(self, db, incident_id):
+        job_id = uuid.uuid4()
+        now = datetime.utcnow()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id, "incident_id": incident_id, "status": "Pending", "attempts": 0,
+                "alerts_created": None, "last_error": None, "available_at": now, "claimed_at": None,
+                "created_at": now, "completed_at": None,
+            }
+            self._prune()
+        return job_id
+
+    def _prune(self):
+        # Forget the oldest finished jobs once more than max_finished are kept
+        finished = [job for job in self._jobs.values() if job["status"] in ("Done", "Failed")]
+        if len(finished) > self.max_finished:
+            finished.sort(key=lambda job: job["completed_at"])
+            for job in finished[:len(finished) - self.max_finished]:
+                del self._jobs[job["job_id"]]
+
+    def due(self, limit):
+        now = datetime.utcnow()
+        with self._lock:
+            pending = [job for job in self._jobs.values() if job["status"] == "Pending" and job["available_at"] <= now]
+        pending.sort(key=lambda job: job["available_at"])
+        return [job["job_id"] for job in pending[:limit]]
+
+    def claim(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "Pending":
+                return None
+            job.update(status="Running", attempts=job["attempts"] + 1, claimed_at=datetime.utcnow())
+            return job["incident_id"], job["attempts"]
+
+    def _current(self, job_id, attempts) -> Optional[dict]:
+        # The job, if it is still Running under this attempt (caller holds the lock)
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != "Running" or job["attempts"] != attempts:
+            return None
+        return job
+
+    def complete(self, db, job_id, attempts, alerts_created):
+        # Done only in committed(): if the alerts fail to commit, fail() still finds the job Running
+        with self._lock:
+            return self._current(job_id, attempts) is not None
+
+    def committed(self, job_id, attempts, alerts_created):
+        with self._lock:
+            job = self._current(job_id, attempts)
+            if job is not None:
+                job.update(status="Done", alerts_created=alerts_created, last_error=None,
+                           completed_at=datetime.utcnow())
+
+    def fail(self, job_id, attempts, error, retry_at):
+        with self._lock:
+            job = self._current(job_id, attempts)
+            if job is None:
+                return
+            job["last_error"] = error[:2000]
+            if retry_at is None:
+                job.update(status="Failed", completed_at=datetime.utcnow())
+            else:
+                job.update(status="Pending", available_at=retry_at)
+
+    def release_stale(self, older_than):
+        released = 0
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "Running" and job["claimed_at"] < older_than:
+                    job.update(status="Pending", available_at=datetime.utcnow())
+                    released += 1
+        return released
+
+    def backlog(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ("Pending", "Running"))
+
+    def jobs(self, limit, incident_id=None):
+        now = datetime.utcnow()
+        with self._lock:
+            selected = [dict(job) for job in self._jobs.values()
+                        if incident_id is None or str(job["incident_id"]) == str(incident_id)]
+        selected.sort(key=lambda job: job["created_at"], reverse=True)
+        return [
+            _job_summary(job["job_id"], job["incident_id"], job["status"], job["attempts"], job["alerts_created"],
+                         job["last_error"], job["created_at"], job["completed_at"], now=now)
+            for job in selected[:limit]
+        ]
+
+
+# ----------------------
+# Pipeline
+# ----------------------
+class FanoutPipeline:
+    def __init__(self, outbox: Outbox, workers: int = FANOUT_WORKERS, queue_size: int = FANOUT_QUEUE_SIZE,
+                 max_attempts: int = FANOUT_MAX_ATTEMPTS, retry_backoff: float = FANOUT_RETRY_BACKOFF_SECONDS,
+                 poll_interval: float = FANOUT_POLL_INTERVAL_SECONDS,
+                 claim_timeout: float = FANOUT_CLAIM_TIMEOUT_SECONDS, session_factory=SessionLocal):
+        self.outbox = outbox
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.session_factory = session_factory
+        self._queue: "queue.Queue[uuid.UUID]" = queue.Queue(maxsize=queue_size)
+        self._tracked = set()  # job ids queued or running in this process
+        self._tracked_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.deferred = 0
+        self.processed = 0
+        self.failed = 0
+        self.superseded = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"fanout-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        poller = threading.Thread(target=self._poll, name="fanout-poller", daemon=True)
+        poller.start()
+        self._threads.append(poller)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, db: Session, incident_id) -> uuid.UUID:
+        """Record a fan-out job in the caller's transaction. Call submit() after committing."""
+        return self.outbox.add(db, incident_id)
+
+    def submit(self, job_id) -> bool:
+        """Hand a committed job to the workers; False if the queue is full and the poller will pick it up later."""
+        with self._tracked_lock:
+            if job_id in self._tracked:
+                return True
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                self.deferred += 1
+                return False
+            self._tracked.add(job_id)
+            return True
+
+    def status(self, incident_id=None, limit: int = 50) -> dict:
+        return {
+            "workers": self.workers,
+            "running": bool(self._threads),
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "in_flight": len(self._tracked) - self._queue.qsize(),
+            "backlog": self.outbox.backlog(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "superseded": self.superseded,
+            "deferred": self.deferred,
+            "jobs": self.outbox.jobs(limit, incident_id),
+        }
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                stale_before = datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+                self.outbox.release_stale(stale_before)
+                free = self._queue.maxsize - self._queue.qsize()
+                if free > 0:
+                    for job_id in self.outbox.due(free):
+                        if not self.submit(job_id):
+                            break
+            except Exception:
+                logger.exception("Fan-out poller failed")
+            self._stop.wait(self.poll_interval)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job_id)
+            finally:
+                with self._tracked_lock:
+                    self._tracked.discard(job_id)
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        claimed = self.outbox.claim(job_id)
+        if claimed is None:
+            return
+        incident_id, attempts = claimed
+
+        db = self.session_factory()
+        try:
+            incident = db.query(Incident).filter(Incident.incident_id == incident_id).first()
+            alerts_created = create_proximity_alerts(db, incident) if incident else 0
+            if not self.outbox.complete(db, job_id, attempts, alerts_created):
+                # Released as stale and claimed again; that run's alerts stand
+                db.rollback()
+                self.superseded += 1
+                logger.warning("Fan-out job %s attempt %s was superseded; its alerts were discarded", job_id, attempts)
+                return
+            db.commit()
+            self.outbox.committed(job_id, attempts, alerts_created)
+            self.processed += 1
+        except Exception as exc:
+            db.rollback()
+            self._retry(job_id, attempts, exc)
+        finally:
+            db.close()
+
+    def _retry(self, job_id, attempts, exc):
+        logger.warning("Fan-out job %s failed (attempt %s): %s", job_id, attempts, exc)
+        retry_at = None
+        if attempts < self.max_attempts:
+            delay = self.retry_backoff * (2 ** (attempts - 1))
+            retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        else:
+            self.failed += 1
+        try:
+            self.outbox.fail(job_id, attempts, repr(exc), retry_at)
+        except Exception:
+            logger.exception("Could not reschedule fan-out job %s", job_id)
+
+
+def _build_outbox() -> Outbox:
+    if FANOUT_OUTBOX == "memory":
+        return MemoryOutbox()
+    return DatabaseOutbox()
+
+
+fanout_pipeline = FanoutPipeline(_build_outbox())
@@ -0,0 +1,237 @@
+"""
+Incident heatmap served from geohash rollups.
+
+incident_tiles holds one count per (geohash cell, day, category, priority,
+status), with cells at HEATMAP_MAX_PRECISION. Creating an incident adds one
+to its tile and a status or priority change moves the count to the new key,
+in the same transaction as the write, like the statistics counters. A map at
+a coarser precision groups on the geohash prefix, so the endpoint sums a few
+thousand rollup rows instead of scanning incidents.
+
+The time window is applied by whole UTC days: since and until select the
+days they fall on. Incidents without coordinates are not on the map.
+reconcile() recomputes the tiles from incidents and fixes any drift; it runs
+periodically and on demand, and seeds the table on existing databases.
+"""
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from config import HEATMAP_DAYS, HEATMAP_MAX_PRECISION, HEATMAP_MAX_TILES, HEATMAP_RECONCILE_INTERVAL_SECONDS
+from .database import SessionLocal, dialect_insert
+from .etag import INCIDENTS, touch
+from .geo import geohash_bounds, geohash_cover, geohash_encode, parse_coordinates
+from .models import Incident, IncidentTile
+from .pagination import IncidentFilters
+from .utils import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+TileKey = Tuple[str, date, str, str, str]  # (geohash, day, category, priority, status)
+TileDeltas = Dict[TileKey, int]
+
+RECONCILE_CHUNK_ROWS = 5000
+
+
+def tile_key(latitude, longitude, created_at, category, priority, status) -> Optional[TileKey]:
+    coords = parse_coordinates(latitude, longitude)
+    if coords is None:
+        return None
+    day = (created_at or datetime.utcnow()).date()
+    return geohash_encode(*coords, HEATMAP_MAX_PRECISION), day, category, priority, status
+
+
+def _incident_key(incident: Incident, **changes) -> Optional[TileKey]:
+    values = {
+        "latitude": incident.latitude, "longitude": incident.longitude, "created_at": incident.created_at,
+        "category": incident.category, "priority": incident.priority, "status": incident.status,
+    }
+    values.update(changes)
+    return tile_key(**values)
+
+
+def apply_tile_deltas(db: Session, deltas: TileDeltas) -> None:
+    """Add each delta to its tile with a single upsert."""
+    # Tiles are locked in key order, as in statistics.apply_deltas, so opposite
+    # moves between the same two tiles cannot deadlock
+    rows = [{"geohash": key[0], "day": key[1], "category": key[2], "priority": key[3], "status": key[4], "count": delta}
+            for key, delta in sorted(item for item in deltas.items() if item[1] and item[0] is not None)]
+    if not rows:
+        return
+
+    statement = dialect_insert(db, IncidentTile)
+    if statement is None:
+        for row in rows:
+            tile = db.get(IncidentTile, (row["geohash"], row["day"], row["category"], row["priority"], row["status"]))
+            if tile is None:
+                db.add(IncidentTile(**row))
+            else:
+                tile.count += row["count"]
+        return
+
+    statement = statement.values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[IncidentTile.geohash, IncidentTile.day, IncidentTile.category,
+                        IncidentTile.priority, IncidentTile.status],
+        set_={"count": IncidentTile.count + statement.excluded["count"]},
+    )
+    db.execute(statement)
+
+
+def _move(db: Session, old: Optional[TileKey], new: Optional[TileKey]) -> None:
+    if old == new:
+        return
+    deltas: Counter = Counter()
+    if old is not None:
+        deltas[old] -= 1
+    if new is not None:
+        deltas[new] += 1
+    apply_tile_deltas(db, deltas)
+
+
+def record_incident_created(db: Session, incident: Incident) -> None:
+    """Call after the incident is flushed, so its defaults are populated."""
+    _move(db, None, _incident_key(incident))
+
+
+def record_incident_changed(db: Session, incident: Incident, field: str, old_value, new_value) -> None:
+    """Call before the new value is assigned; field is 'status' or 'priority'."""
+    _move(db, _incident_key(incident, **{field: old_value}), _incident_key(incident, **{field: new_value}))
+
+
+def record_incident_moved(db: Session, incident: Incident, latitude, longitude) -> None:
+    """An incident's position changes (repeated SOS); call before the new position is assigned."""
+    _move(db, _incident_key(incident), _incident_key(incident, latitude=latitude, longitude=longitude))
+
+
+# ----------------------
+# Reading
+# ----------------------
+def _last_day(until: datetime) -> date:
+    # until is exclusive: midnight ends the previous day
+    return (until - timedelta(microseconds=1)).date()
+
+
+def _intersects(bounds, bbox) -> bool:
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if bounds[2] < min_lat or bounds[0] > max_lat:
+        return False
+    if min_lon <= max_lon:
+        return bounds[3] >= min_lon and bounds[1] <= max_lon
+    return bounds[3] >= min_lon or bounds[1] <= max_lon  # box crosses the antimeridian
+
+
+def get_heatmap(db: Session, precision: int, filters: IncidentFilters, status: Optional[str]) -> dict:
+    """
+    Incident counts per geohash tile of the given precision, busiest first.
+    With a bounding box, every tile that intersects it is returned whole.
+    """
+    since = filters.since.date() if filters.since else datetime.utcnow().date() - timedelta(days=HEATMAP_DAYS - 1)
+    cell = func.substr(IncidentTile.geohash, 1, precision)
+    query = db.query(cell, func.sum(IncidentTile.count)).filter(IncidentTile.day >= since)
+    if filters.until:
+        query = query.filter(IncidentTile.day <= _last_day(filters.until))
+    if filters.category:
+        query = query.filter(IncidentTile.category == filters.category)
+    if filters.priority:
+        query = query.filter(IncidentTile.priority == filters.priority)
+    if status:
+        query = query.filter(IncidentTile.status == status)
+    if filters.bbox:
+        # Candidate cells from a coarse cover of the box, trimmed to the box below
+        cover = geohash_cover(*filters.bbox, precision)
+        query = query.filter(func.substr(IncidentTile.geohash, 1, len(cover[0])).in_(cover))
+
+    tiles = []
+    for geohash, count in query.group_by(cell).all():
+        if not count:
+            continue
+        bounds = geohash_bounds(geohash)
+        if filters.bbox and not _intersects(bounds, filters.bbox):
+            continue
+        tiles.append({
+            "geohash": geohash,
+            "count": int(count),
+            "latitude": (bounds[0] + bounds[2]) / 2,
+            "longitude": (bounds[1] + bounds[3]) / 2,
+            "bounds": list(bounds),
+        })
+    tiles.sort(key=lambda tile: (-tile["count"], tile["geohash"]))
+
+    return {
+        "precision": precision,
+        "since": since.isoformat(),
+        "until": _last_day(filters.until).isoformat() if filters.until else None,
+        "total": sum(tile["count"] for tile in tiles),
+        "truncated": len(tiles) > HEATMAP_MAX_TILES,
+        "tiles": tiles[:HEATMAP_MAX_TILES],
+    }
+
+
+# ----------------------
+# Reconciliation
+# ----------------------
+def reconcile(db: Session) -> TileDeltas:
+    """
+    Recompute every tile from incidents and correct the stored counts.
+    Returns the corrections applied (empty when nothing had drifted).
+    The caller commits.
+    """
+    expected: Counter = Counter()
+    rows = db.execute(
+        Incident.__table__.select()
+        .with_only_columns(Incident.latitude, Incident.longitude, Incident.created_at,
+                           Incident.category, Incident.priority, Incident.status)
+        .where(Incident.latitude.isnot(None), Incident.longitude.isnot(None))
+        .execution_options(yield_per=RECONCILE_CHUNK_ROWS)
+    )
+    for row in rows:
+        key = tile_key(*row)
+        if key is not None:
+            expected[key] += 1
+
+    stored = {
+        (geohash, day, category, priority, status): count
+        for geohash, day, category, priority, status, count in db.query(
+            IncidentTile.geohash, IncidentTile.day, IncidentTile.category,
+            IncidentTile.priority, IncidentTile.status, IncidentTile.count
+        )
+    }
+    corrections = {}
+    for key in set(expected) | set(stored):
+        drift = expected.get(key, 0) - stored.get(key, 0)
+        if drift:
+            corrections[key] = drift
+    apply_tile_deltas(db, corrections)
+    # Tiles at zero only cost space
+    db.query(IncidentTile).filter(IncidentTile.count == 0).delete(synchronize_session=False)
+    if corrections:
+        touch(db, INCIDENTS)
+    return corrections
+
+
+def reconcile_now() -> TileDeltas:
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # Same snapshot for stored and recomputed counts; see statistics.reconcile_now
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        corrections = reconcile(db)
+        db.commit()
+        if corrections:
+            logger.warning("Corrected %d drifted heatmap tiles", len(corrections))
+        return corrections
+    except OperationalError:
+        db.rollback()
+        logger.info("Heatmap reconciliation skipped after a serialization conflict")
+        return {}
+    finally:
+        db.close()
+
+
+heatmap_reconciler = PeriodicJob("heatmap-reconciler", HEATMAP_RECONCILE_INTERVAL_SECONDS, reconcile_now)
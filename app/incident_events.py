@@ -0,0 +1,293 @@
+"""
+Incident lifecycle events for authority dashboards: created, status changed,
+priority changed and moved (a repeated SOS), each carrying only what changed.
+
+Writers stage events on their session (stage_incident_created,
+stage_incident_changed, stage_incident_moved); nothing is delivered unless the session commits.
+With the Postgres bus the event is a pg_notify() in the writer's own
+transaction, and every worker process LISTENs on the channel from a
+dedicated connection, so a dashboard attached to any worker sees incidents
+written by all of them. The memory bus publishes on commit to this process
+only, for SQLite, single-worker and test runs.
+
+A dashboard that falls INCIDENT_STREAM_BUFFER events behind is disconnected,
+and every stream receives a "resync" event after the listener reconnects; in
+both cases events may have been missed, so the client reloads the first page
+of /api/authority/incidents and carries on from the stream.
+"""
+import asyncio
+import json
+import logging
+import re
+import select
+import threading
+from datetime import datetime
+from typing import List, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import (
+    INCIDENT_EVENT_BUS,
+    INCIDENT_EVENT_CHANNEL,
+    INCIDENT_STREAM_BUFFER,
+    INCIDENT_STREAM_HEARTBEAT_SECONDS,
+)
+from .database import engine
+from .sse import RETRY_HINT, EventStream, Subscriber
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_CHARS = 1000  # dashboards show a preview; the full text is on the incident
+# Postgres rejects NOTIFY payloads of 8000 bytes or more, failing the writer's transaction
+NOTIFY_PAYLOAD_BYTES = 7900
+LISTEN_POLL_SECONDS = 1.0
+RECONNECT_BACKOFF_MAX_SECONDS = 30.0
+
+
+def _timestamp(value) -> str:
+    return (value or datetime.utcnow()).isoformat()
+
+
+def incident_created_event(incident) -> dict:
+    """A new incident: IncidentResponse's fields, with the description clipped."""
+    return {
+        "type": "incident.created",
+        "incident_id": str(incident.incident_id),
+        "tourist_id": str(incident.tourist_id),
+        "title": incident.title,
+        "description": (incident.description or "")[:DESCRIPTION_CHARS],
+        "category": incident.category,
+        "latitude": incident.latitude,
+        "longitude": incident.longitude,
+        "status": incident.status,
+        "priority": incident.priority,
+        "created_at": _timestamp(incident.created_at)
+    }
+
+
+def incident_changed_event(incident, field: str, previous: str, value: str) -> dict:
+    """A status or priority change: the new value and the one it replaced."""
+    return {
+        "type": f"incident.{field}_changed",
+        "incident_id": str(incident.incident_id),
+        field: value,
+        "previous": previous,
+        "updated_at": _timestamp(incident.updated_at)
+    }
+
+
+def incident_moved_event(incident) -> dict:
+    """A repeated SOS moved the incident or replaced its description."""
+    return {
+        "type": "incident.moved",
+        "incident_id": str(incident.incident_id),
+        "description": (incident.description or "")[:DESCRIPTION_CHARS],
+        "latitude": incident.latitude,
+        "longitude": incident.longitude,
+        "updated_at": _timestamp(incident.updated_at)
+    }
+
+
+def notify_payload(incident_event: dict, limit: int = NOTIFY_PAYLOAD_BYTES) -> str:
+    """
+    The event as JSON of at most limit bytes, clipping the description and
+    then the title if needed (and marking the event "truncated"). json.dumps
+    escapes everything outside ASCII, so the length of the text is its size
+    in bytes in any server encoding; one character can take 12.
+    """
+    payload = json.dumps(incident_event)
+    for field in ("description", "title"):
+        if len(payload) <= limit:
+            break
+        text_value = incident_event.get(field)
+        if not text_value:
+            continue
+        # Longest prefix that fits, found by bisection; the empty prefix is tried last
+        incident_event = {**incident_event, "truncated": True}
+        keep, too_long = 0, len(text_value)
+        while keep + 1 < too_long:
+            middle = (keep + too_long) // 2
+            if len(json.dumps({**incident_event, field: text_value[:middle]})) <= limit:
+                keep = middle
+            else:
+                too_long = middle
+        incident_event[field] = text_value[:keep]
+        payload = json.dumps(incident_event)
+    return payload
+
+
+class IncidentEventBus(EventStream):
+    def __init__(self, backend: str = INCIDENT_EVENT_BUS, channel: str = INCIDENT_EVENT_CHANNEL,
+                 buffer_size: int = INCIDENT_STREAM_BUFFER, heartbeat: float = INCIDENT_STREAM_HEARTBEAT_SECONDS):
+        if backend == "auto":
+            backend = "postgres" if engine.dialect.name == "postgresql" else "memory"
+        if backend not in ("postgres", "memory"):
+            raise ValueError("INCIDENT_EVENT_BUS must be 'auto', 'postgres' or 'memory'.")
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", channel):
+            raise ValueError("INCIDENT_EVENT_CHANNEL must be a lower-case SQL identifier.")
+        super().__init__(buffer_size, heartbeat)
+        self.backend = backend
+        self.channel = channel
+        self._subscribers: Set[Subscriber] = set()
+        self._stop = threading.Event()
+        self._listener = None
+        self.listening = False
+        self.reconnects = 0
+        self.received = 0
+
+    def start(self) -> None:
+        if self.backend != "postgres" or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="incident-event-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=LISTEN_POLL_SECONDS * 5)
+            self._listener = None
+
+    # ----------------------
+    # Publishing
+    # ----------------------
+    def stage(self, db: Session, incident_event: dict) -> None:
+        """Deliver incident_event to every dashboard once db commits."""
+        if self.backend == "postgres":
+            # NOTIFY is transactional: Postgres sends it on commit and drops it on rollback
+            db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                       {"channel": self.channel, "payload": notify_payload(incident_event)})
+        elif self._subscribers:
+            self.stage_events(db, [incident_event])
+
+    def publish(self, incident_events: List[dict]) -> None:
+        """Hand events to this process's subscribers; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for incident_event in incident_events:
+                if not subscriber.deliver(incident_event):
+                    break
+
+    def format_event(self, incident_event: dict) -> str:
+        return f"event: {incident_event['type']}\ndata: {json.dumps(incident_event)}\n\n"
+
+    # ----------------------
+    # Postgres listener
+    # ----------------------
+    def _connect(self):
+        # A connection of its own, outside the pool: it stays checked out for the life of the process
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.connect(*cargs, **cparams)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        connected_before = False
+        while not self._stop.is_set():
+            try:
+                connection = self._connect()
+            except Exception:
+                logger.exception("Incident event listener could not connect; retrying in %.0fs", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX_SECONDS)
+                continue
+
+            backoff = 1.0
+            self.listening = True
+            if connected_before:
+                # Anything sent while we were disconnected is lost; tell dashboards to reload
+                self.reconnects += 1
+                self.publish([{"type": "resync", "at": _timestamp(None)}])
+            connected_before = True
+            try:
+                idle = 0.0
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        idle += LISTEN_POLL_SECONDS
+                        if idle >= self.heartbeat:
+                            # Surfaces a dead connection, which select() alone never reports
+                            with connection.cursor() as cursor:
+                                cursor.execute("SELECT 1")
+                            idle = 0.0
+                        continue
+                    idle = 0.0
+                    connection.poll()
+                    received = []
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            received.append(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning("Ignoring malformed incident event: %.200s", notify.payload)
+                    self.received += len(received)
+                    self.publish(received)
+            except Exception:
+                logger.exception("Incident event listener lost its connection")
+            finally:
+                self.listening = False
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    # ----------------------
+    # Streaming
+    # ----------------------
+    async def events(self):
+        """SSE text for one dashboard connection: live incident events and heartbeats."""
+        subscriber = Subscriber(asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self.opened += 1
+        try:
+            yield RETRY_HINT
+            # Until it overflows; the client then reloads and reconnects
+            async for chunk in self.live(subscriber):
+                yield chunk
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+                self.closed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = len(self._subscribers)
+        return {
+            "backend": self.backend,
+            "listening": self.listening if self.backend == "postgres" else None,
+            "listener_reconnects": self.reconnects,
+            "notifications_received": self.received,
+            "active_connections": active,
+            "opened": self.opened,
+            "closed": self.closed,
+            "overflow_disconnects": self.overflow_disconnects,
+            "events_sent": self.events_sent,
+            "buffer_size": self.buffer_size,
+        }
+
+
+incident_events = IncidentEventBus()
+
+
+# ----------------------
+# Staging from write paths
+# ----------------------
+def stage_incident_created(db: Session, incident) -> None:
+    """Call after the incident is flushed, so its defaults are populated."""
+    incident_events.stage(db, incident_created_event(incident))
+
+
+def stage_incident_changed(db: Session, incident, field: str, previous: str, value: str) -> None:
+    if previous != value:
+        incident_events.stage(db, incident_changed_event(incident, field, previous, value))
+
+
+def stage_incident_moved(db: Session, incident) -> None:
+    """Call after the new position and description are assigned."""
+    incident_events.stage(db, incident_moved_event(incident))
+
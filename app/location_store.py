@@ -0,0 +1,244 @@
+"""
+In-memory latest positions from location heartbeats, flushed in batches.
+
+Heartbeats arrive far more often than anything reads positions, so the
+heartbeat endpoint only records the latest fix per tourist here, with no
+database round trip. Positions live in parallel arrays (latitude, longitude,
+time) indexed by a slot per tourist, about 24 bytes per tourist plus the id.
+Every LOCATION_FLUSH_INTERVAL_SECONDS the positions changed since the last
+flush are upserted into tourist_locations in chunks, one statement per
+chunk, and never over a newer row written by PUT /location or another
+worker. Tourists silent for LOCATION_STALE_SECONDS are evicted, so memory
+follows the number of active tourists, capped by LOCATION_STORE_MAX_TOURISTS.
+
+Proximity queries read tourist_locations, so they see a heartbeat within one
+flush interval. get_location() in this process sees it at once.
+"""
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from config import (
+    LOCATION_FLUSH_BATCH_SIZE,
+    LOCATION_FLUSH_INTERVAL_SECONDS,
+    LOCATION_STALE_SECONDS,
+    LOCATION_STORE_MAX_TOURISTS,
+)
+from .database import SessionLocal, dialect_insert
+from .models import TouristLocation
+from .utils import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+
+class LocationStoreFull(Exception):
+    pass
+
+
+def _upsert(db, rows: List[dict]) -> None:
+    """Insert or update tourist_locations rows, keeping any row that is already newer."""
+    statement = dialect_insert(db, TouristLocation)
+    if statement is None:
+        for row in rows:
+            location = db.get(TouristLocation, row["tourist_id"])
+            if location is None:
+                db.add(TouristLocation(**row))
+            elif location.updated_at is None or location.updated_at < row["updated_at"]:
+                location.latitude, location.longitude = row["latitude"], row["longitude"]
+                location.updated_at = row["updated_at"]
+        return
+
+    statement = statement.values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TouristLocation.tourist_id],
+        set_={
+            "latitude": statement.excluded.latitude,
+            "longitude": statement.excluded.longitude,
+            "updated_at": statement.excluded.updated_at,
+        },
+        where=(TouristLocation.updated_at.is_(None)) | (TouristLocation.updated_at < statement.excluded.updated_at),
+    )
+    db.execute(statement)
+
+
+class LocationStore:
+    def __init__(self, session_factory=SessionLocal, capacity: int = LOCATION_STORE_MAX_TOURISTS,
+                 stale_seconds: float = LOCATION_STALE_SECONDS, interval: float = LOCATION_FLUSH_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.stale_seconds = stale_seconds
+        self._slots: Dict[object, int] = {}
+        self._ids: List[object] = []
+        self._lat = array("d")
+        self._lon = array("d")
+        self._at = array("d")  # time.time() of the latest fix
+        self._dirty: Set[int] = set()  # slots changed since the last flush
+        self._lock = threading.Lock()  # held for in-memory work only, never across I/O
+        self._job = PeriodicJob("location-flush", interval, self.flush)
+        self._next_eviction = 0.0
+        self.pings = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.last_flush_ms = None
+
+    def start(self) -> None:
+        self._job.start()
+
+    def stop(self) -> None:
+        self._job.stop()
+        try:
+            self.flush()  # do not lose the last interval's fixes on shutdown
+        except Exception:
+            logger.exception("Final location flush failed")
+
+    def knows(self, tourist_id) -> bool:
+        return tourist_id in self._slots
+
+    def update(self, tourist_id, latitude: float, longitude: float) -> None:
+        now = time.time()
+        with self._lock:
+            slot = self._slots.get(tourist_id)
+            if slot is None:
+                if len(self._ids) >= self.capacity:
+                    raise LocationStoreFull()
+                slot = self._slots[tourist_id] = len(self._ids)
+                self._ids.append(tourist_id)
+                self._lat.append(latitude)
+                self._lon.append(longitude)
+                self._at.append(now)
+            else:
+                self._lat[slot] = latitude
+                self._lon[slot] = longitude
+                self._at[slot] = now
+            self._dirty.add(slot)
+            self.pings += 1
+
+    def get(self, tourist_id) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            slot = self._slots.get(tourist_id)
+            if slot is None:
+                return None
+            return self._lat[slot], self._lon[slot]
+
+    # ----------------------
+    # Flushing
+    # ----------------------
+    def _take_dirty(self) -> List[dict]:
+        with self._lock:
+            rows = [
+                {"tourist_id": self._ids[slot], "latitude": self._lat[slot], "longitude": self._lon[slot],
+                 "updated_at": self._at[slot]}
+                for slot in self._dirty
+            ]
+            self._dirty = set()
+        for row in rows:
+            row["updated_at"] = datetime.utcfromtimestamp(row["updated_at"])
+        return rows
+
+    def _redirty(self, rows: List[dict]) -> None:
+        # Rows whose tourist has not sent a newer fix since are flushed next time
+        with self._lock:
+            for row in rows:
+                slot = self._slots.get(row["tourist_id"])
+                if slot is not None and datetime.utcfromtimestamp(self._at[slot]) == row["updated_at"]:
+                    self._dirty.add(slot)
+
+    def _write(self, rows: List[dict]) -> None:
+        db = self.session_factory()
+        try:
+            try:
+                _upsert(db, rows)
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+            # A tourist deleted since their first heartbeat fails the whole chunk; write the rest one by one
+            for row in rows:
+                try:
+                    _upsert(db, [row])
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                    self.dropped += 1
+                    self._forget(row["tourist_id"])
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """Write every position changed since the last flush; returns how many."""
+        start = time.perf_counter()
+        rows = self._take_dirty()
+        for offset in range(0, len(rows), LOCATION_FLUSH_BATCH_SIZE):
+            try:
+                self._write(rows[offset:offset + LOCATION_FLUSH_BATCH_SIZE])
+            except Exception:
+                self._redirty(rows[offset:])
+                raise
+        self.flushed += len(rows)
+        if rows:
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+        if time.monotonic() >= self._next_eviction:
+            self._evict_stale()
+        return len(rows)
+
+    # ----------------------
+    # Eviction
+    # ----------------------
+    def _remove(self, slot: int) -> None:
+        """Drop a slot, moving the last one into its place (caller holds the lock)."""
+        del self._slots[self._ids[slot]]
+        last = len(self._ids) - 1
+        if slot != last:
+            self._ids[slot] = self._ids[last]
+            self._lat[slot], self._lon[slot], self._at[slot] = self._lat[last], self._lon[last], self._at[last]
+            self._slots[self._ids[slot]] = slot
+            if last in self._dirty:
+                self._dirty.discard(last)
+                self._dirty.add(slot)
+        self._dirty.discard(last)
+        self._ids.pop()
+        self._lat.pop()
+        self._lon.pop()
+        self._at.pop()
+
+    def _forget(self, tourist_id) -> None:
+        with self._lock:
+            slot = self._slots.get(tourist_id)
+            if slot is not None:
+                self._remove(slot)
+
+    def _evict_stale(self) -> None:
+        # Candidates are found without the lock (a plain scan of the time array), then rechecked under it
+        self._next_eviction = time.monotonic() + max(1.0, self.stale_seconds / 10)
+        cutoff = time.time() - self.stale_seconds
+        ids, times = self._ids, self._at
+        candidates = [ids[slot] for slot in range(min(len(ids), len(times))) if times[slot] < cutoff]
+        if not candidates:
+            return
+        with self._lock:
+            for tourist_id in candidates:
+                slot = self._slots.get(tourist_id)
+                if slot is not None and self._at[slot] < cutoff and slot not in self._dirty:
+                    self._remove(slot)
+                    self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "tourists": len(self._ids),
+            "capacity": self.capacity,
+            "pending": len(self._dirty),
+            "pings": self.pings,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+location_store = LocationStore()
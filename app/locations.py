@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .geo import bounding_box, haversine_km
+from .location_store import location_store
+from .models import TouristLocation
+
+
+def save_location(db: Session, tourist_id, latitude: float, longitude: float) -> TouristLocation:
+    """Record a tourist's last known position (caller commits)."""
+    if location_store.knows(tourist_id):
+        # Keep a heartbeat held in memory from shadowing this newer fix
+        location_store.update(tourist_id, latitude, longitude)
+    location = db.get(TouristLocation, tourist_id)
+    if location is None:
+        location = TouristLocation(tourist_id=tourist_id, latitude=latitude, longitude=longitude)
+        db.add(location)
+    else:
+        location.latitude = latitude
+        location.longitude = longitude
+        location.updated_at = datetime.utcnow()
+    return location
+
+
+def get_location(db: Session, tourist_id) -> Optional[Tuple[float, float]]:
+    # A heartbeat received by this process may not be flushed yet
+    latest = location_store.get(tourist_id)
+    if latest is not None:
+        return latest
+    location = db.get(TouristLocation, tourist_id)
+    if location is None:
+        return None
+    return location.latitude, location.longitude
+
+
+def find_nearby_tourists(db: Session, latitude: float, longitude: float, radius_km: float,
+                         exclude_tourist_id=None, batch_size: int = 1000) -> Iterator[Tuple[object, float]]:
+    """
+    Yield (tourist_id, distance_km) for every tourist whose last known position
+    lies within radius_km of the given point.
+
+    The bounding box is resolved by ix_tourist_locations_lat_lon, so only the
+    candidates around the point are read; the exact haversine check runs here.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+    lon_filter = or_(*[TouristLocation.longitude.between(lo, hi) for lo, hi in lon_ranges])
+
+    query = db.query(TouristLocation.tourist_id, TouristLocation.latitude, TouristLocation.longitude).filter(
+        and_(TouristLocation.latitude.between(min_lat, max_lat), lon_filter)
+    )
+    if exclude_tourist_id is not None:
+        query = query.filter(TouristLocation.tourist_id != exclude_tourist_id)
+
+    for tourist_id, lat, lon in query.yield_per(batch_size):
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            yield tourist_id, distance
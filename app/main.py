@@ -1,19 +1,62 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
-from .routes import auth, tourist, authority
+from fastapi.responses import JSONResponse, PlainTextResponse
 import sys
 import os
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import BACKEND_CORS_ORIGINS
+from config import BACKEND_CORS_ORIGINS, DB_MODE, METRICS_ENABLED, SQL_PROFILING
+
+from .alert_storage import alert_maintenance
+from .alert_stream import alert_stream
+from .cache import profile_cache
+from .database import Base, async_engine, database_pool_status, engine
+from .fanout import fanout_pipeline
+from .heatmap import heatmap_reconciler
+from .incident_events import incident_events
+from .location_store import location_store
+from .metrics import MetricsMiddleware, request_metrics
+from .migrations import run_migrations
+from .query_profiler import QueryProfilerMiddleware, query_profiler
+from .sos import sos_coalescer
+from .statistics import stats_reconciler
+from .utils import PasswordHasherBusy, password_hasher
+from .pagination import NEXT_CURSOR_HEADER
+from .routes import auth, tourist, authority
 
-# Create tables
+# Create missing tables, then bring existing ones up to date
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
 
-app = FastAPI(title="Smart Tourist Safety System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers also resume fan-out jobs left pending by a previous run
+    password_hasher.start()
+    fanout_pipeline.start()
+    stats_reconciler.start()
+    heatmap_reconciler.start()
+    alert_stream.start()
+    incident_events.start()
+    alert_maintenance.start()
+    location_store.start()
+    yield
+    location_store.stop()
+    alert_maintenance.stop()
+    incident_events.stop()
+    alert_stream.stop()
+    heatmap_reconciler.stop()
+    stats_reconciler.stop()
+    fanout_pipeline.stop()
+    password_hasher.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Smart Tourist Safety System", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -22,12 +65,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+if SQL_PROFILING:
+    app.add_middleware(QueryProfilerMiddleware, profiler=query_profiler)
+
+# Added last so it is outermost and its timings include CORS handling
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
+@app.exception_handler(PasswordHasherBusy)
+def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
+
+
+def api_router(router):
+    if DB_MODE == "async":
+        from .async_routes import async_router
+        return async_router(router)
+    return router
+
+
 # Include Routes
-app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(tourist.router, prefix="/api/tourist", tags=["Tourist"])
-app.include_router(authority.router, prefix="/api/authority", tags=["Authority"])
+app.include_router(api_router(auth.router), prefix="/api/auth", tags=["Authentication"])
+app.include_router(api_router(tourist.router), prefix="/api/tourist", tags=["Tourist"])
+app.include_router(api_router(authority.router), prefix="/api/authority", tags=["Authority"])
 
 
 @app.get("/")
@@ -37,4 +100,34 @@ def test():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
\ No newline at end of file
+    return {
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "profile_cache": profile_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "alert_stream": alert_stream.stats(),
+        "incident_events": incident_events.stats(),
+        "alert_maintenance": alert_maintenance.stats(),
+        "sos_coalescer": sos_coalescer.stats(),
+        "location_store": location_store.stats(),
+        "db_mode": DB_MODE,
+        "database_pool": database_pool_status(),
+        "query_profiler": query_profiler.stats()
+    }
+
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        # Prometheus text exposition format
+        return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+if SQL_PROFILING:
+    @app.get("/debug/queries", include_in_schema=False)
+    def recent_query_profiles(limit: int = Query(50, ge=1, le=200), n_plus_one_only: bool = False):
+        # Most recent requests first: query count, DB time, slowest statements and N+1 suspects
+        profiles = query_profiler.report(200 if n_plus_one_only else limit)
+        if n_plus_one_only:
+            profiles = [profile for profile in profiles if profile["n_plus_one_suspects"]][:limit]
+        return profiles
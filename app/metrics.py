@@ -0,0 +1,165 @@
+"""
+Request metrics in Prometheus text format.
+
+MetricsMiddleware is plain ASGI rather than BaseHTTPMiddleware, so it adds no
+task or stream per request: it wraps receive/send to count body bytes and
+read the status code, and labels each request with its route template
+(e.g. /api/tourist/profile/{user_id}) once routing has matched it, so ids
+never become label values. Server-Sent Events responses stay open for as
+long as the client listens, so they are kept out of the duration and size
+histograms and counted in an open-streams gauge instead. Updates happen on the event loop thread only and
+need no lock; /metrics is an async endpoint on the same loop.
+
+With several uvicorn workers each process keeps its own numbers and a scrape
+reaches one of them; scrape the workers individually or run one per port.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+UNMATCHED_ROUTE = "unmatched"  # 404s and anything outside the routers
+EVENT_STREAM = b"text/event-stream"
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.total = 0  # stays an int for byte sizes
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.open_streams: Dict[Tuple[str, str], int] = {}
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_size: Dict[Tuple[str, str], Histogram] = {}
+        self.response_size: Dict[Tuple[str, str], Histogram] = {}
+
+    def _count(self, method: str, route: str, status: int) -> None:
+        status_key = (method, route, status)
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+    def stream_opened(self, method: str, route: str) -> None:
+        # The request stops counting as in flight: it has been answered and now streams
+        self.in_flight -= 1
+        key = (method, route)
+        self.open_streams[key] = self.open_streams.get(key, 0) + 1
+
+    def stream_closed(self, method: str, route: str, status: int) -> None:
+        key = (method, route)
+        self.open_streams[key] -= 1
+        self._count(method, route, status)
+
+    def record(self, method: str, route: str, status: int, seconds: float, received: int, sent: int) -> None:
+        key = (method, route)
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.request_size[key] = Histogram(SIZE_BUCKETS)
+            self.response_size[key] = Histogram(SIZE_BUCKETS)
+        latency.observe(seconds)
+        self.request_size[key].observe(received)
+        self.response_size[key].observe(sent)
+        self._count(method, route, status)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_streams_open Server-Sent Events responses currently streaming, by route.",
+            "# TYPE http_streams_open gauge",
+        ]
+        for (method, route), count in sorted(self.open_streams.items()):
+            lines.append(f"http_streams_open{{{_labels(method=method, route=route)}}} {count}")
+        lines += [
+            "# HELP http_requests_total Requests handled, by route and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+        for name, help_text, series in (
+            ("http_request_duration_seconds", "Time from request start to the last response byte.", self.latency),
+            ("http_request_size_bytes", "Request body size.", self.request_size),
+            ("http_response_size_bytes", "Response body size.", self.response_size),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), histogram in sorted(series.items()):
+                labels = _labels(method=method, route=route)
+                cumulative = 0
+                for bound, count in zip((*histogram.bounds, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _route(scope) -> str:
+    # The router stores the matched route in the shared scope
+    return getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metrics = self.metrics
+        status = 500  # if the app raises before responding
+        received = sent = 0
+        stream_route = None  # set once the response turns out to be an event stream
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, sent, stream_route
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                if content_type.startswith(EVENT_STREAM):
+                    stream_route = _route(scope)
+                    metrics.stream_opened(scope["method"], stream_route)
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            if stream_route is not None:
+                metrics.stream_closed(scope["method"], stream_route, status)
+            else:
+                metrics.in_flight -= 1
+                metrics.record(scope["method"], _route(scope), status, time.perf_counter() - start, received, sent)
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,251 @@
+"""
+Versioned schema migrations.
+
+Base.metadata.create_all() creates missing tables but never alters existing
+ones. Changes to existing tables live here as numbered migrations, applied in
+order and recorded in the schema_migrations table. They run on startup (see
+main.py) and can also be run by hand:
+
+    python -m app.migrations
+
+Every migration must be safe on a fresh database, where create_all has
+already produced the final schema, as well as on an old one.
+"""
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Float, Integer, MetaData, String, TIMESTAMP, Table, delete, func, inspect, select, text, update
+)
+from sqlalchemy.orm import Session
+
+from config import MIGRATION_BATCH_SIZE
+from .database import engine as default_engine
+from .models import Alert, Incident
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock so only one worker migrates at a time
+MIGRATION_LOCK_ID = 715_204_001
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", TIMESTAMP, nullable=False),
+)
+
+
+# ----------------------
+# Helpers
+# ----------------------
+def create_index(engine, table, name):
+    """Create one of the model's indexes by name if it does not exist yet."""
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(bind=engine, checkfirst=True)
+
+
+def column_type(engine, table_name, column_name):
+    for column in inspect(engine).get_columns(table_name):
+        if column["name"] == column_name:
+            return column["type"]
+    return None
+
+
+def convert_column(engine, table_name, primary_key, column_name, new_type, convert, batch_size=None):
+    """
+    Change a string column to new_type without a table rewrite under lock.
+
+    A shadow column is added, filled batch by batch (each batch its own short
+    transaction, walking the primary key) with convert(old_value), and then
+    swapped in place of the old column. Values convert() cannot parse become NULL.
+    """
+    current = column_type(engine, table_name, column_name)
+    if current is None or not isinstance(current, String):
+        return
+
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    shadow = f"{column_name}_new"
+    ddl_type = new_type.compile(dialect=engine.dialect)
+    default = ""
+    if isinstance(new_type, Boolean):
+        default = " NOT NULL DEFAULT false"
+
+    if column_type(engine, table_name, shadow) is None:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {shadow} {ddl_type}{default}"))
+
+    select_batch = text(
+        f"SELECT {primary_key}, {column_name} FROM {table_name} "
+        f"WHERE {primary_key} > :after ORDER BY {primary_key} LIMIT :limit"
+    )
+    select_first = text(
+        f"SELECT {primary_key}, {column_name} FROM {table_name} ORDER BY {primary_key} LIMIT :limit"
+    )
+    update_row = text(f"UPDATE {table_name} SET {shadow} = :value WHERE {primary_key} = :pk")
+
+    last_key = None
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            if last_key is None:
+                rows = conn.execute(select_first, {"limit": batch_size}).all()
+            else:
+                rows = conn.execute(select_batch, {"after": last_key, "limit": batch_size}).all()
+            if not rows:
+                break
+            updates = [{"pk": pk, "value": convert(value)} for pk, value in rows if value is not None]
+            if updates:
+                conn.execute(update_row, updates)
+            last_key = rows[-1][0]
+            converted += len(rows)
+        logger.info("Backfilled %s rows of %s.%s", converted, table_name, column_name)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+        conn.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN {shadow} TO {column_name}"))
+
+
+def to_float(value):
+    """'28.6139' -> 28.6139, '2.5km' / '~1km' -> 2.5 / 1.0, anything else -> None."""
+    match = re.search(r"[-+]?\d*\.?\d+", str(value))
+    return float(match.group()) if match else None
+
+
+def to_bool(value):
+    return str(value).strip().lower() in ("true", "t", "1", "yes")
+
+
+# ----------------------
+# Migrations
+# ----------------------
+def migration_0001_typed_columns(engine):
+    # Numeric coordinates/distance and a boolean read flag instead of strings
+    convert_column(engine, "incidents", "incident_id", "latitude", Float(), to_float)
+    convert_column(engine, "incidents", "incident_id", "longitude", Float(), to_float)
+    convert_column(engine, "alerts", "alert_id", "distance_km", Float(), to_float)
+    convert_column(engine, "alerts", "alert_id", "is_read", Boolean(), to_bool)
+
+    for name in (
+        "ix_incidents_created_at_id",
+        "ix_incidents_status_created_at",
+        "ix_incidents_category_created_at",
+        "ix_incidents_priority_created_at",
+        "ix_incidents_tourist_id",
+        "ix_incidents_lat_lon",
+    ):
+        create_index(engine, Incident.__table__, name)
+    for name in (
+        "ix_alerts_created_at_id",
+        "ix_alerts_tourist_id_created_at",
+        "ix_alerts_incident_id",
+    ):
+        create_index(engine, Alert.__table__, name)
+
+
+def migration_0002_seed_stat_counters(engine):
+    # Databases that predate stat_counters start from the real counts
+    from .statistics import reconcile_now
+    reconcile_now()
+
+
+def migration_0003_seed_risk_zones(engine):
+    # The zones that used to be hard-coded in get_risk_zones
+    from .risk_zones import seed_default_zones
+    with Session(engine) as db:
+        seed_default_zones(db)
+        db.commit()
+
+
+def migration_0004_unread_alerts_index(engine):
+    create_index(engine, Alert.__table__, "ix_alerts_unread_tourist")
+
+
+def migration_0005_partition_alerts(engine):
+    # Monthly range partitions on created_at; SQLite keeps the plain table
+    if engine.dialect.name != "postgresql":
+        return
+    from .alert_storage import partition_alerts_table
+    partition_alerts_table(engine)
+
+
+def migration_0006_seed_incident_tiles(engine):
+    # Existing incidents onto the heatmap rollup
+    from .heatmap import reconcile_now
+    reconcile_now()
+
+
+def migration_0007_unique_alerts(engine):
+    # Re-run fan-outs may have alerted a tourist twice for one incident: keep
+    # the oldest alert (read if any copy was) and drop the rest, then add the
+    # unique index in the same transaction so no new duplicate slips in between
+    alerts = Alert.__table__
+    with engine.begin() as conn:
+        duplicated = conn.execute(
+            select(alerts.c.incident_id, alerts.c.tourist_id)
+            .group_by(alerts.c.incident_id, alerts.c.tourist_id)
+            .having(func.count() > 1)
+        ).all()
+        for incident_id, tourist_id in duplicated:
+            copies = conn.execute(
+                select(alerts.c.alert_id, alerts.c.is_read)
+                .where(alerts.c.incident_id == incident_id, alerts.c.tourist_id == tourist_id)
+                .order_by(alerts.c.created_at, alerts.c.alert_id)
+            ).all()
+            kept, extra = copies[0], copies[1:]
+            if not kept.is_read and any(copy.is_read for copy in extra):
+                conn.execute(update(alerts).where(alerts.c.alert_id == kept.alert_id).values(is_read=True))
+            conn.execute(delete(alerts).where(alerts.c.alert_id.in_([copy.alert_id for copy in extra])))
+        if duplicated:
+            logger.info("Removed duplicate alerts for %s incident/tourist pairs", len(duplicated))
+
+        from .alert_storage import create_partition_unique_index, is_partitioned, partition_tables
+        if engine.dialect.name == "postgresql" and is_partitioned(conn):
+            for partition in partition_tables(conn):
+                create_partition_unique_index(conn, partition)
+        else:
+            next(index for index in alerts.indexes if index.name == "uq_alerts_incident_tourist").create(
+                bind=conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "typed geo columns and composite indexes", migration_0001_typed_columns),
+    (2, "seed statistics counters", migration_0002_seed_stat_counters),
+    (3, "seed default risk zones", migration_0003_seed_risk_zones),
+    (4, "partial index on unread alerts", migration_0004_unread_alerts_index),
+    (5, "partition alerts by month", migration_0005_partition_alerts),
+    (6, "seed incident heatmap tiles", migration_0006_seed_incident_tiles),
+    (7, "unique alert per incident and tourist", migration_0007_unique_alerts),
+]
+
+
+def run_migrations(engine=default_engine):
+    schema_migrations.create(bind=engine, checkfirst=True)
+    is_postgres = engine.dialect.name == "postgresql"
+
+    with engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            with engine.connect() as conn:
+                applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+            for version, name, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info("Applying migration %04d: %s", version, name)
+                migrate(engine)
+                with engine.begin() as conn:
+                    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                lock_conn.commit()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from .database import Base
+    Base.metadata.create_all(bind=default_engine)
+    run_migrations()
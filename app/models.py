@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Date, Integer, ForeignKey, Text, TIMESTAMP, CheckConstraint
+from sqlalchemy import Column, String, Date, Integer, Float, Boolean, ForeignKey, Text, TIMESTAMP, CheckConstraint, Index, false
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -36,6 +36,19 @@ class TouristProfile(Base):
     user = relationship("User", back_populates="tourist_profile")
 
 
+class TouristLocation(Base):
+    __tablename__ = "tourist_locations"
+    tourist_id = Column(UUID(as_uuid=True), ForeignKey("tourist_profiles.tourist_id", ondelete="CASCADE"), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Bounding-box index: proximity lookups range-scan latitude and filter longitude in the index
+    __table_args__ = (
+        Index("ix_tourist_locations_lat_lon", "latitude", "longitude"),
+    )
+
+
 class AuthorityProfile(Base):
     __tablename__ = "authority_profiles"
     authority_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
@@ -55,8 +68,8 @@ class Incident(Base):
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=False)
     category = Column(String(50), nullable=False)  # 'Theft', 'Harassment', 'Medical', 'Accident'
-    latitude = Column(String(50))
-    longitude = Column(String(50))
+    latitude = Column(Float)
+    longitude = Column(Float)
     status = Column(String(20), default="Active")  # 'Active', 'Resolved'
     priority = Column(String(20), default="Medium")  # 'Low', 'Medium', 'High', 'Critical'
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
@@ -64,15 +77,111 @@ class Incident(Base):
 
     tourist = relationship("TouristProfile", backref="incidents")
 
+    # Keyset pagination on (created_at, incident_id), optionally narrowed by a filter column
+    __table_args__ = (
+        Index("ix_incidents_created_at_id", "created_at", "incident_id"),
+        Index("ix_incidents_status_created_at", "status", "created_at", "incident_id"),
+        Index("ix_incidents_category_created_at", "category", "created_at", "incident_id"),
+        Index("ix_incidents_priority_created_at", "priority", "created_at", "incident_id"),
+        Index("ix_incidents_tourist_id", "tourist_id"),
+        Index("ix_incidents_lat_lon", "latitude", "longitude"),
+    )
+
 
 class Alert(Base):
     __tablename__ = "alerts"
     alert_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.incident_id", ondelete="CASCADE"), nullable=False)
     tourist_id = Column(UUID(as_uuid=True), ForeignKey("tourist_profiles.tourist_id", ondelete="CASCADE"), nullable=False)
-    distance_km = Column(String(20))
-    is_read = Column(String(10), default="false")
+    distance_km = Column(Float)
+    is_read = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
 
     incident = relationship("Incident", backref="alerts")
-    tourist = relationship("TouristProfile", backref="alerts")
\ No newline at end of file
+    tourist = relationship("TouristProfile", backref="alerts")
+
+    __table_args__ = (
+        Index("ix_alerts_created_at_id", "created_at", "alert_id"),
+        Index("ix_alerts_tourist_id_created_at", "tourist_id", "created_at"),
+        Index("ix_alerts_incident_id", "incident_id"),
+        # One alert per tourist per incident, so a re-run fan-out cannot repeat them.
+        # On Postgres the partitions carry it instead (see alert_storage.py)
+        Index("uq_alerts_incident_tourist", "incident_id", "tourist_id", unique=True),
+        # Only unread rows: badge counts and unread feeds never touch read history
+        Index("ix_alerts_unread_tourist", "tourist_id", "created_at", "alert_id",
+              postgresql_where=is_read == false(), sqlite_where=is_read == false()),
+    )
+
+
+class AlertArchive(Base):
+    """Alerts removed by the retention job (see alert_storage.py)."""
+    __tablename__ = "alerts_archive"
+    alert_id = Column(UUID(as_uuid=True), primary_key=True)
+    incident_id = Column(UUID(as_uuid=True), nullable=False)
+    tourist_id = Column(UUID(as_uuid=True), nullable=False)
+    distance_km = Column(Float)
+    is_read = Column(Boolean, nullable=False)
+    created_at = Column(TIMESTAMP)
+    archived_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+    reason = Column(String(20), nullable=False)  # 'incident_resolved', 'trip_ended'
+
+    __table_args__ = (
+        Index("ix_alerts_archive_tourist_id_created_at", "tourist_id", "created_at"),
+    )
+
+
+class FanoutJob(Base):
+    __tablename__ = "fanout_jobs"
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.incident_id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), default="Pending", nullable=False)  # 'Pending', 'Running', 'Done', 'Failed'
+    attempts = Column(Integer, default=0, nullable=False)
+    alerts_created = Column(Integer)
+    last_error = Column(Text)
+    available_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+    claimed_at = Column(TIMESTAMP)
+    completed_at = Column(TIMESTAMP)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_fanout_jobs_status_available_at", "status", "available_at"),
+    )
+
+
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    dimension = Column(String(20), primary_key=True)  # 'tourists', 'status', 'priority', 'category', 'day'
+    key = Column(String(50), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class IncidentTile(Base):
+    """Incident counts per geohash cell and day, maintained on every incident write (see heatmap.py)."""
+    __tablename__ = "incident_tiles"
+    geohash = Column(String(12), primary_key=True)  # at HEATMAP_MAX_PRECISION; coarser tiles are prefixes
+    day = Column(Date, primary_key=True)
+    category = Column(String(50), primary_key=True)
+    priority = Column(String(20), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_incident_tiles_day", "day"),
+    )
+
+
+class RiskZone(Base):
+    __tablename__ = "risk_zones"
+    zone_id = Column(String(50), primary_key=True, default=lambda: f"rz-{uuid.uuid4().hex[:12]}")
+    name = Column(String(100), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    radius_meters = Column(Integer, nullable=False)
+    risk_level = Column(String(20), nullable=False)  # 'Restricted', 'High', 'Medium', 'Low'
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint("radius_meters > 0", name="risk_zone_radius_check"),
+    )
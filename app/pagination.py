@@ -0,0 +1,108 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_, tuple_
+
+from config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from .models import Incident
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# ----------------------
+# Keyset cursors
+# ----------------------
+def encode_cursor(created_at: datetime, row_id) -> str:
+    payload = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class PageParams:
+    """?cursor=&limit= for feeds ordered newest first by (created_at, id)."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def paginate(query, created_column, id_column, page: PageParams) -> Tuple[List, Optional[str]]:
+    """
+    Return one page of rows, newest first, and the cursor for the next page
+    (None on the last page). Seeking past the cursor keeps every page an index
+    range scan on (created_at, id) no matter how deep the client pages.
+    """
+    if page.cursor:
+        created_at, row_id = decode_cursor(page.cursor)
+        query = query.filter(tuple_(created_column, id_column) < tuple_(created_at, row_id))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(page.limit + 1).all()
+    if len(rows) <= page.limit:
+        return rows, None
+
+    rows = rows[:page.limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+
+# ----------------------
+# Feed filters
+# ----------------------
+class IncidentFilters:
+    """Server-side filters shared by the incident and alert feeds."""
+
+    def __init__(
+        self,
+        category: Optional[str] = None,
+        priority: Optional[str] = None,
+        since: Optional[datetime] = Query(None, description="Only rows created at or after this time"),
+        until: Optional[datetime] = Query(None, description="Only rows created before this time"),
+        min_lat: Optional[float] = Query(None, ge=-90, le=90),
+        min_lon: Optional[float] = Query(None, ge=-180, le=180),
+        max_lat: Optional[float] = Query(None, ge=-90, le=90),
+        max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    ):
+        bbox = (min_lat, min_lon, max_lat, max_lon)
+        if any(value is not None for value in bbox) and any(value is None for value in bbox):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+        self.category = category
+        self.priority = priority
+        self.since = since
+        self.until = until
+        self.bbox = bbox if bbox[0] is not None else None
+
+    def apply(self, query, created_column=Incident.created_at):
+        if self.category:
+            query = query.filter(Incident.category == self.category)
+        if self.priority:
+            query = query.filter(Incident.priority == self.priority)
+        if self.since:
+            query = query.filter(created_column >= self.since)
+        if self.until:
+            query = query.filter(created_column < self.until)
+        if self.bbox:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            # min_lon > max_lon means the box crosses the antimeridian
+            if min_lon <= max_lon:
+                lon_filter = Incident.longitude.between(min_lon, max_lon)
+            else:
+                lon_filter = or_(Incident.longitude >= min_lon, Incident.longitude <= max_lon)
+            query = query.filter(and_(Incident.latitude.between(min_lat, max_lat), lon_filter))
+        return query
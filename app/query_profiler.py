@@ -0,0 +1,193 @@
+"""
+Opt-in SQL profiling through engine events.
+
+Every statement run while handling a request is charged to that request's
+QueryProfile, found through a context variable: the threadpool and the
+greenlets of async mode both carry the request's context, so the same hooks
+work in either DB_MODE. Statements that differ only in parameter values share
+a shape (bound parameters are already placeholders; expanded IN lists are
+collapsed), and a shape repeated SQL_N_PLUS_ONE_THRESHOLD times in one
+request is reported as an N+1 suspect.
+
+Statements slower than SQL_SLOW_QUERY_MS are logged from any thread,
+including background workers, whether or not profiling is on.
+"""
+import contextvars
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from config import SQL_N_PLUS_ONE_THRESHOLD, SQL_PROFILE_HEADERS, SQL_PROFILING, SQL_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_KEPT = 5
+RECENT_PROFILES = 200
+STATEMENT_CHARS = 500  # of a statement kept for logs and reports
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+)"
+# "IN (?, ?, ?)" and "VALUES (...), (...)" vary with the row count; one shape for all
+_PLACEHOLDER_LIST = re.compile(rf"{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+")
+_VALUES_LIST = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+_WHITESPACE = re.compile(r"\s+")
+# ORM column lists push the part that tells statements apart past STATEMENT_CHARS
+_SELECT_LIST = re.compile(r"^SELECT (?:[^()]|\([^()]*\))*? FROM ")
+
+_current_profile: contextvars.ContextVar[Optional["QueryProfile"]] = contextvars.ContextVar(
+    "query_profile", default=None
+)
+
+
+def statement_shape(statement: str) -> str:
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("?...", shape)
+    return _VALUES_LIST.sub(r"\1", shape)
+
+
+def _display(statement: str) -> str:
+    """Statement text for logs and reports: one line, outer select list elided, clipped."""
+    return _SELECT_LIST.sub("SELECT ... FROM ", _WHITESPACE.sub(" ", statement).strip())[:STATEMENT_CHARS]
+
+
+class QueryProfile:
+    """Statements issued while handling one request."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.total = 0.0
+        self.shapes: Counter = Counter()
+        self._slowest: List[tuple] = []  # min-heap of (seconds, sequence, statement)
+        self._lock = threading.Lock()  # a handler may fan work out to threads
+
+    def record(self, statement: str, seconds: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.shapes[shape] += 1
+            entry = (seconds, self.count, statement)
+            if len(self._slowest) < SLOWEST_KEPT:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def n_plus_one_suspects(self) -> List[tuple]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= SQL_N_PLUS_ONE_THRESHOLD]
+
+    def summary(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "queries": self.count,
+            "db_ms": round(self.total * 1000, 3),
+            "slowest": [
+                {"ms": round(seconds * 1000, 3), "statement": _display(statement)}
+                for seconds, _, statement in sorted(self._slowest, reverse=True)
+            ],
+            "n_plus_one_suspects": [
+                {"count": count, "statement": _display(shape)} for shape, count in self.n_plus_one_suspects()
+            ],
+        }
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.recent = deque(maxlen=RECENT_PROFILES)
+        self.requests_profiled = 0
+        self.n_plus_one_requests = 0
+        self.slow_queries = 0
+
+    # ----------------------
+    # Engine hooks
+    # ----------------------
+    def install(self, engine) -> None:
+        """Attach to a sync Engine (for async mode, pass AsyncEngine.sync_engine)."""
+        if not SQL_PROFILING and SQL_SLOW_QUERY_MS <= 0:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profiler_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_profiler_start", None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record(statement, seconds)
+        if 0 < SQL_SLOW_QUERY_MS <= seconds * 1000:
+            self.slow_queries += 1
+            where = f" during {profile.method} {profile.path}" if profile is not None else ""
+            logger.warning("Slow query (%.1f ms)%s: %s", seconds * 1000, where, _display(statement))
+
+    # ----------------------
+    # Per-request profiles
+    # ----------------------
+    def finish(self, profile: QueryProfile) -> None:
+        self.requests_profiled += 1
+        suspects = profile.n_plus_one_suspects()
+        if suspects:
+            self.n_plus_one_requests += 1
+            for shape, count in suspects:
+                logger.warning("Possible N+1 in %s %s: %d x %s", profile.method, profile.path, count, _display(shape))
+        self.recent.append(profile)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SQL_PROFILING,
+            "slow_query_ms": SQL_SLOW_QUERY_MS or None,
+            "requests_profiled": self.requests_profiled,
+            "n_plus_one_requests": self.n_plus_one_requests,
+            "slow_queries": self.slow_queries,
+        }
+
+    def report(self, limit: int) -> List[dict]:
+        """Most recent request profiles first."""
+        return [profile.summary() for profile in list(self.recent)[::-1][:limit]]
+
+
+class QueryProfilerMiddleware:
+    """Opens a QueryProfile per HTTP request; in SQL_PROFILE_HEADERS mode also reports it in headers."""
+
+    def __init__(self, app, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile(scope["method"], scope["path"])
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Streaming responses may query after this point; their headers cover the handler only
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-db-query-count", str(profile.count).encode()),
+                    (b"x-db-time-ms", f"{profile.total * 1000:.3f}".encode()),
+                    (b"x-db-n-plus-one", str(len(profile.n_plus_one_suspects())).encode()),
+                ]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_headers if SQL_PROFILE_HEADERS else send)
+        finally:
+            _current_profile.reset(token)
+            self.profiler.finish(profile)
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,86 @@
+"""
+Fast JSON for the list endpoints.
+
+Feeds used to build an IncidentResponse or AlertResponse per ORM row, which
+FastAPI validated again against response_model and then encoded with the
+stdlib json: three passes over every row. Here the listing queries select
+only the response columns as plain rows, each row becomes a dict with
+exactly the schema's fields, and the whole list is encoded in one call by
+orjson, which handles UUID and datetime natively. Endpoints return the response object
+itself, so FastAPI skips its response_model pass; the models still document
+the endpoints, so the dicts below must keep to their fields and order
+(benchmarks/bench_serialization.py checks the output is unchanged).
+"""
+from typing import Iterable, List
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from .models import Incident
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def list_response(items: List[dict], response: Response) -> FastJSONResponse:
+    """items as JSON, keeping the headers the endpoint set on its injected Response (cursor, ETag)."""
+    return FastJSONResponse(items, headers=dict(response.headers))
+
+
+def incident_listing_query(db: Session):
+    """Incidents as plain rows of the columns IncidentResponse needs."""
+    return db.query(
+        Incident.incident_id,
+        Incident.title,
+        Incident.description,
+        Incident.category,
+        Incident.latitude,
+        Incident.longitude,
+        Incident.status,
+        Incident.priority,
+        Incident.created_at
+    )
+
+
+def incident_items(rows: Iterable) -> List[dict]:
+    """IncidentResponse-shaped dicts from incident_listing_query rows."""
+    return [
+        {
+            "incident_id": incident_id,
+            "title": title,
+            "description": description,
+            "category": category,
+            "latitude": latitude,
+            "longitude": longitude,
+            "status": status,
+            "priority": priority,
+            "created_at": created_at,
+            "distance": None,
+        }
+        for incident_id, title, description, category, latitude, longitude, status, priority, created_at in rows
+    ]
+
+
+def alert_items(rows: Iterable) -> List[dict]:
+    """AlertResponse-shaped dicts from alert_listing_query rows with Alert.is_read added as the last column."""
+    items = []
+    for alert_id, incident_id, title, category, distance_km, status, created_at, is_read in rows:
+        items.append({
+            "alert_id": alert_id,
+            "incident_id": incident_id,
+            "title": title,
+            "category": category,
+            "distance": distance_km,
+            "status": status,
+            "created_at": created_at,
+            "is_read": is_read,
+        })
+    return items
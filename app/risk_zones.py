@@ -0,0 +1,222 @@
+"""
+Risk zones and the in-memory index used to test positions against them.
+
+Zones live in the risk_zones table. RiskZoneIndex keeps a snapshot of them as
+NumPy arrays bucketed by latitude row and sorted by longitude, so a batch of
+points is matched in a few vectorised steps: binary searches narrow each
+point to the zones whose centre could be close enough, and the exact
+haversine check runs on those (point, zone) pairs only. Edits made through this process rebuild the snapshot at once
+(invalidate); edits made by other workers are noticed when the table's row
+count or latest updated_at changes, checked every RISK_ZONE_REFRESH_SECONDS.
+"""
+import math
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import RISK_ZONE_REFRESH_SECONDS
+from .geo import EARTH_RADIUS_KM
+from .models import RiskZone, TouristLocation
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+# Great-circle metres per degree of latitude on the haversine sphere
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+# Upper bound on (point, zone) candidate pairs evaluated at once
+MAX_PAIRS = 2_000_000
+# Index rows are at least this tall so tiny zones do not create millions of rows
+MIN_ROW_METERS = 100.0
+ROW_STRIDE = 1000.0
+
+# Seeded into an empty table (see migrations.py); these were the static MVP zones
+DEFAULT_ZONES = [
+    {"zone_id": "rz-1", "name": "Old Fort Restricted Area", "latitude": 28.6562, "longitude": 77.2410, "radius_meters": 300, "risk_level": "Restricted"},
+    {"zone_id": "rz-2", "name": "Night Theft Hotspot", "latitude": 28.6139, "longitude": 77.2090, "radius_meters": 500, "risk_level": "High"},
+    {"zone_id": "rz-3", "name": "Riverbank Slippery Zone", "latitude": 28.7041, "longitude": 77.1025, "radius_meters": 400, "risk_level": "Medium"},
+]
+
+
+def zone_snapshot(zone: RiskZone) -> dict:
+    return {
+        "id": zone.zone_id,
+        "name": zone.name,
+        "latitude": zone.latitude,
+        "longitude": zone.longitude,
+        "radius_meters": zone.radius_meters,
+        "risk_level": zone.risk_level
+    }
+
+
+class ZoneArrays:
+    """
+    Immutable snapshot of every zone, bucketed into latitude rows one
+    max-radius tall and sorted by (row, longitude). A row/longitude range then
+    maps to one contiguous slice, found with a binary search.
+    """
+
+    def __init__(self, zones: List[dict], version):
+        self.version = version
+        self.max_radius = max((zone["radius_meters"] for zone in zones), default=0.0)
+        self.row_height = max(self.max_radius, MIN_ROW_METERS) / METERS_PER_DEGREE
+
+        self.zones = sorted(zones, key=lambda zone: self.key(zone["latitude"], zone["longitude"]))
+        latitude = np.array([zone["latitude"] for zone in self.zones], dtype=np.float64)
+        longitude = np.array([zone["longitude"] for zone in self.zones], dtype=np.float64)
+        self.keys = self.key(latitude, longitude)
+        self.lat_rad = np.radians(latitude)
+        self.lon_rad = np.radians(longitude)
+        self.radius = np.array([zone["radius_meters"] for zone in self.zones], dtype=np.float64)
+
+    def row(self, latitude):
+        return np.floor((np.asarray(latitude) + 90.0) / self.row_height)
+
+    def key(self, latitude, longitude):
+        # Rows are ROW_STRIDE apart, so longitude ranges that spill past +-180 never reach a neighbouring row
+        return self.row(latitude) * ROW_STRIDE + (np.asarray(longitude) + 180.0)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distance in metres between arrays of coordinates in radians."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def candidate_slices(arrays: ZoneArrays, latitudes, longitudes, reach_m: float):
+    """
+    (point_index, first_zone, zone_count) slices of arrays.zones covering every
+    zone centre within reach_m of each point: one slice per nearby row and
+    longitude range, with ranges wrapped across the antimeridian.
+    """
+    reach = reach_m / EARTH_RADIUS_M  # radians
+    # Largest longitude difference of any point within reach (exact on the sphere)
+    ratio = math.sin(min(reach, math.pi / 2)) / np.maximum(np.cos(np.radians(latitudes)), 1e-12)
+    whole_row = ratio >= 1.0
+    d_lon = np.where(whole_row, 180.0, np.degrees(np.arcsin(np.minimum(ratio, 1.0))))
+
+    west, east = longitudes - d_lon, longitudes + d_lon
+    ranges = [
+        (np.where(whole_row, -180.0, np.maximum(west, -180.0)), np.where(whole_row, 180.0, np.minimum(east, 180.0)),
+         np.ones_like(whole_row)),
+        (west + 360.0, np.full_like(west, 180.0), (west < -180.0) & ~whole_row),
+        (np.full_like(east, -180.0), east - 360.0, (east > 180.0) & ~whole_row),
+    ]
+
+    point_rows = arrays.row(latitudes)
+    last_row = arrays.row(90.0)
+    span = math.ceil(math.degrees(reach) / arrays.row_height)
+    points = np.arange(len(latitudes))
+    slices = []
+    for offset in range(-span, span + 1):
+        rows = point_rows + offset
+        in_range = (rows >= 0) & (rows <= last_row)
+        for low_lon, high_lon, used in ranges:
+            first = np.searchsorted(arrays.keys, rows * ROW_STRIDE + low_lon + 180.0, side="left")
+            stop = np.searchsorted(arrays.keys, rows * ROW_STRIDE + high_lon + 180.0, side="right")
+            count = np.where(in_range & used, stop - first, 0)
+            nonempty = count > 0
+            slices.append((points[nonempty], first[nonempty], count[nonempty]))
+    return tuple(np.concatenate(parts) for parts in zip(*slices))
+
+
+def match_points(arrays: ZoneArrays, latitudes, longitudes, near_meters: float = 0.0):
+    """
+    Return (point_index, zone_index, distance_m) arrays for every point lying
+    inside a zone or within near_meters of its edge.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64))
+    if not arrays.zones or not len(latitudes):
+        return empty
+
+    slice_point, slice_first, slice_count = candidate_slices(arrays, latitudes, longitudes,
+                                                             arrays.max_radius + near_meters)
+    ends = np.cumsum(slice_count)
+    lat_rad = np.radians(latitudes)
+    lon_rad = np.radians(longitudes)
+    results = [empty]
+    start = 0
+    while start < len(slice_count):
+        # Expand as many slices as fit in MAX_PAIRS (point, zone) pairs, at least one
+        offset = ends[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(ends, offset + MAX_PAIRS, side="right")))
+        counts = slice_count[start:stop]
+        point_index = np.repeat(slice_point[start:stop], counts)
+        first_pair = np.repeat(ends[start:stop] - counts - offset, counts)
+        zone_index = np.arange(len(point_index)) - first_pair + np.repeat(slice_first[start:stop], counts)
+
+        distance = haversine_m(lat_rad[point_index], lon_rad[point_index],
+                               arrays.lat_rad[zone_index], arrays.lon_rad[zone_index])
+        keep = distance <= arrays.radius[zone_index] + near_meters
+        results.append((point_index[keep], zone_index[keep], distance[keep]))
+        start = stop
+
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+class RiskZoneIndex:
+    def __init__(self, refresh_interval: float = RISK_ZONE_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._arrays: Optional[ZoneArrays] = None
+        self._checked_at = 0.0
+        # Bumped on every invalidation; a load that raced with an edit is not kept
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._arrays = None
+
+    def snapshot(self, db: Session) -> ZoneArrays:
+        arrays = self._arrays
+        if arrays is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return arrays
+
+        generation = self._generation
+        version = tuple(db.query(func.count(RiskZone.zone_id), func.max(RiskZone.updated_at)).one())
+        if arrays is None or arrays.version != version:
+            arrays = ZoneArrays([zone_snapshot(zone) for zone in db.query(RiskZone).all()], version)
+        if generation == self._generation:
+            self._arrays = arrays
+            self._checked_at = time.monotonic()
+        return arrays
+
+    def zones(self, db: Session) -> List[dict]:
+        return sorted((dict(zone) for zone in self.snapshot(db).zones), key=lambda zone: zone["id"])
+
+    def check(self, db: Session, points: Sequence[Tuple[float, float]], near_meters: float = 0.0) -> List[List[dict]]:
+        """For each (lat, lon) point, the zones containing it or within near_meters of their edge, nearest first."""
+        arrays = self.snapshot(db)
+        hits: List[List[dict]] = [[] for _ in points]
+        if not points:
+            return hits
+        latitudes, longitudes = np.array(points, dtype=np.float64).reshape(-1, 2).T
+        point_index, zone_index, distance = match_points(arrays, latitudes, longitudes, near_meters)
+        for point, zone, meters in zip(point_index.tolist(), zone_index.tolist(), distance.tolist()):
+            hits[point].append({
+                **arrays.zones[zone],
+                "distance_meters": round(meters, 1),
+                "inside": meters <= arrays.zones[zone]["radius_meters"]
+            })
+        for zone_hits in hits:
+            zone_hits.sort(key=lambda hit: hit["distance_meters"])
+        return hits
+
+
+def check_tourists(db: Session, near_meters: float = 0.0) -> Tuple[int, List[Tuple[object, List[dict]]]]:
+    """Number of tourists checked, and (tourist_id, zone hits) for each whose last known position hits a zone."""
+    rows = db.query(TouristLocation.tourist_id, TouristLocation.latitude, TouristLocation.longitude).all()
+    hits = risk_zone_index.check(db, [(lat, lon) for _, lat, lon in rows], near_meters)
+    return len(rows), [(row.tourist_id, zone_hits) for row, zone_hits in zip(rows, hits) if zone_hits]
+
+
+def seed_default_zones(db: Session) -> int:
+    """Insert DEFAULT_ZONES into an empty table (caller commits)."""
+    if db.query(RiskZone.zone_id).first() is not None:
+        return 0
+    db.add_all(RiskZone(**zone) for zone in DEFAULT_ZONES)
+    return len(DEFAULT_ZONES)
+
+
+risk_zone_index = RiskZoneIndex()
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from passlib.hash import bcrypt
 import uuid
 
+from ..cache import profile_cache
 from ..database import get_db
 from ..models import User, TouristProfile, AuthorityProfile
 from ..schemas import TouristRegister, AuthorityRegister, UserLogin
+from ..statistics import record_tourist_registered
+from ..utils import PasswordHasherBusy, password_hasher
 
 router = APIRouter()
 
@@ -17,7 +19,7 @@ def register_tourist(data: TouristRegister, db: Session = Depends(get_db)):
     if db.query(User).filter(User.email == data.email).first():
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    new_user = User(email=data.email, password_hash=bcrypt.hash(data.password), user_type="tourist")
+    new_user = User(email=data.email, password_hash=password_hasher.hash(data.password), user_type="tourist")
     db.add(new_user)
     db.flush()
 
@@ -34,8 +36,10 @@ def register_tourist(data: TouristRegister, db: Session = Depends(get_db)):
         blockchain_id=str(uuid.uuid4())
     )
     db.add(tourist_profile)
+    record_tourist_registered(db)
     db.commit()
     db.refresh(new_user)
+    profile_cache.invalidate_tourist(new_user.user_id)
 
     return {"message": "Tourist registered", "user_id": str(new_user.user_id)}
 
@@ -47,7 +51,7 @@ def register_authority(data: AuthorityRegister, db: Session = Depends(get_db)):
     if db.query(User).filter(User.email == data.email).first():
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    new_user = User(email=data.email, password_hash=bcrypt.hash(data.password), user_type="authority")
+    new_user = User(email=data.email, password_hash=password_hasher.hash(data.password), user_type="authority")
     db.add(new_user)
     db.flush()
 
@@ -61,6 +65,7 @@ def register_authority(data: AuthorityRegister, db: Session = Depends(get_db)):
     db.add(authority_profile)
     db.commit()
     db.refresh(new_user)
+    profile_cache.invalidate_authority(new_user.user_id)
 
     return {"message": "Authority registered", "user_id": str(new_user.user_id)}
 
@@ -70,26 +75,33 @@ def register_authority(data: AuthorityRegister, db: Session = Depends(get_db)):
 @router.post("/login")
 def login_user(data: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == data.email).first()
-    user = db.query(User).filter(User.email == data.email).first()
 
-    if not user or not bcrypt.verify(data.password, str(user.password_hash)):
+    if not user or not password_hasher.verify(data.password, str(user.password_hash)):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Upgrade hashes made with an older BCRYPT_ROUNDS while we have the plain password
+    if password_hasher.needs_rehash(str(user.password_hash)):
+        try:
+            user.password_hash = password_hasher.hash(data.password)
+            db.commit()
+        except PasswordHasherBusy:
+            pass  # retried on a later login
+
     result = {"user_id": str(user.user_id), "user_type": user.user_type}
 
     if str(user.user_type) == "tourist":
-        profile = db.query(TouristProfile).filter_by(tourist_id=user.user_id).first()
+        profile = profile_cache.get_tourist(db, user.user_id)
         if profile:
             result.update({
-                "full_name": profile.full_name,
-                "blockchain_id": profile.blockchain_id
+                "full_name": profile["full_name"],
+                "blockchain_id": profile["blockchain_id"]
             })
     else:
-        profile = db.query(AuthorityProfile).filter_by(authority_id=user.user_id).first()
+        profile = profile_cache.get_authority(db, user.user_id)
         if profile:
             result.update({
-                "full_name": profile.full_name,
-                "department": profile.department
+                "full_name": profile["full_name"],
+                "department": profile["department"]
             })
 
     return {"message": "Login successful", "user": result}
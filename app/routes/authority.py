@@ -1,11 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from uuid import UUID
 from datetime import datetime
 
+from config import HEATMAP_MAX_PRECISION, STATS_DAYS
+from ..alert_storage import alert_maintenance
+from ..alerts import alert_listing_query, feed_window_start
+from ..cache import profile_cache
 from ..database import get_db
-from ..models import AuthorityProfile, Incident, Alert, TouristProfile
-from ..schemas import IncidentResponse, AlertResponse
+from ..etag import ALERTS, INCIDENTS, collection_versions, make_etag, not_modified
+from ..export import alert_export, check_format, export_filename, incident_export, stream_export
+from ..fanout import fanout_pipeline
+from ..heatmap import get_heatmap, reconcile as reconcile_heatmap, record_incident_changed as record_incident_tile_changed
+from ..incident_events import incident_events, stage_incident_changed
+from ..models import Incident, Alert, RiskZone as RiskZoneRecord, TouristProfile
+from ..responses import FastJSONResponse, alert_items, incident_items, incident_listing_query, list_response
+from ..risk_zones import check_tourists, risk_zone_index, zone_snapshot
+from ..pagination import NEXT_CURSOR_HEADER, IncidentFilters, PageParams, paginate
+from ..schemas import (
+    IncidentResponse, AlertResponse, RiskZone, RiskZoneCreate, RiskZoneUpdate,
+    ZoneCheckMatch, ZoneCheckRequest, ZoneCheckResponse
+)
+from ..statistics import get_statistics, reconcile, record_incident_changed
 
 router = APIRouter()
 
@@ -13,75 +31,92 @@ router = APIRouter()
 # Get Authority Profile
 # ----------------------
 @router.get("/profile/{user_id}")
-def get_authority_profile(user_id: str, db: Session = Depends(get_db)):
-    profile = db.query(AuthorityProfile).filter(AuthorityProfile.authority_id == user_id).first()
+def get_authority_profile(user_id: UUID, db: Session = Depends(get_db)):
+    profile = profile_cache.get_authority(db, user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Authority profile not found")
     
-    return {
-        "authority_id": str(profile.authority_id),
-        "full_name": profile.full_name,
-        "department": profile.department,
-        "designation": profile.designation,
-        "contact_number": profile.contact_number
-    }
+    return profile
 
 # ----------------------
 # Get All Incidents
 # ----------------------
 @router.get("/incidents", response_model=List[IncidentResponse])
-def get_all_incidents(db: Session = Depends(get_db)):
-    incidents = db.query(Incident).order_by(Incident.created_at.desc()).all()
-    
-    return [
-        IncidentResponse(
-            incident_id=str(incident.incident_id),
-            title=incident.title,
-            description=incident.description,
-            category=incident.category,
-            latitude=incident.latitude,
-            longitude=incident.longitude,
-            status=incident.status,
-            priority=incident.priority,
-            created_at=incident.created_at
-        ) for incident in incidents
-    ]
+def get_all_incidents(
+    response: Response,
+    filters: IncidentFilters = Depends(),
+    page: PageParams = Depends(),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    # Unchanged since the client's copy: 304 from the version counter alone
+    versions = collection_versions(db)
+    cached = not_modified(response, make_etag(versions.get(INCIDENTS, 0)), if_none_match)
+    if cached:
+        return cached
+
+    query = filters.apply(incident_listing_query(db))
+    incidents, next_cursor = paginate(query, Incident.created_at, Incident.incident_id, page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return list_response(incident_items(incidents), response)
+
+# ----------------------
+# Live Incident Feed (Server-Sent Events)
+# ----------------------
+@router.get("/incidents/stream")
+async def stream_incident_events():
+    # Dashboards load /incidents once, then apply these deltas; on "resync" or a dropped connection they reload
+    return StreamingResponse(
+        incident_events.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ----------------------
 # Get Incidents by Status
 # ----------------------
 @router.get("/incidents/status/{status}", response_model=List[IncidentResponse])
-def get_incidents_by_status(status: str, db: Session = Depends(get_db)):
-    incidents = db.query(Incident).filter(Incident.status == status).order_by(Incident.created_at.desc()).all()
-    
-    return [
-        IncidentResponse(
-            incident_id=str(incident.incident_id),
-            title=incident.title,
-            description=incident.description,
-            category=incident.category,
-            latitude=incident.latitude,
-            longitude=incident.longitude,
-            status=incident.status,
-            priority=incident.priority,
-            created_at=incident.created_at
-        ) for incident in incidents
-    ]
+def get_incidents_by_status(
+    status: str,
+    response: Response,
+    filters: IncidentFilters = Depends(),
+    page: PageParams = Depends(),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    versions = collection_versions(db)
+    cached = not_modified(response, make_etag(versions.get(INCIDENTS, 0)), if_none_match)
+    if cached:
+        return cached
+
+    query = filters.apply(incident_listing_query(db).filter(Incident.status == status))
+    incidents, next_cursor = paginate(query, Incident.created_at, Incident.incident_id, page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return list_response(incident_items(incidents), response)
 
 # ----------------------
 # Update Incident Status
 # ----------------------
 @router.put("/incidents/{incident_id}/status")
-def update_incident_status(incident_id: str, new_status: str, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.incident_id == incident_id).first()
+def update_incident_status(incident_id: UUID, new_status: str, db: Session = Depends(get_db)):
+    # Locked so a concurrent identical change sees the new value and moves no counters
+    incident = db.query(Incident).filter(Incident.incident_id == incident_id).with_for_update().first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
     if new_status not in ["Active", "Resolved"]:
         raise HTTPException(status_code=400, detail="Invalid status. Must be 'Active' or 'Resolved'")
     
+    previous = incident.status
+    record_incident_changed(db, "status", previous, new_status)
+    record_incident_tile_changed(db, incident, "status", previous, new_status)
     incident.status = new_status
     incident.updated_at = datetime.utcnow()
+    stage_incident_changed(db, incident, "status", previous, new_status)
     db.commit()
     
     return {"message": f"Incident status updated to {new_status}"}
@@ -90,16 +125,21 @@ def update_incident_status(incident_id: str, new_status: str, db: Session = Depe
 # Update Incident Priority
 # ----------------------
 @router.put("/incidents/{incident_id}/priority")
-def update_incident_priority(incident_id: str, priority: str, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.incident_id == incident_id).first()
+def update_incident_priority(incident_id: UUID, priority: str, db: Session = Depends(get_db)):
+    # Locked, as in update_incident_status
+    incident = db.query(Incident).filter(Incident.incident_id == incident_id).with_for_update().first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
     if priority not in ["Low", "Medium", "High", "Critical"]:
         raise HTTPException(status_code=400, detail="Invalid priority. Must be 'Low', 'Medium', 'High', or 'Critical'")
     
+    previous = incident.priority
+    record_incident_changed(db, "priority", previous, priority)
+    record_incident_tile_changed(db, incident, "priority", previous, priority)
     incident.priority = priority
     incident.updated_at = datetime.utcnow()
+    stage_incident_changed(db, incident, "priority", previous, priority)
     db.commit()
     
     return {"message": f"Incident priority updated to {priority}"}
@@ -108,51 +148,206 @@ def update_incident_priority(incident_id: str, priority: str, db: Session = Depe
 # Get All Alerts
 # ----------------------
 @router.get("/alerts", response_model=List[AlertResponse])
-def get_all_alerts(db: Session = Depends(get_db)):
-    alerts = db.query(Alert).order_by(Alert.created_at.desc()).all()
-    
-    result = []
-    for alert in alerts:
-        incident = db.query(Incident).filter(Incident.incident_id == alert.incident_id).first()
-        if incident:
-            result.append(AlertResponse(
-                alert_id=str(alert.alert_id),
-                incident_id=str(alert.incident_id),
-                title=incident.title,
-                category=incident.category,
-                distance=alert.distance_km,
-                status=incident.status,
-                created_at=alert.created_at
-            ))
-    
-    return result
+def get_all_alerts(
+    response: Response,
+    filters: IncidentFilters = Depends(),
+    page: PageParams = Depends(),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    window_start = None if filters.since else feed_window_start()
+    # Alerts show their incident's title and status, so either collection changing counts
+    versions = collection_versions(db)
+    etag = make_etag(versions.get(INCIDENTS, 0), versions.get(ALERTS, 0), window_start)
+    cached = not_modified(response, etag, if_none_match)
+    if cached:
+        return cached
+
+    # One joined query instead of an incident lookup per alert
+    query = filters.apply(alert_listing_query(db).add_columns(Alert.is_read), created_column=Alert.created_at)
+    if window_start is not None:
+        query = query.filter(Alert.created_at >= window_start)
+    rows, next_cursor = paginate(query, Alert.created_at, Alert.alert_id, page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return list_response(alert_items(rows), response)
+
+# ----------------------
+# Bulk Export (streamed)
+# ----------------------
+def export_response(name: str, fields, statement, export_format: str):
+    media_type = check_format(export_format)
+    return StreamingResponse(
+        stream_export(fields, statement, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(name, export_format)}"'}
+    )
+
+@router.get("/export/incidents")
+def export_incidents(
+    format: str = Query("ndjson", description="ndjson, csv or parquet"),
+    status: Optional[str] = None,
+    filters: IncidentFilters = Depends()
+):
+    # Every matching incident with its tourist, oldest first, streamed in constant memory
+    fields, statement = incident_export(filters, status)
+    return export_response("incidents", fields, statement, format)
+
+@router.get("/export/alerts")
+def export_alerts(
+    format: str = Query("ndjson", description="ndjson, csv or parquet"),
+    status: Optional[str] = Query(None, description="Status of the alert's incident"),
+    filters: IncidentFilters = Depends()
+):
+    fields, statement = alert_export(filters, status)
+    return export_response("alerts", fields, statement, format)
+
+# ----------------------
+# SOS Fan-out Pipeline Status
+# ----------------------
+@router.get("/fanout/status")
+def get_fanout_status(incident_id: Optional[UUID] = None, limit: int = Query(50, ge=1, le=500)):
+    return fanout_pipeline.status(incident_id=incident_id, limit=limit)
 
 # ----------------------
 # Get Tourist Statistics
 # ----------------------
 @router.get("/statistics/tourists")
-def get_tourist_statistics(db: Session = Depends(get_db)):
-    total_tourists = db.query(TouristProfile).count()
-    active_incidents = db.query(Incident).filter(Incident.status == "Active").count()
-    resolved_incidents = db.query(Incident).filter(Incident.status == "Resolved").count()
+def get_tourist_statistics(days: int = Query(STATS_DAYS, ge=1, le=366), db: Session = Depends(get_db)):
+    # Served from counters maintained on every incident write
+    return get_statistics(db, days)
+
+# ----------------------
+# Reconcile Statistics Counters
+# ----------------------
+@router.post("/statistics/reconcile")
+def reconcile_statistics(db: Session = Depends(get_db)):
+    corrections = reconcile(db)
+    db.commit()
     
     return {
-        "total_tourists": total_tourists,
-        "active_incidents": active_incidents,
-        "resolved_incidents": resolved_incidents,
-        "total_incidents": active_incidents + resolved_incidents
+        "message": "Statistics reconciled",
+        "corrections": [
+            {"dimension": dimension, "key": key, "delta": delta}
+            for (dimension, key), delta in sorted(corrections.items())
+        ]
     }
 
+# ----------------------
+# Incident Heatmap
+# ----------------------
+@router.get("/heatmap")
+def get_incident_heatmap(
+    response: Response,
+    precision: int = Query(min(5, HEATMAP_MAX_PRECISION), ge=1, le=HEATMAP_MAX_PRECISION, description="Geohash length of the tiles"),
+    status: Optional[str] = None,
+    filters: IncidentFilters = Depends(),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    # Summed from the incident_tiles rollup; since and until are applied by whole UTC days
+    etag = make_etag(collection_versions(db).get(INCIDENTS, 0), precision, status, vars(filters),
+                     None if filters.since else datetime.utcnow().date())
+    cached = not_modified(response, etag, if_none_match)
+    if cached:
+        return cached
+
+    return FastJSONResponse(get_heatmap(db, precision, filters, status), headers=dict(response.headers))
+
+@router.post("/heatmap/reconcile")
+def reconcile_incident_heatmap(db: Session = Depends(get_db)):
+    corrections = reconcile_heatmap(db)
+    db.commit()
+    
+    return {"message": "Heatmap reconciled", "corrected_tiles": len(corrections)}
+
+# ----------------------
+# Alert Retention
+# ----------------------
+@router.post("/alerts/maintenance")
+def run_alert_maintenance():
+    # Same pass as the scheduled job: partitions, expired alerts, empty old partitions
+    return alert_maintenance.run()
+
+# ----------------------
+# Manage Risk Zones
+# ----------------------
+@router.post("/risk-zones", response_model=RiskZone, status_code=status.HTTP_201_CREATED)
+def create_risk_zone(data: RiskZoneCreate, db: Session = Depends(get_db)):
+    zone = RiskZoneRecord(**data.model_dump())
+    db.add(zone)
+    db.commit()
+    risk_zone_index.invalidate()
+    
+    return RiskZone(**zone_snapshot(zone))
+
+@router.put("/risk-zones/{zone_id}", response_model=RiskZone)
+def update_risk_zone(zone_id: str, data: RiskZoneUpdate, db: Session = Depends(get_db)):
+    zone = db.get(RiskZoneRecord, zone_id)
+    if not zone:
+        raise HTTPException(status_code=404, detail="Risk zone not found")
+    
+    for field, value in data.model_dump(exclude_unset=True, exclude_none=True).items():
+        setattr(zone, field, value)
+    db.commit()
+    risk_zone_index.invalidate()
+    
+    return RiskZone(**zone_snapshot(zone))
+
+@router.delete("/risk-zones/{zone_id}")
+def delete_risk_zone(zone_id: str, db: Session = Depends(get_db)):
+    zone = db.get(RiskZoneRecord, zone_id)
+    if not zone:
+        raise HTTPException(status_code=404, detail="Risk zone not found")
+    
+    db.delete(zone)
+    db.commit()
+    risk_zone_index.invalidate()
+    
+    return {"message": "Risk zone deleted"}
+
+# ----------------------
+# Check Positions Against Risk Zones
+# ----------------------
+@router.post("/risk-zones/check", response_model=ZoneCheckResponse)
+def check_points_in_risk_zones(data: ZoneCheckRequest, db: Session = Depends(get_db)):
+    hits = risk_zone_index.check(db, [(point.latitude, point.longitude) for point in data.points], data.near_meters)
+    
+    return ZoneCheckResponse(
+        checked=len(data.points),
+        matches=[
+            ZoneCheckMatch(index=index, id=data.points[index].id, zones=zone_hits)
+            for index, zone_hits in enumerate(hits) if zone_hits
+        ]
+    )
+
+@router.get("/risk-zones/tourists", response_model=ZoneCheckResponse)
+def get_tourists_in_risk_zones(near_meters: float = Query(0, ge=0, le=50_000), db: Session = Depends(get_db)):
+    # Every tourist's last known position against every zone, in one pass
+    checked, matches = check_tourists(db, near_meters)
+    
+    return ZoneCheckResponse(
+        checked=checked,
+        matches=[ZoneCheckMatch(id=str(tourist_id), zones=zone_hits) for tourist_id, zone_hits in matches]
+    )
+
 # ----------------------
 # Get Incident Details
 # ----------------------
 @router.get("/incidents/{incident_id}/details")
-def get_incident_details(incident_id: str, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.incident_id == incident_id).first()
-    if not incident:
+def get_incident_details(incident_id: UUID, db: Session = Depends(get_db)):
+    # Incident and reporting tourist in one query
+    row = (
+        db.query(Incident, TouristProfile)
+        .outerjoin(TouristProfile, TouristProfile.tourist_id == Incident.tourist_id)
+        .filter(Incident.incident_id == incident_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    tourist = db.query(TouristProfile).filter(TouristProfile.tourist_id == incident.tourist_id).first()
+    incident, tourist = row
     
     return {
         "incident": {
@@ -1,46 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import false
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
 import uuid
 import math
 
-from ..database import get_db
+from ..alert_stream import alert_stream
+from ..alerts import alert_listing_query, count_unread, create_proximity_alerts, feed_window_start, mark_read
+from ..cache import profile_cache
+from ..database import SessionLocal, get_db
+from ..etag import make_etag, not_modified, tourist_alerts_state
+from ..fanout import fanout_pipeline
+from ..geo import parse_coordinates
+from ..heatmap import record_incident_created as record_incident_tile
+from ..incident_events import stage_incident_created
+from ..location_store import LocationStoreFull, location_store
+from ..locations import save_location
 from ..models import TouristProfile, Incident, Alert, User
-from ..schemas import IncidentCreate, IncidentResponse, AlertResponse, SOSRequest, RiskZone
+from ..pagination import decode_cursor
+from ..responses import alert_items, incident_items, incident_listing_query, list_response
+from ..risk_zones import risk_zone_index
+from ..schemas import (
+    IncidentCreate, IncidentResponse, AlertResponse, AlertsMarkRead, UnreadAlertCount, SOSRequest, RiskZone,
+    RiskZoneHit, LocationUpdate
+)
+from ..sos import RETRY, SKIP, UPDATE, sos_coalescer, update_sos_incident
+from ..statistics import record_incident_created
 
 router = APIRouter()
 
+
+def tourist_exists(tourist_id) -> bool:
+    # For async routes that do not hold a request-scoped session
+    db = SessionLocal()
+    try:
+        return profile_cache.tourist_exists(db, tourist_id)
+    finally:
+        db.close()
+
+
 # ----------------------
 # Get Tourist Profile
 # ----------------------
 @router.get("/profile/{user_id}")
-def get_tourist_profile(user_id: str, db: Session = Depends(get_db)):
-    profile = db.query(TouristProfile).filter(TouristProfile.tourist_id == user_id).first()
+def get_tourist_profile(user_id: UUID, db: Session = Depends(get_db)):
+    profile = profile_cache.get_tourist(db, user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Tourist profile not found")
     
-    return {
-        "tourist_id": str(profile.tourist_id),
-        "full_name": profile.full_name,
-        "document_type": profile.document_type,
-        "document_number": profile.document_number,
-        "nationality": profile.nationality,
-        "trip_start": profile.trip_start,
-        "trip_end": profile.trip_end,
-        "emergency_contact_name": profile.emergency_contact_name,
-        "emergency_contact_phone": profile.emergency_contact_phone,
-        "blockchain_id": profile.blockchain_id,
-        "safety_score": profile.safety_score
-    }
+    return profile
+
+# ----------------------
+# Update Last Known Location
+# ----------------------
+@router.put("/location/{tourist_id}")
+def update_location(tourist_id: UUID, location: LocationUpdate, db: Session = Depends(get_db)):
+    if not profile_cache.tourist_exists(db, tourist_id):
+        raise HTTPException(status_code=404, detail="Tourist not found")
+
+    save_location(db, tourist_id, location.latitude, location.longitude)
+    db.commit()
+
+    return {"message": "Location updated"}
+
+# ----------------------
+# Location Heartbeat
+# ----------------------
+@router.post("/location/{tourist_id}/heartbeat", status_code=status.HTTP_204_NO_CONTENT)
+async def location_heartbeat(tourist_id: UUID, location: LocationUpdate):
+    # Recorded in memory and flushed in batches; only a tourist's first heartbeat reads the database
+    if not location_store.knows(tourist_id) and not await run_in_threadpool(tourist_exists, tourist_id):
+        raise HTTPException(status_code=404, detail="Tourist not found")
+    try:
+        location_store.update(tourist_id, location.latitude, location.longitude)
+    except LocationStoreFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "5"})
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 # ----------------------
 # Create Incident
 # ----------------------
 @router.post("/incidents", response_model=IncidentResponse)
-def create_incident(incident_data: IncidentCreate, tourist_id: str, db: Session = Depends(get_db)):
+def create_incident(incident_data: IncidentCreate, tourist_id: UUID, db: Session = Depends(get_db)):
     # Verify tourist exists
-    tourist = db.query(TouristProfile).filter(TouristProfile.tourist_id == tourist_id).first()
-    if not tourist:
+    if not profile_cache.tourist_exists(db, tourist_id):
         raise HTTPException(status_code=404, detail="Tourist not found")
     
     # Create incident
@@ -54,6 +102,13 @@ def create_incident(incident_data: IncidentCreate, tourist_id: str, db: Session
     )
     
     db.add(incident)
+    coords = parse_coordinates(incident_data.latitude, incident_data.longitude)
+    if coords:
+        save_location(db, tourist_id, *coords)
+    db.flush()
+    record_incident_created(db, incident)
+    record_incident_tile(db, incident)
+    stage_incident_created(db, incident)
     db.commit()
     db.refresh(incident)
     
@@ -73,77 +128,87 @@ def create_incident(incident_data: IncidentCreate, tourist_id: str, db: Session
 # Get Tourist's Incidents
 # ----------------------
 @router.get("/incidents/{tourist_id}", response_model=List[IncidentResponse])
-def get_tourist_incidents(tourist_id: str, db: Session = Depends(get_db)):
-    incidents = db.query(Incident).filter(Incident.tourist_id == tourist_id).all()
+def get_tourist_incidents(tourist_id: UUID, response: Response, db: Session = Depends(get_db)):
+    rows = incident_listing_query(db).filter(Incident.tourist_id == tourist_id).all()
     
-    return [
-        IncidentResponse(
-            incident_id=str(incident.incident_id),
-            title=incident.title,
-            description=incident.description,
-            category=incident.category,
-            latitude=incident.latitude,
-            longitude=incident.longitude,
-            status=incident.status,
-            priority=incident.priority,
-            created_at=incident.created_at
-        ) for incident in incidents
-    ]
+    return list_response(incident_items(rows), response)
 
 # ----------------------
 # Get Nearby Alerts
 # ----------------------
 @router.get("/alerts/{tourist_id}", response_model=List[AlertResponse])
-def get_tourist_alerts(tourist_id: str, db: Session = Depends(get_db)):
-    # Get all alerts for this tourist
-    alerts = db.query(Alert).filter(Alert.tourist_id == tourist_id).all()
+def get_tourist_alerts(
+    tourist_id: UUID,
+    response: Response,
+    unread_only: bool = False,
+    since: Optional[datetime] = Query(None, description="Only alerts created at or after this time; defaults to ALERT_FEED_DAYS ago"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    since = since or feed_window_start()
+    # Only the tourist's own alerts and their incidents (titles and status are shown)
+    etag = make_etag(tourist_alerts_state(db, tourist_id, since), since)
+    cached = not_modified(response, etag, if_none_match)
+    if cached:
+        return cached
+
+    # One joined query for this tourist's alerts, newest first
+    query = alert_listing_query(db).add_columns(Alert.is_read).filter(Alert.tourist_id == tourist_id)
+    if since is not None:
+        query = query.filter(Alert.created_at >= since)
+    if unread_only:
+        query = query.filter(Alert.is_read == false())
+    rows = query.order_by(Alert.created_at.desc(), Alert.alert_id.desc()).all()
+    
+    return list_response(alert_items(rows), response)
+
+# ----------------------
+# Alert Read State
+# ----------------------
+@router.get("/alerts/{tourist_id}/unread-count", response_model=UnreadAlertCount)
+def get_unread_alert_count(tourist_id: UUID, db: Session = Depends(get_db)):
+    # Bounded by UNREAD_COUNT_CAP; clients show "999+" when capped
+    unread, capped = count_unread(db, tourist_id)
+    return UnreadAlertCount(unread=unread, capped=capped)
+
+@router.post("/alerts/{tourist_id}/read")
+def mark_alerts_read(tourist_id: UUID, data: AlertsMarkRead, db: Session = Depends(get_db)):
+    marked = mark_read(db, tourist_id, data.up_to_alert_id)
+    if marked is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    db.commit()
     
-    result = []
-    for alert in alerts:
-        incident = db.query(Incident).filter(Incident.incident_id == alert.incident_id).first()
-        if incident:
-            result.append(AlertResponse(
-                alert_id=str(alert.alert_id),
-                incident_id=str(alert.incident_id),
-                title=incident.title,
-                category=incident.category,
-                distance=alert.distance_km,
-                status=incident.status,
-                created_at=alert.created_at
-            ))
+    unread, capped = count_unread(db, tourist_id)
+    return {"marked_read": marked, "unread": unread, "capped": capped}
+
+# ----------------------
+# Stream New Alerts (Server-Sent Events)
+# ----------------------
+@router.get("/alerts/{tourist_id}/stream")
+async def stream_tourist_alerts(tourist_id: UUID, last_event_id: Optional[str] = Header(None)):
+    # Reconnecting clients send Last-Event-ID and first receive what they missed
+    after = decode_cursor(last_event_id) if last_event_id else None
+    if not await run_in_threadpool(tourist_exists, tourist_id):
+        raise HTTPException(status_code=404, detail="Tourist not found")
     
-    return result
+    return StreamingResponse(
+        alert_stream.events(tourist_id, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ----------------------
 # Create Alert for Nearby Tourists
 # ----------------------
 @router.post("/alerts/create")
-def create_alert_for_nearby_tourists(incident_id: str, db: Session = Depends(get_db)):
+def create_alert_for_nearby_tourists(incident_id: UUID, radius_km: Optional[float] = Query(None, gt=0, le=100), db: Session = Depends(get_db)):
     # Get the incident
     incident = db.query(Incident).filter(Incident.incident_id == incident_id).first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    # Get all tourists (in a real app, you'd filter by location)
-    tourists = db.query(TouristProfile).all()
-    
-    alerts_created = 0
-    for tourist in tourists:
-        # Skip the tourist who created the incident
-        if str(tourist.tourist_id) == str(incident.tourist_id):
-            continue
-            
-        # Calculate distance (simplified - in real app use proper geolocation)
-        distance = "2.5km"  # Placeholder
-        
-        # Create alert
-        alert = Alert(
-            incident_id=incident_id,
-            tourist_id=tourist.tourist_id,
-            distance_km=distance
-        )
-        db.add(alert)
-        alerts_created += 1
+    # Alert only tourists whose last known location is within the radius
+    alerts_created = create_proximity_alerts(db, incident, radius_km)
     
     db.commit()
     return {"message": f"Created {alerts_created} alerts for nearby tourists"}
@@ -152,13 +217,14 @@ def create_alert_for_nearby_tourists(incident_id: str, db: Session = Depends(get
 # Update Safety Score
 # ----------------------
 @router.put("/safety-score/{tourist_id}")
-def update_safety_score(tourist_id: str, score: int, db: Session = Depends(get_db)):
+def update_safety_score(tourist_id: UUID, score: int, db: Session = Depends(get_db)):
     tourist = db.query(TouristProfile).filter(TouristProfile.tourist_id == tourist_id).first()
     if not tourist:
         raise HTTPException(status_code=404, detail="Tourist not found")
     
     tourist.safety_score = max(0, min(100, score))  # Clamp between 0-100
     db.commit()
+    profile_cache.invalidate_tourist(tourist_id)
     
     return {"message": "Safety score updated", "new_score": tourist.safety_score}
 
@@ -166,12 +232,31 @@ def update_safety_score(tourist_id: str, score: int, db: Session = Depends(get_d
 # SOS: Create high-priority incident and notify nearby tourists
 # ----------------------
 @router.post("/sos")
-def send_sos(tourist_id: str, data: SOSRequest, db: Session = Depends(get_db)):
-    tourist = db.query(TouristProfile).filter(TouristProfile.tourist_id == tourist_id).first()
-    if not tourist:
+def send_sos(tourist_id: UUID, data: SOSRequest, db: Session = Depends(get_db)):
+    if not profile_cache.tourist_exists(db, tourist_id):
         raise HTTPException(status_code=404, detail="Tourist not found")
 
+    coords = parse_coordinates(data.latitude, data.longitude)
+    # Repeats of a recent SOS join its incident instead of raising and broadcasting another
+    window, action = sos_coalescer.admit(tourist_id, coords, data.message)
+    if action == RETRY:
+        # The first SOS is still being committed; its outcome decides what this one does
+        raise HTTPException(status_code=503, detail="SOS is being raised, please retry", headers={"Retry-After": "1"})
+    if action == SKIP:
+        return {"message": "SOS received", "incident_id": str(window.incident_id), "coalesced": True}
+    if action == UPDATE:
+        if update_sos_incident(db, window.incident_id, data.message, coords):
+            if coords:
+                save_location(db, tourist_id, *coords)
+            db.commit()
+            sos_coalescer.confirm_update(tourist_id, window, data.message, coords)
+            return {"message": "SOS updated", "incident_id": str(window.incident_id), "coalesced": True}
+        # Resolved or deleted since the window opened; this is a new emergency
+        sos_coalescer.discard(tourist_id, window)
+        window, action = sos_coalescer.admit(tourist_id, coords, data.message, replace=True)
+
     incident = Incident(
+        incident_id=window.incident_id,
         tourist_id=tourist_id,
         title="SOS Alert",
         description=data.message or "Emergency SOS triggered by tourist",
@@ -180,31 +265,42 @@ def send_sos(tourist_id: str, data: SOSRequest, db: Session = Depends(get_db)):
         longitude=data.longitude,
         priority="Critical"
     )
-    db.add(incident)
-    db.flush()
+    try:
+        db.add(incident)
+        if coords:
+            save_location(db, tourist_id, *coords)
+        db.flush()
+        record_incident_created(db, incident)
+        record_incident_tile(db, incident)
+        stage_incident_created(db, incident)
 
-    # Naive broadcast to other tourists as alert (placeholder for real proximity logic)
-    tourists = db.query(TouristProfile).all()
-    for t in tourists:
-        if str(t.tourist_id) == str(tourist_id):
-            continue
-        alert = Alert(
-            incident_id=incident.incident_id,
-            tourist_id=t.tourist_id,
-            distance_km="~1km"
-        )
-        db.add(alert)
+        # Alerts to nearby tourists are generated in the background so the SOS returns at once
+        job_id = fanout_pipeline.enqueue(db, incident.incident_id)
+        db.commit()
+    except Exception:
+        sos_coalescer.discard(tourist_id, window)
+        raise
+    sos_coalescer.confirm(window)
+    fanout_pipeline.submit(job_id)
 
-    db.commit()
-    return {"message": "SOS created", "incident_id": str(incident.incident_id)}
+    return {"message": "SOS created", "incident_id": str(incident.incident_id), "coalesced": False}
 
 # ----------------------
-# Risk Zones: return static zones for MVP
+# Risk Zones
 # ----------------------
 @router.get("/risk-zones", response_model=list[RiskZone])
-def get_risk_zones():
-    return [
-        RiskZone(id="rz-1", name="Old Fort Restricted Area", latitude=28.6562, longitude=77.2410, radius_meters=300, risk_level="Restricted"),
-        RiskZone(id="rz-2", name="Night Theft Hotspot", latitude=28.6139, longitude=77.2090, radius_meters=500, risk_level="High"),
-        RiskZone(id="rz-3", name="Riverbank Slippery Zone", latitude=28.7041, longitude=77.1025, radius_meters=400, risk_level="Medium"),
-    ]
+def get_risk_zones(db: Session = Depends(get_db)):
+    return [RiskZone(**zone) for zone in risk_zone_index.zones(db)]
+
+# ----------------------
+# Risk Zones at a Point
+# ----------------------
+@router.get("/risk-zones/check", response_model=list[RiskZoneHit])
+def check_risk_zones(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    near_meters: float = Query(0, ge=0, le=50_000),
+    db: Session = Depends(get_db)
+):
+    # Zones containing the point, plus those within near_meters of their edge
+    return [RiskZoneHit(**hit) for hit in risk_zone_index.check(db, [(latitude, longitude)], near_meters)[0]]
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 
@@ -44,20 +44,20 @@ class IncidentCreate(BaseModel):
     title: str
     description: str
     category: str
-    latitude: Optional[str] = None
-    longitude: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class IncidentResponse(BaseModel):
     incident_id: str
     title: str
     description: str
     category: str
-    latitude: Optional[str]
-    longitude: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
     status: str
     priority: str
     created_at: datetime
-    distance: Optional[str] = None
+    distance: Optional[float] = None  # km
 
     class Config:
         from_attributes = True
@@ -70,20 +70,35 @@ class AlertResponse(BaseModel):
     incident_id: str
     title: str
     category: str
-    distance: Optional[str]
+    distance: Optional[float]  # km
     status: str
     created_at: datetime
+    is_read: bool
 
     class Config:
         from_attributes = True
 
+class AlertsMarkRead(BaseModel):
+    up_to_alert_id: Optional[UUID] = None  # this alert and older ones; all unread alerts if omitted
+
+class UnreadAlertCount(BaseModel):
+    unread: int
+    capped: bool  # more than `unread` alerts are unread
+
 # ----------------------
 # SOS
 # ----------------------
 class SOSRequest(BaseModel):
     message: Optional[str] = None
-    latitude: Optional[str] = None
-    longitude: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+# ----------------------
+# Location
+# ----------------------
+class LocationUpdate(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
 
 # ----------------------
 # Risk Zones
@@ -96,6 +111,42 @@ class RiskZone(BaseModel):
     radius_meters: int
     risk_level: str  # e.g., 'High', 'Medium', 'Restricted'
 
+class RiskZoneCreate(BaseModel):
+    name: str
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    radius_meters: int = Field(gt=0, le=100_000)
+    risk_level: str
+
+class RiskZoneUpdate(BaseModel):
+    name: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_meters: Optional[int] = Field(None, gt=0, le=100_000)
+    risk_level: Optional[str] = None
+
+class RiskZoneHit(RiskZone):
+    distance_meters: float  # from the zone centre
+    inside: bool
+
+class ZoneCheckPoint(BaseModel):
+    id: Optional[str] = None  # echoed back, e.g. a tourist id
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+class ZoneCheckRequest(BaseModel):
+    points: List[ZoneCheckPoint] = Field(max_length=100_000)
+    near_meters: float = Field(0, ge=0, le=50_000)  # also report zones within this distance of their edge
+
+class ZoneCheckMatch(BaseModel):
+    index: Optional[int] = None  # position in the request, for batch checks
+    id: Optional[str] = None
+    zones: List[RiskZoneHit]
+
+class ZoneCheckResponse(BaseModel):
+    checked: int
+    matches: List[ZoneCheckMatch]  # only points that hit at least one zone
+
 # ----------------------
 # User Response
 # ----------------------
@@ -0,0 +1,206 @@
+"""
+SOS coalescing.
+
+A tourist in trouble (or a retrying client) may send many SOS requests in a
+few seconds. Each one used to create a Critical incident and a full alert
+broadcast. SOSCoalescer keeps one window per tourist, in memory and with
+expiry. A repeat SOS within SOS_COALESCE_SECONDS of the previous one, and
+within SOS_COALESCE_RADIUS_METERS of it, joins the open incident: the
+incident's location and description are updated, but no new incident or
+broadcast is created, and the client gets the same incident_id. The incident
+id is chosen when the window opens, so concurrent repeats see it before the
+creating request commits. A repeat carrying the same message and position
+as the last write, closer than SOS_COALESCE_UPDATE_SECONDS to it, is answered
+without touching the database; a newer message or position is always written.
+A repeat that arrives before the incident is committed waits for the
+creating request, so it is never acknowledged for an incident that may not
+exist: once the commit is done it updates or skips as usual, and if the
+creation failed it creates the incident itself. After SOS_COALESCE_WAIT_SECONDS
+it is answered with 503 and the client retries.
+
+Windows are per process; with several workers a repeat that lands on
+another worker opens a window there.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import (
+    SOS_COALESCE_MAX_TOURISTS,
+    SOS_COALESCE_RADIUS_METERS,
+    SOS_COALESCE_SECONDS,
+    SOS_COALESCE_UPDATE_SECONDS,
+    SOS_COALESCE_WAIT_SECONDS,
+)
+from .etag import INCIDENTS, touch
+from .geo import haversine_km
+from .heatmap import record_incident_moved
+from .incident_events import stage_incident_moved
+from .models import Incident
+
+CREATE = "create"  # open a window: new incident and broadcast
+UPDATE = "update"  # update the window's incident
+SKIP = "skip"  # answer with the window's incident, no writes
+RETRY = "retry"  # the window's incident is still being created; ask the client to retry
+
+
+Payload = Tuple[Optional[str], Optional[Tuple[float, float]]]  # (message, coords) of an SOS
+
+
+class SOSWindow:
+    __slots__ = ("incident_id", "coords", "expires_at", "committed", "settled", "last_write", "written")
+
+    def __init__(self, coords: Optional[Tuple[float, float]], message: Optional[str], now: float, expires_at: float):
+        self.incident_id = uuid.uuid4()
+        self.coords = coords
+        self.expires_at = expires_at
+        self.committed = False  # set once the incident row is visible to other requests
+        self.settled = threading.Event()  # set once the creating request committed or gave up
+        self.last_write = now
+        self.written: Payload = (message, coords)  # what the incident holds
+
+    def is_news(self, message: Optional[str], coords) -> bool:
+        """Whether this SOS carries a message or position the incident does not have yet."""
+        written_message, written_coords = self.written
+        return bool(message) and message != written_message or coords is not None and coords != written_coords
+
+    def merge(self, message: Optional[str], coords) -> Payload:
+        # A repeat without a message or position keeps the previous one, as update_sos_incident does
+        written_message, written_coords = self.written
+        return message or written_message, coords if coords is not None else written_coords
+
+
+class SOSCoalescer:
+    def __init__(self, window: float = SOS_COALESCE_SECONDS, radius_meters: float = SOS_COALESCE_RADIUS_METERS,
+                 update_interval: float = SOS_COALESCE_UPDATE_SECONDS, max_tourists: int = SOS_COALESCE_MAX_TOURISTS,
+                 wait: float = SOS_COALESCE_WAIT_SECONDS):
+        self.window = window
+        self.radius_km = radius_meters / 1000
+        self.update_interval = update_interval
+        self.max_tourists = max_tourists
+        self.wait = wait
+        # Sliding windows all last self.window, so entries stay ordered by expiry
+        self._windows: "OrderedDict[str, SOSWindow]" = OrderedDict()
+        self._lock = threading.Lock()  # never held across database I/O
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.retried = 0
+
+    def _near(self, window: SOSWindow, coords) -> bool:
+        # An SOS without a position belongs to the tourist's current emergency
+        if coords is None or window.coords is None:
+            return True
+        return haversine_km(*window.coords, *coords) <= self.radius_km
+
+    def admit(self, tourist_id, coords: Optional[Tuple[float, float]], message: Optional[str] = None,
+              replace: bool = False) -> Tuple[SOSWindow, str]:
+        """
+        The tourist's window and what this SOS should do: CREATE, UPDATE, SKIP
+        or RETRY. While the window's incident is being created this blocks
+        until the creating request confirms or discards the window, for at
+        most self.wait seconds, so a repeat is only answered once the
+        incident it joins is committed.
+        """
+        key = str(tourist_id)
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                while self._windows:
+                    oldest = next(iter(self._windows.values()))
+                    if oldest.expires_at > now:
+                        break
+                    self._windows.popitem(last=False)
+
+                window = self._windows.get(key)
+                if window is None or replace or self.window <= 0 or not self._near(window, coords):
+                    window = SOSWindow(coords, message, now, now + self.window)
+                    self.created += 1
+                    if self.window > 0:
+                        self._windows[key] = window
+                        self._windows.move_to_end(key)
+                        while len(self._windows) > self.max_tourists:
+                            self._windows.popitem(last=False)
+                    return window, CREATE
+
+                if window.committed:
+                    if not window.is_news(message, coords) and now - window.last_write < self.update_interval:
+                        window.expires_at = now + self.window
+                        self._windows.move_to_end(key)
+                        self.skipped += 1
+                        return window, SKIP
+                    # The window records the update in confirm_update, once it is committed
+                    self.updated += 1
+                    return window, UPDATE
+
+            # Outside the lock: the creating request needs it to confirm
+            if not window.settled.wait(max(0.0, deadline - now)):
+                self.retried += 1
+                return window, RETRY
+
+    def confirm(self, window: SOSWindow) -> None:
+        """The window's incident is committed; repeats waiting for it go ahead."""
+        with self._lock:
+            window.committed = True
+        window.settled.set()
+
+    def confirm_update(self, tourist_id, window: SOSWindow, message: Optional[str], coords) -> None:
+        """An UPDATE is committed: later repeats compare against it and the window is extended."""
+        now = time.monotonic()
+        with self._lock:
+            window.written = window.merge(message, coords)
+            window.last_write = now
+            if coords is not None:
+                window.coords = coords
+            window.expires_at = now + self.window
+            if self._windows.get(str(tourist_id)) is window:
+                self._windows.move_to_end(str(tourist_id))
+
+    def discard(self, tourist_id, window: SOSWindow) -> None:
+        """Close the window, e.g. when its incident failed to commit or was resolved."""
+        with self._lock:
+            if self._windows.get(str(tourist_id)) is window:
+                del self._windows[str(tourist_id)]
+        # Repeats waiting on a failed creation find no window and create the incident themselves
+        window.settled.set()
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "open_windows": len(self._windows),
+            "created": self.created,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "retried": self.retried,
+        }
+
+
+def update_sos_incident(db: Session, incident_id, message: Optional[str], coords) -> bool:
+    """Move an open SOS incident to the latest report. False if it is gone or resolved (caller commits)."""
+    # Locked so the heatmap tile moves from the position this update replaces
+    incident = db.query(Incident).filter(
+        Incident.incident_id == incident_id, Incident.status != "Resolved"
+    ).with_for_update().first()
+    if incident is None:
+        return False
+    before = (incident.description, incident.latitude, incident.longitude)
+    if message:
+        incident.description = message
+    if coords is not None:
+        record_incident_moved(db, incident, *coords)
+        incident.latitude, incident.longitude = coords
+    incident.updated_at = datetime.utcnow()
+    touch(db, INCIDENTS)
+    if (incident.description, incident.latitude, incident.longitude) != before:
+        stage_incident_moved(db, incident)
+    return True
+
+
+sos_coalescer = SOSCoalescer()
+
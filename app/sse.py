@@ -0,0 +1,110 @@
+"""
+Plumbing shared by the Server-Sent Events streams (alert_stream and
+incident_events).
+
+Each connection gets a Subscriber with a bounded queue. A client that falls
+buffer_size events behind is marked overflowed and disconnected instead of
+buffered without bound; it reconnects and catches up from the database.
+EventStream runs the per-connection loop (reconnect hint, events, keepalive
+comments) and keeps the counters both streams report.
+
+Writers stage events on their session (EventStream.stage_events); they are
+published when that session commits and dropped if it rolls back.
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+RETRY_HINT = "retry: 3000\n\n"  # milliseconds a disconnected client waits before reconnecting
+KEEPALIVE = ": keepalive\n\n"
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def accepts(self, item) -> bool:
+        """Whether to queue item; subscribers that drop duplicates override this."""
+        return True
+
+    def offer(self, item) -> None:
+        # Runs on the subscriber's event loop
+        if self.overflowed or not self.accepts(item):
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, item) -> bool:
+        """Queue item from any thread. False once the subscriber's event loop has shut down."""
+        try:
+            self.loop.call_soon_threadsafe(self.offer, item)
+        except RuntimeError:
+            return False
+        return True
+
+
+class EventStream(ABC):
+    """A set of SSE connections fed from one source; subclasses track their subscribers."""
+
+    def __init__(self, buffer_size: int, heartbeat: float):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.overflow_disconnects = 0
+        self.events_sent = 0
+
+    @abstractmethod
+    def publish(self, items: List) -> None:
+        """Hand staged items to this process's subscribers; safe from any thread."""
+
+    @abstractmethod
+    def format_event(self, item) -> str:
+        """One item as SSE text."""
+
+    def stage_events(self, db: Session, items: List) -> None:
+        """Publish items once db commits; they are dropped if it rolls back."""
+        if items:
+            # Keyed by the stream itself in Session.info
+            db.info.setdefault(self, []).extend(items)
+
+    async def live(self, subscriber: Subscriber):
+        """SSE text for the subscriber's queued items and heartbeats, until it overflows."""
+        while not subscriber.overflowed:
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            if subscriber.overflowed:
+                break
+            self.events_sent += 1
+            yield self.format_event(item)
+
+        # Too slow: close so the client reconnects and catches up
+        self.overflow_disconnects += 1
+
+
+def _staged_streams(session) -> List[EventStream]:
+    return [key for key in session.info if isinstance(key, EventStream)]
+
+
+@event.listens_for(Session, "after_commit")
+def publish_staged_events(session):
+    for stream in _staged_streams(session):
+        stream.publish(session.info.pop(stream))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_staged_events(session, previous_transaction):
+    for stream in _staged_streams(session):
+        del session.info[stream]
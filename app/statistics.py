@@ -0,0 +1,165 @@
+"""
+Incrementally maintained dashboard counters.
+
+Every write that creates an incident, changes its status or priority, or
+registers a tourist adjusts the matching stat_counters rows in the same
+transaction, so the statistics endpoint reads a few dozen rows instead of
+counting the incidents table. reconcile() recomputes the counters from the
+source tables and fixes any drift; it runs periodically and on demand.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from config import STATS_DAYS, STATS_RECONCILE_INTERVAL_SECONDS
+from .database import SessionLocal, dialect_insert
+from .models import Incident, StatCounter, TouristProfile
+from .utils import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+Deltas = Dict[Tuple[str, str], int]
+
+# Collection version counters for conditional GETs (see etag.py); they count writes, so are never reconciled
+VERSION = "version"
+
+
+def _day(created_at) -> str:
+    return (created_at or datetime.utcnow()).date().isoformat()
+
+
+def apply_deltas(db: Session, deltas: Deltas) -> None:
+    """Add each delta to its (dimension, key) counter with a single upsert."""
+    # Rows are locked in statement order; a fixed order keeps opposite moves
+    # (Active -> Resolved and back) from deadlocking on the same two counters
+    rows = sorted(
+        ({"dimension": dimension, "key": key, "count": delta}
+         for (dimension, key), delta in deltas.items() if delta and key is not None),
+        key=lambda row: (row["dimension"], row["key"]),
+    )
+    if not rows:
+        return
+
+    statement = dialect_insert(db, StatCounter)
+    if statement is None:
+        for row in rows:
+            counter = db.get(StatCounter, (row["dimension"], row["key"]))
+            if counter is None:
+                db.add(StatCounter(**row))
+            else:
+                counter.count += row["count"]
+        return
+
+    statement = statement.values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[StatCounter.dimension, StatCounter.key],
+        set_={"count": StatCounter.count + statement.excluded["count"]},
+    )
+    db.execute(statement)
+
+
+def record_incident_created(db: Session, incident: Incident) -> None:
+    """Call after the incident is flushed, so its defaults are populated."""
+    apply_deltas(db, {
+        ("status", incident.status): 1,
+        ("priority", incident.priority): 1,
+        ("category", incident.category): 1,
+        ("day", _day(incident.created_at)): 1,
+        (VERSION, "incidents"): 1,
+    })
+
+
+def record_incident_changed(db: Session, dimension: str, old_value: str, new_value: str) -> None:
+    """A status or priority change moves one count from the old value to the new one."""
+    if old_value == new_value:
+        return
+    apply_deltas(db, {(dimension, old_value): -1, (dimension, new_value): 1, (VERSION, "incidents"): 1})
+
+
+def record_tourist_registered(db: Session) -> None:
+    apply_deltas(db, {("tourists", "total"): 1})
+
+
+def get_statistics(db: Session, days: int = STATS_DAYS) -> dict:
+    # Day keys are UTC dates (see _day), whatever the server's time zone
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    rows = db.query(StatCounter.dimension, StatCounter.key, StatCounter.count).filter(
+        (StatCounter.dimension != "day") | (StatCounter.key >= since)
+    ).all()
+
+    breakdown: Dict[str, Dict[str, int]] = {"status": {}, "priority": {}, "category": {}, "day": {}}
+    total_tourists = 0
+    for dimension, key, count in rows:
+        if dimension == "tourists":
+            total_tourists = count
+        elif dimension in breakdown and count:
+            breakdown[dimension][key] = count
+
+    by_status = breakdown["status"]
+    return {
+        "total_tourists": total_tourists,
+        "active_incidents": by_status.get("Active", 0),
+        "resolved_incidents": by_status.get("Resolved", 0),
+        "total_incidents": sum(by_status.values()),
+        "by_status": by_status,
+        "by_priority": breakdown["priority"],
+        "by_category": breakdown["category"],
+        "by_day": dict(sorted(breakdown["day"].items())),
+    }
+
+
+def reconcile(db: Session) -> Deltas:
+    """
+    Recompute every counter from the source tables and correct the stored
+    values. Returns the corrections applied (empty when nothing had drifted).
+    The caller commits.
+    """
+    expected: Counter = Counter()
+    expected[("tourists", "total")] = db.query(func.count(TouristProfile.tourist_id)).scalar()
+    for dimension, column in (("status", Incident.status), ("priority", Incident.priority),
+                              ("category", Incident.category)):
+        for key, count in db.query(column, func.count()).group_by(column).all():
+            expected[(dimension, key)] = count
+    day = func.date(Incident.created_at)
+    for key, count in db.query(day, func.count()).group_by(day).all():
+        expected[("day", str(key))] = count
+
+    stored = {(dimension, key): count
+              for dimension, key, count in db.query(StatCounter.dimension, StatCounter.key, StatCounter.count)
+              if dimension != VERSION}
+    corrections = {}
+    for counter_key in set(expected) | set(stored):
+        drift = expected.get(counter_key, 0) - stored.get(counter_key, 0)
+        if drift:
+            corrections[counter_key] = drift
+    apply_deltas(db, corrections)
+    return corrections
+
+
+def reconcile_now() -> Deltas:
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # Stored and recomputed counts must come from one snapshot; the
+            # corrections are deltas, so writes committed meanwhile are kept
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        corrections = reconcile(db)
+        db.commit()
+        if corrections:
+            logger.warning("Corrected statistics drift: %s", corrections)
+        return corrections
+    except OperationalError:
+        # A concurrent counter update won the race; the next run will catch up
+        db.rollback()
+        logger.info("Statistics reconciliation skipped after a serialization conflict")
+        return {}
+    finally:
+        db.close()
+
+
+stats_reconciler = PeriodicJob("stats-reconciler", STATS_RECONCILE_INTERVAL_SECONDS, reconcile_now)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.hash import bcrypt
+from sqlalchemy.util import await_only
+from sqlalchemy.util.concurrency import in_greenlet
+
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_QUEUE_LIMIT, PASSWORD_HASH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------
+# Background jobs
+# ----------------------
+class PeriodicJob:
+    """Run fn() every interval seconds on a daemon thread until stopped."""
+
+    def __init__(self, name: str, interval: float, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("Periodic job %s failed", self.name)
+
+
+# ----------------------
+# Password hashing
+# ----------------------
+_bcrypt = bcrypt.using(rounds=BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return _bcrypt.hash(password)
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return _bcrypt.verify(password, password_hash)
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    return _bcrypt.needs_update(password_hash)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when the hashing pool is saturated."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a process pool so hashing uses every core and does not
+    hold request threads on the GIL. At most max_pending hashes may be queued
+    or running; beyond that callers get PasswordHasherBusy immediately, which
+    the app turns into a 503, rather than waiting behind a growing queue.
+    workers=0 hashes inline on the calling thread.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.workers <= 0:
+            return
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        try:
+            # Under AsyncSession.run_sync (DB_MODE=async) wait without blocking the event loop
+            if self.workers > 0:
+                self.start()
+                future = self._executor.submit(fn, *args)
+                result = await_only(asyncio.wrap_future(future)) if in_greenlet() else future.result()
+            elif in_greenlet():
+                result = await_only(asyncio.to_thread(fn, *args))
+            else:
+                result = fn(*args)
+            self.completed += 1
+            return result
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(hash_password, password)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._run(verify_password, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_needs_rehash(password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
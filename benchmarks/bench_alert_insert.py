@@ -0,0 +1,82 @@
+"""
+ORM add() loop versus the chunked bulk alert writer.
+
+    python -m benchmarks.bench_alert_insert
+
+Each run writes one alert per recipient inside a transaction that is rolled
+back afterwards. "peak MB" is the tracemalloc peak of a separate bulk run and
+should stay roughly constant as the recipient count grows.
+"""
+import random
+import tracemalloc
+import uuid
+
+from benchmarks.common import measure, random_point_near, seed_tourists, use_database
+
+engine = use_database("alert_insert")
+
+from app.alerts import insert_alerts  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models import Alert, Incident  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def make_incident(db, reporter_id):
+    incident = Incident(tourist_id=reporter_id, title="SOS Alert", description="bench",
+                        category="Emergency", priority="Critical")
+    db.add(incident)
+    db.flush()
+    return incident
+
+
+def orm_loop(reporter_id, recipients):
+    db = SessionLocal()
+    try:
+        incident = make_incident(db, reporter_id)
+        for tourist_id, distance in recipients:
+            db.add(Alert(incident_id=incident.incident_id, tourist_id=tourist_id,
+                         distance_km=round(distance, 3)))
+        db.flush()
+    finally:
+        db.rollback()
+        db.close()
+
+
+def bulk(reporter_id, recipients):
+    db = SessionLocal()
+    try:
+        incident = make_incident(db, reporter_id)
+        insert_alerts(db, incident.incident_id, iter(recipients))
+    finally:
+        db.rollback()
+        db.close()
+
+
+def bulk_peak_mb(reporter_id, count):
+    # Recipients are generated lazily so only the writer's own memory is measured
+    rng = random.Random(count)
+    tracemalloc.start()
+    bulk(reporter_id, ((uuid.uuid4(), rng.random() * 5) for _ in range(count)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def main():
+    rng = random.Random(7)
+    tourist_ids = seed_tourists(engine, [random_point_near(28.6, 77.2, 5, rng) for _ in range(max(SIZES) + 1)])
+    reporter_id = tourist_ids[0]
+
+    print(f"{'recipients':>10} {'ORM loop ms':>12} {'bulk ms':>10} {'speedup':>8} {'bulk peak MB':>13}")
+    for size in SIZES:
+        recipients = [(tourist_id, rng.random() * 5) for tourist_id in tourist_ids[1:size + 1]]
+        repeat = 3 if size < 100_000 else 1
+        orm_ms = measure(lambda: orm_loop(reporter_id, recipients), repeat)
+        bulk_ms = measure(lambda: bulk(reporter_id, recipients), repeat)
+        print(f"{size:>10} {orm_ms:>12.1f} {bulk_ms:>10.1f} {orm_ms / bulk_ms:>7.1f}x "
+              f"{bulk_peak_mb(reporter_id, size):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Requests per second and latency of DB_MODE=sync versus DB_MODE=async under
+mixed traffic: profile reads, alert listings and incident pages, plus a share
+of SOS requests.
+
+    python -m benchmarks.bench_db_mode
+    BENCH_DATABASE_URL=postgresql://... BENCH_DURATION=30 python -m benchmarks.bench_db_mode
+
+Each mode runs in its own uvicorn process against the same seeded database.
+The last two columns come from the server's /health pool telemetry and are
+cumulative per mode.
+Async mode needs the async driver for the database (aiosqlite or asyncpg).
+SQLite serialises writers, so use a scratch Postgres database for numbers
+that mean anything for production.
+"""
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.common import percentile, random_point_near, seed_incidents, seed_tourists, start_server, use_database
+
+engine = use_database("db_mode")
+
+import httpx  # noqa: E402
+
+PORT = int(os.getenv("BENCH_PORT", "8765"))
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+SOS_SHARE = float(os.getenv("BENCH_SOS_SHARE", "0.05"))
+CONCURRENCY = (10, 50, 200)
+CENTER = (28.6139, 77.2090)
+
+
+async def run_load(tourist_ids, concurrency):
+    rng = random.Random(concurrency)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + DURATION
+
+    def next_request():
+        tourist_id = rng.choice(tourist_ids)
+        roll = rng.random()
+        if roll < SOS_SHARE:
+            lat, lon = random_point_near(*CENTER, 2, rng)
+            return "POST", f"/api/tourist/sos?tourist_id={tourist_id}", {"latitude": lat, "longitude": lon}
+        if roll < 0.4:
+            return "GET", f"/api/tourist/profile/{tourist_id}", None
+        if roll < 0.8:
+            return "GET", f"/api/tourist/alerts/{tourist_id}", None
+        return "GET", "/api/authority/incidents?limit=20", None
+
+    async def client_loop(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            method, path, body = next_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies, errors
+
+
+def main():
+    rng = random.Random(3)
+    tourist_ids = seed_tourists(engine, [random_point_near(*CENTER, 3, rng) for _ in range(2_000)])
+    seed_incidents(engine, tourist_ids[0], 500, alerts_for=tourist_ids[:50])
+
+    print(f"{DURATION:.0f}s per level, {SOS_SHARE:.0%} SOS")
+    print(f"{'mode':<6} {'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'pool wait p99':>14} {'pool timeouts':>14}")
+    for mode in ("sync", "async"):
+        server = start_server(PORT, {"DB_MODE": mode, "FANOUT_POLL_INTERVAL_SECONDS": "1"})
+        try:
+            for concurrency in CONCURRENCY:
+                throughput, latencies, errors = asyncio.run(run_load(tourist_ids, concurrency))
+                pool = httpx.get(f"http://127.0.0.1:{PORT}/health").json()["database_pool"][mode]
+                print(f"{mode:<6} {concurrency:>11} {throughput:>8.1f} {percentile(latencies, 50):>8.1f} "
+                      f"{percentile(latencies, 99):>8.1f} {errors:>7} {pool['wait_ms_p99']:>14} "
+                      f"{pool['checkout_timeouts']:>14}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
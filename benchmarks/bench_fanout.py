@@ -0,0 +1,80 @@
+"""
+Proximity fan-out cost versus total and nearby tourist counts.
+
+    python -m benchmarks.bench_fanout
+
+The first table keeps 100 tourists near the incident and grows the total
+population; the indexed fan-out should stay flat while the old full-table
+scan grows linearly. The second table grows the nearby set instead.
+"""
+import random
+import uuid
+
+from benchmarks.common import measure, random_point_near, seed_tourists, use_database
+
+engine = use_database("fanout")
+
+from app.alerts import create_proximity_alerts  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models import Incident, TouristProfile  # noqa: E402
+
+CENTER = (28.6139, 77.2090)
+RADIUS_KM = 5.0
+
+
+def far_points(count, rng):
+    # Scattered over India, well outside the alert radius of CENTER
+    points = []
+    while len(points) < count:
+        lat, lon = rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+        if abs(lat - CENTER[0]) > 0.5 or abs(lon - CENTER[1]) > 0.5:
+            points.append((lat, lon))
+    return points
+
+
+def run_fanout(reporter_id):
+    db = SessionLocal()
+    try:
+        incident = Incident(incident_id=uuid.uuid4(), tourist_id=reporter_id, title="SOS Alert",
+                            description="bench", category="Emergency",
+                            latitude=CENTER[0], longitude=CENTER[1], priority="Critical")
+        create_proximity_alerts(db, incident, RADIUS_KM)
+        db.flush()
+    finally:
+        db.rollback()
+        db.close()
+
+
+def run_full_scan():
+    # What send_sos used to do before any alert was written
+    db = SessionLocal()
+    try:
+        db.query(TouristProfile).all()
+    finally:
+        db.close()
+
+
+def main():
+    rng = random.Random(42)
+    reporter_id = seed_tourists(engine, [CENTER])[0]
+    seed_tourists(engine, [random_point_near(*CENTER, RADIUS_KM * 0.9, rng) for _ in range(100)])
+    total = 101
+
+    print("nearby=100")
+    print(f"{'total':>8} {'indexed fan-out ms':>20} {'full scan ms':>14}")
+    for target in (1_000, 10_000, 100_000):
+        seed_tourists(engine, far_points(target - total, rng))
+        total = target
+        print(f"{total:>8} {measure(lambda: run_fanout(reporter_id)):>20.1f} {measure(run_full_scan, 3):>14.1f}")
+
+    print(f"\ntotal~{total}")
+    print(f"{'nearby':>8} {'indexed fan-out ms':>20}")
+    nearby = 100
+    for target in (100, 1_000, 5_000):
+        seed_tourists(engine, [random_point_near(*CENTER, RADIUS_KM * 0.9, rng) for _ in range(target - nearby)])
+        nearby = target
+        print(f"{nearby:>8} {measure(lambda: run_fanout(reporter_id)):>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Location heartbeats: in-memory store with batched flushes versus one
+database write per ping.
+
+    python -m benchmarks.bench_heartbeat
+
+- store: LocationStore.update() calls per second, the ceiling of the path;
+- http: heartbeats per second through the FastAPI app in-process (httpx
+  ASGITransport), against PUT /location, which writes every ping;
+- flush: time to upsert TOURISTS changed positions in batches.
+After the flush every tourist's row must hold their last heartbeat.
+"""
+import asyncio
+import logging
+import random
+import time
+
+from benchmarks.common import random_point_near, seed_tourists, use_database
+
+engine = use_database("heartbeat")
+# Per-ping commits on SQLite trip the slow-query log; the numbers below tell the story
+logging.getLogger("app.query_profiler").setLevel(logging.ERROR)
+
+import httpx  # noqa: E402
+
+from app.location_store import LocationStore  # noqa: E402
+from app.models import TouristLocation  # noqa: E402
+from benchmarks.synthetic import CENTER, SPREAD_KM  # noqa: E402
+
+TOURISTS = 20_000
+STORE_UPDATES = 500_000
+HTTP_PINGS = 5_000
+HTTP_TOURISTS = 1_000  # each pinged once before timing, so the timed pings hit known tourists
+CONCURRENCY = 16
+
+
+def bench_store(tourist_ids, rng):
+    store = LocationStore(capacity=len(tourist_ids))
+    points = [random_point_near(*CENTER, SPREAD_KM, rng) for _ in range(1000)]
+    start = time.perf_counter()
+    for index in range(STORE_UPDATES):
+        store.update(tourist_ids[index % len(tourist_ids)], *points[index % len(points)])
+    return STORE_UPDATES / (time.perf_counter() - start)
+
+
+async def bench_http(app, tourist_ids, method, path, rng):
+    points = [random_point_near(*CENTER, SPREAD_KM, rng) for _ in range(1000)]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(offset, count):
+            for index in range(offset, count, CONCURRENCY):
+                lat, lon = points[index % len(points)]
+                response = await client.request(method, path.format(tourist_ids[index % HTTP_TOURISTS]),
+                                                json={"latitude": lat, "longitude": lon})
+                assert response.status_code < 300, response.text
+
+        await asyncio.gather(*(worker(offset, HTTP_TOURISTS) for offset in range(CONCURRENCY)))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(offset, HTTP_PINGS) for offset in range(CONCURRENCY)))
+        return HTTP_PINGS / (time.perf_counter() - start)
+
+
+def main():
+    rng = random.Random(1)
+    tourist_ids = seed_tourists(engine, [random_point_near(*CENTER, SPREAD_KM, rng) for _ in range(TOURISTS)])
+
+    print(f"store: {bench_store(tourist_ids, rng):,.0f} updates/s")
+
+    from app.location_store import location_store
+    from app.main import app
+    heartbeat = asyncio.run(bench_http(app, tourist_ids, "POST", "/api/tourist/location/{}/heartbeat", rng))
+    put = asyncio.run(bench_http(app, tourist_ids, "PUT", "/api/tourist/location/{}", rng))
+    print(f"http: {heartbeat:,.0f} heartbeats/s vs {put:,.0f} PUT /location/s (one commit per ping)")
+
+    expected = {}
+    for tourist_id in tourist_ids:
+        lat, lon = random_point_near(*CENTER, SPREAD_KM, rng)
+        location_store.update(tourist_id, lat, lon)
+        expected[tourist_id] = (lat, lon)
+    start = time.perf_counter()
+    flushed = location_store.flush()
+    print(f"flush: {flushed:,} positions in {time.perf_counter() - start:.2f}s")
+
+    with engine.connect() as conn:
+        stored = {row.tourist_id: (row.latitude, row.longitude) for row in conn.execute(TouristLocation.__table__.select())}
+    wrong = sum(stored.get(tourist_id) != position for tourist_id, position in expected.items())
+    print(f"check: {wrong} tourists without their last heartbeat")
+
+
+if __name__ == "__main__":
+    main()
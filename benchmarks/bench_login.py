@@ -0,0 +1,83 @@
+"""
+Login throughput at several concurrency levels, with bcrypt in the process
+pool versus inline on the request thread.
+
+    python -m benchmarks.bench_login
+    BCRYPT_ROUNDS=12 PASSWORD_HASH_QUEUE_LIMIT=64 python -m benchmarks.bench_login
+
+Requests beyond PASSWORD_HASH_QUEUE_LIMIT are rejected with 503 in pool mode;
+the "503s" column shows how many, and latency percentiles cover the
+successful logins only.
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+
+from benchmarks.common import bench_email, percentile, seed_tourists, use_database  # noqa: E402
+
+engine = use_database("login")
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.routes import auth  # noqa: E402
+from app.utils import PasswordHasher, hash_password  # noqa: E402
+
+PASSWORD = "bench-password"
+LOGINS_PER_LEVEL = int(os.getenv("BENCH_LOGINS", "48"))
+CONCURRENCY = (1, 4, 16, 64)
+
+
+def seed_users(count):
+    tourist_ids = seed_tourists(engine, [(28.6, 77.2)] * count, password_hash=hash_password(PASSWORD))
+    return [bench_email(tourist_id) for tourist_id in tourist_ids]
+
+
+async def run_level(client, emails, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, rejected = [], 0
+
+    async def login(email):
+        nonlocal rejected
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+            if response.status_code == 503:
+                rejected += 1
+            else:
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(email) for email in emails))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies, rejected
+
+
+async def main():
+    emails = seed_users(LOGINS_PER_LEVEL)
+    cores = os.cpu_count() or 1
+    modes = {
+        f"pool ({cores} procs)": PasswordHasher(workers=cores),
+        "inline": PasswordHasher(workers=0, max_pending=10_000),
+    }
+
+    print(f"bcrypt rounds={os.environ['BCRYPT_ROUNDS']}, {LOGINS_PER_LEVEL} logins per level")
+    print(f"{'mode':<16} {'concurrency':>11} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'503s':>5}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, hasher in modes.items():
+            auth.password_hasher = hasher
+            hasher.start()
+            await client.post("/api/auth/login", json={"email": emails[0], "password": PASSWORD})  # warm up
+            for concurrency in CONCURRENCY:
+                throughput, latencies, rejected = await run_level(client, emails, concurrency)
+                print(f"{name:<16} {concurrency:>11} {throughput:>9.1f} {percentile(latencies, 50):>8.1f} "
+                      f"{percentile(latencies, 99):>8.1f} {rejected:>5}")
+            hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
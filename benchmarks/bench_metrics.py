@@ -0,0 +1,98 @@
+"""
+Per-request overhead of MetricsMiddleware.
+
+    python -m benchmarks.bench_metrics
+
+Two measurements:
+
+- raw: the middleware around a bare ASGI app that answers at once, so the
+  difference is the middleware's own cost per request;
+- app: a small FastAPI app with a path-parameter route called in-process
+  through httpx's ASGITransport, with and without the middleware, to show
+  that cost next to the framework's own per-request work.
+"""
+import asyncio
+import time
+
+from benchmarks.common import use_database
+
+use_database("metrics")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.metrics import MetricsMiddleware, RequestMetrics  # noqa: E402
+
+RAW_REQUESTS = 200_000
+APP_REQUESTS = 5_000
+ROUNDS = 5
+
+
+class FakeRoute:
+    path = "/api/tourist/profile/{user_id}"
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = FakeRoute
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+async def time_raw(app, count):
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    request = {"type": "http.request", "body": b"", "more_body": False}
+
+    async def receive():
+        return request
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def make_app(instrumented):
+    app = FastAPI()
+
+    @app.get("/profile/{user_id}")
+    async def profile(user_id: str):
+        return {"user_id": user_id, "safety_score": 100}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+    return app
+
+
+async def time_app(app, count):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/profile/warmup")
+        start = time.perf_counter()
+        for index in range(count):
+            await client.get(f"/profile/{index}")
+        return time.perf_counter() - start
+
+
+def best_of(fn, *args):
+    return min(asyncio.run(fn(*args)) for _ in range(ROUNDS))
+
+
+def main():
+    bare = best_of(time_raw, bare_app, RAW_REQUESTS)
+    wrapped = best_of(time_raw, MetricsMiddleware(bare_app, RequestMetrics()), RAW_REQUESTS)
+    overhead_us = (wrapped - bare) / RAW_REQUESTS * 1e6
+    print(f"raw: {bare / RAW_REQUESTS * 1e6:.2f} us/request bare, {wrapped / RAW_REQUESTS * 1e6:.2f} us/request "
+          f"with metrics -> {overhead_us:.2f} us overhead")
+
+    plain = best_of(time_app, make_app(False), APP_REQUESTS)
+    instrumented = best_of(time_app, make_app(True), APP_REQUESTS)
+    print(f"app: {plain / APP_REQUESTS * 1e6:.1f} us/request without metrics, "
+          f"{instrumented / APP_REQUESTS * 1e6:.1f} us/request with metrics "
+          f"({(instrumented - plain) / plain:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Batch point-in-zone checks: vectorised index versus a per-pair Python loop.
+
+    python -m benchmarks.bench_risk_zones
+
+Zones (50-1000 m radius) and points are scattered over a city-sized area
+around Delhi, the worst case for the latitude band since every zone sits in
+the same narrow range of latitudes. The Python loop is only timed for the
+smaller sizes.
+"""
+import random
+
+from benchmarks.common import measure, random_point_near, use_database
+
+use_database("risk_zones")
+
+from app.geo import haversine_km  # noqa: E402
+from app.risk_zones import ZoneArrays, match_points  # noqa: E402
+
+CENTER = (28.6139, 77.2090)
+SIZES = ((1_000, 1_000), (5_000, 5_000), (20_000, 5_000), (100_000, 10_000))
+
+
+def make_zones(count, rng):
+    zones = []
+    for index in range(count):
+        lat, lon = random_point_near(*CENTER, 25, rng)
+        zones.append({"id": f"rz-{index}", "name": "Bench zone", "latitude": lat, "longitude": lon,
+                      "radius_meters": rng.randint(50, 1000), "risk_level": "High"})
+    return ZoneArrays(zones, version=None)
+
+
+def python_loop(arrays, points):
+    hits = 0
+    for lat, lon in points:
+        for zone in arrays.zones:
+            if haversine_km(lat, lon, zone["latitude"], zone["longitude"]) * 1000 <= zone["radius_meters"]:
+                hits += 1
+    return hits
+
+
+def main():
+    rng = random.Random(11)
+    print(f"{'points':>8} {'zones':>7} {'index ms':>9} {'python ms':>10} {'hits':>7}")
+    for point_count, zone_count in SIZES:
+        arrays = make_zones(zone_count, rng)
+        points = [random_point_near(*CENTER, 25, rng) for _ in range(point_count)]
+        latitudes, longitudes = zip(*points)
+        index_ms = measure(lambda: match_points(arrays, latitudes, longitudes), 3)
+        hits = len(match_points(arrays, latitudes, longitudes)[0])
+        loop_ms = measure(lambda: python_loop(arrays, points), 1) if point_count * zone_count <= 1_000_000 else None
+        loop = f"{loop_ms:>10.1f}" if loop_ms is not None else f"{'-':>10}"
+        print(f"{point_count:>8} {zone_count:>7} {index_ms:>9.1f} {loop} {hits:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+CPU per request of a 10k-incident list response: per-row Pydantic models
+versus plain rows and one JSON encoding pass (app/responses.py).
+
+    python -m benchmarks.bench_serialization
+
+Both paths are FastAPI endpoints called in-process through httpx's
+ASGITransport and timed with process_time, so the numbers are CPU only:
+- serialize: rows already in memory, so only response building is timed
+  (the old path gets ORM objects, the new one plain rows);
+- with query: the endpoint also runs its query against the seeded database
+  (ORM entities versus the listing columns).
+The two bodies are checked to be byte-identical before timing.
+"""
+import asyncio
+import random
+import time
+from typing import List
+
+from benchmarks.common import random_point_near, seed_tourists, use_database
+
+engine = use_database("serialization")
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.database import SessionLocal, get_db  # noqa: E402
+from app.models import Incident  # noqa: E402
+from app.responses import FastJSONResponse, incident_items, incident_listing_query  # noqa: E402
+from app.schemas import IncidentResponse  # noqa: E402
+from benchmarks.synthetic import CENTER, SPREAD_KM, seed_incident_mix  # noqa: E402
+
+INCIDENTS = 10_000
+REQUESTS = 20
+ROUNDS = 3
+
+
+def legacy_items(incidents):
+    # What the list endpoints did before: a model per row, validated again by response_model
+    return [
+        IncidentResponse(
+            incident_id=str(incident.incident_id),
+            title=incident.title,
+            description=incident.description,
+            category=incident.category,
+            latitude=incident.latitude,
+            longitude=incident.longitude,
+            status=incident.status,
+            priority=incident.priority,
+            created_at=incident.created_at
+        ) for incident in incidents
+    ]
+
+
+def make_app():
+    app = FastAPI()
+    db = SessionLocal()
+    entities = db.query(Incident).order_by(Incident.created_at.desc()).all()
+    rows = incident_listing_query(db).order_by(Incident.created_at.desc()).all()
+
+    @app.get("/serialize/legacy", response_model=List[IncidentResponse])
+    def serialize_legacy():
+        return legacy_items(entities)
+
+    @app.get("/serialize/fast", response_model=List[IncidentResponse])
+    def serialize_fast():
+        return FastJSONResponse(incident_items(rows))
+
+    @app.get("/query/legacy", response_model=List[IncidentResponse])
+    def query_legacy(db: Session = Depends(get_db)):
+        return legacy_items(db.query(Incident).order_by(Incident.created_at.desc()).all())
+
+    @app.get("/query/fast", response_model=List[IncidentResponse])
+    def query_fast(db: Session = Depends(get_db)):
+        return FastJSONResponse(incident_items(incident_listing_query(db).order_by(Incident.created_at.desc()).all()))
+
+    return app
+
+
+async def cpu_per_request(app, path):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get(path)
+        start = time.process_time()
+        for _ in range(REQUESTS):
+            await client.get(path)
+        return (time.process_time() - start) / REQUESTS
+
+
+async def bodies(app, *paths):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        return [(await client.get(path)).content for path in paths]
+
+
+def main():
+    rng = random.Random(1)
+    points = [random_point_near(*CENTER, SPREAD_KM, rng) for _ in range(200)]
+    tourist_ids = seed_tourists(engine, points)
+    seed_incident_mix(engine, dict(zip(tourist_ids, points)), INCIDENTS, 0, rng)
+
+    app = make_app()
+    legacy, fast = asyncio.run(bodies(app, "/serialize/legacy", "/serialize/fast"))
+    assert legacy == fast, "fast path output differs from the response_model output"
+    print(f"{INCIDENTS} incidents, {len(fast) / 1e6:.1f} MB body")
+
+    for name in ("serialize", "query"):
+        old = min(asyncio.run(cpu_per_request(app, f"/{name}/legacy")) for _ in range(ROUNDS))
+        new = min(asyncio.run(cpu_per_request(app, f"/{name}/fast")) for _ in range(ROUNDS))
+        print(f"{name:<10} legacy {old * 1000:7.1f} ms CPU/request, fast {new * 1000:7.1f} ms "
+              f"-> {(old - new) * 1000:.1f} ms saved ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
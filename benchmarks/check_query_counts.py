@@ -0,0 +1,65 @@
+"""
+Query-count regression check for the listing and detail endpoints.
+
+    python -m benchmarks.check_query_counts
+
+Every endpoint is called against a small and a large data set; the
+check fails (exit status 1) if an endpoint issues more than MAX_STATEMENTS
+SQL statements or if its statement count grows with the number of rows,
+which is how an N+1 lookup shows up.
+"""
+import sys
+
+from benchmarks.common import count_statements, seed_incidents, seed_tourists, use_database
+
+engine = use_database("query_counts")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+MAX_STATEMENTS = 3
+SIZES = (5, 500)
+
+
+def endpoints_to_check(reporter_id, tourist_id, incident_id):
+    return [
+        f"/api/tourist/incidents/{reporter_id}",
+        f"/api/tourist/alerts/{tourist_id}",
+        "/api/authority/incidents",
+        "/api/authority/incidents/status/Active",
+        "/api/authority/alerts",
+        f"/api/authority/incidents/{incident_id}/details",
+    ]
+
+
+def main():
+    client = TestClient(app)
+    reporter_id, tourist_id = seed_tourists(engine, [(28.61, 77.21), (28.62, 77.20)])
+    seed_incidents(engine, reporter_id, 1)
+    incident_id = client.get("/api/authority/incidents?limit=1").json()[0]["incident_id"]
+    endpoints = endpoints_to_check(reporter_id, tourist_id, incident_id)
+
+    counts = {endpoint: [] for endpoint in endpoints}
+    seeded = 1
+    for size in SIZES:
+        seed_incidents(engine, reporter_id, size - seeded, alerts_for=[tourist_id])
+        seeded = size
+        for endpoint in endpoints:
+            with count_statements(engine) as statements:
+                response = client.get(endpoint)
+            response.raise_for_status()
+            counts[endpoint].append(statements[0])
+
+    failures = 0
+    for endpoint, per_size in counts.items():
+        ok = max(per_size) <= MAX_STATEMENTS and len(set(per_size)) == 1
+        failures += not ok
+        sizes = ", ".join(f"{size} rows: {count}" for size, count in zip(SIZES, per_size))
+        print(f"{'ok  ' if ok else 'FAIL'} {endpoint} ({sizes})")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
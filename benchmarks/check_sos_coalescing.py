@@ -0,0 +1,128 @@
+"""
+Check that coalesced SOS repeats never lose the latest message or position.
+
+    python -m benchmarks.check_sos_coalescing
+
+- repeat: a second SOS right after the first (inside SOS_COALESCE_UPDATE_SECONDS)
+  must leave its message and position on the incident;
+- identical: the same SOS again writes nothing;
+- before commit: a repeat that arrives while the first SOS is still being
+  created waits for its commit and is then written; if the creation fails
+  the repeat creates the incident instead; an update that never commits is
+  not remembered, so its repeat is written again.
+Exits with status 1 if any check fails.
+"""
+import sys
+import threading
+import uuid
+
+from benchmarks.common import seed_tourists, use_database
+
+engine = use_database("sos_coalescing")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Incident  # noqa: E402
+from app.sos import CREATE, UPDATE, sos_coalescer  # noqa: E402
+
+FIRST = (28.6139, 77.2090)
+SECOND = (28.6145, 77.2095)  # about 80 m away, inside SOS_COALESCE_RADIUS_METERS
+
+
+def incident_state(incident_id):
+    db = SessionLocal()
+    try:
+        incident = db.get(Incident, uuid.UUID(str(incident_id)))
+        return incident.description, (incident.latitude, incident.longitude), incident.updated_at
+    finally:
+        db.close()
+
+
+def sos(client, tourist_id, message, point):
+    response = client.post(f"/api/tourist/sos?tourist_id={tourist_id}",
+                           json={"message": message, "latitude": point[0], "longitude": point[1]})
+    response.raise_for_status()
+    return response.json()
+
+
+def check_repeat(client, tourist_id):
+    first = sos(client, tourist_id, "help", FIRST)
+    second = sos(client, tourist_id, "help2", SECOND)
+    description, position, updated_at = incident_state(first["incident_id"])
+    yield "repeat joins the incident", second["incident_id"] == first["incident_id"] and second["coalesced"]
+    yield "repeat message is stored", description == "help2"
+    yield "repeat position is stored", position == SECOND
+
+    third = sos(client, tourist_id, "help2", SECOND)
+    yield "identical repeat writes nothing", third["coalesced"] and incident_state(first["incident_id"])[2] == updated_at
+
+
+def repeat_in_background(tourist_id, message, point):
+    # A second client; returns the thread and where its response lands
+    result = {}
+
+    def run():
+        result.update(sos(TestClient(app), tourist_id, message, point))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def check_before_commit(tourist_id):
+    window, action = sos_coalescer.admit(tourist_id, FIRST, "trapped")
+    db = SessionLocal()
+    try:
+        # The creating request has not committed when the repeat arrives
+        db.add(Incident(incident_id=window.incident_id, tourist_id=tourist_id, title="SOS Alert",
+                        description="trapped", category="Emergency", latitude=FIRST[0], longitude=FIRST[1],
+                        priority="Critical"))
+        thread, repeat = repeat_in_background(tourist_id, "trapped, water rising", SECOND)
+        thread.join(0.5)
+        waited = thread.is_alive() and not repeat
+        db.commit()
+        sos_coalescer.confirm(window)
+        thread.join()
+    finally:
+        db.close()
+    description, position, _ = incident_state(window.incident_id)
+    yield "first SOS creates", action == CREATE
+    yield "early repeat waits for the commit", waited
+    yield "early repeat joins the incident", repeat.get("incident_id") == str(window.incident_id)
+    yield "early repeat message is stored", description == "trapped, water rising"
+    yield "early repeat position is stored", position == SECOND
+    _, later_action = sos_coalescer.admit(tourist_id, FIRST, "moved back")
+    yield "later repeat updates", later_action == UPDATE
+    # That update was never committed, so the same SOS must be written again
+    _, retry_action = sos_coalescer.admit(tourist_id, FIRST, "moved back")
+    yield "failed update is not remembered", retry_action == UPDATE
+
+
+def check_failed_create(tourist_id):
+    window, _ = sos_coalescer.admit(tourist_id, FIRST, "lost")
+    thread, repeat = repeat_in_background(tourist_id, "still lost", SECOND)
+    thread.join(0.5)
+    # The creating request fails before its commit
+    sos_coalescer.discard(tourist_id, window)
+    thread.join()
+    yield "repeat after a failed create raises a new incident", (
+        repeat.get("coalesced") is False and repeat.get("incident_id") != str(window.incident_id)
+    )
+    yield "its message is stored", incident_state(repeat["incident_id"])[0] == "still lost"
+
+
+def main():
+    client = TestClient(app)
+    first_tourist, second_tourist, third_tourist = seed_tourists(engine, [FIRST, FIRST, FIRST])
+    failures = 0
+    checks = [*check_repeat(client, first_tourist), *check_before_commit(second_tourist),
+              *check_failed_create(third_tourist)]
+    for name, ok in checks:
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
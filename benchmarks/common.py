@@ -0,0 +1,171 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run benchmarks from the repository root, e.g. ``python -m benchmarks.bench_fanout``.
+They use a throwaway SQLite file unless BENCH_DATABASE_URL points at a scratch
+Postgres database. Never point it at a database holding real data.
+"""
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 5000
+
+
+def use_database(name):
+    """Point the app at a scratch database and create the schema. Call before importing app modules."""
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(prefix="saarthi-bench-"), f"{name}.db")
+        url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    from app.database import Base, engine
+    import app.models  # noqa: F401  (registers tables)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def random_point_near(latitude, longitude, radius_km, rng=random):
+    """Uniform random point within radius_km of (latitude, longitude)."""
+    distance = radius_km * math.sqrt(rng.random())
+    bearing = rng.random() * 2 * math.pi
+    d_lat = distance * math.cos(bearing) / 111.32
+    d_lon = distance * math.sin(bearing) / (111.32 * math.cos(math.radians(latitude)))
+    return latitude + d_lat, longitude + d_lon
+
+
+def bench_email(user_id):
+    # A domain EmailStr accepts, so seeded users can log in
+    return f"{user_id.hex}@bench.example.com"
+
+
+def seed_tourists(engine, points, password_hash="x"):
+    """Insert one user/profile/location per (lat, lon) point, return the tourist ids."""
+    from app.models import TouristLocation, TouristProfile, User
+
+    ids = []
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, len(points), CHUNK_SIZE):
+            chunk = points[start:start + CHUNK_SIZE]
+            users, profiles, locations = [], [], []
+            for lat, lon in chunk:
+                tourist_id = uuid.uuid4()
+                ids.append(tourist_id)
+                users.append({"user_id": tourist_id, "email": bench_email(tourist_id),
+                              "password_hash": password_hash, "user_type": "tourist", "created_at": now})
+                profiles.append({"tourist_id": tourist_id, "full_name": "Bench Tourist", "document_type": "Passport",
+                                 "document_number": "0000", "nationality": "IN", "trip_start": date.today(),
+                                 "trip_end": date.today(), "safety_score": 100, "created_at": now})
+                locations.append({"tourist_id": tourist_id, "latitude": lat, "longitude": lon, "updated_at": now})
+            conn.execute(User.__table__.insert(), users)
+            conn.execute(TouristProfile.__table__.insert(), profiles)
+            conn.execute(TouristLocation.__table__.insert(), locations)
+    return ids
+
+
+def seed_authorities(engine, count, password_hash="x"):
+    """Insert count authority users/profiles, return their ids."""
+    from app.models import AuthorityProfile, User
+
+    ids = [uuid.uuid4() for _ in range(count)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, count, CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            conn.execute(User.__table__.insert(), [
+                {"user_id": authority_id, "email": bench_email(authority_id), "password_hash": password_hash,
+                 "user_type": "authority", "created_at": now} for authority_id in chunk
+            ])
+            conn.execute(AuthorityProfile.__table__.insert(), [
+                {"authority_id": authority_id, "full_name": "Bench Officer", "department": "Tourist Police",
+                 "created_at": now} for authority_id in chunk
+            ])
+    return ids
+
+
+def measure(fn, repeat=5):
+    """Run fn repeat times and return the median wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def seed_incidents(engine, reporter_id, count, alerts_for=()):
+    """Insert count incidents reported by reporter_id, each alerting every tourist in alerts_for."""
+    from app.models import Alert, Incident
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, count, CHUNK_SIZE):
+            incidents, alerts = [], []
+            for offset in range(start, min(count, start + CHUNK_SIZE)):
+                incident_id = uuid.uuid4()
+                created_at = now - timedelta(seconds=offset)
+                incidents.append({"incident_id": incident_id, "tourist_id": reporter_id, "title": "Bench incident",
+                                  "description": "Synthetic incident", "category": "Theft",
+                                  "latitude": 28.6139, "longitude": 77.2090, "status": "Active",
+                                  "priority": "Medium", "created_at": created_at, "updated_at": created_at})
+                for tourist_id in alerts_for:
+                    alerts.append({"alert_id": uuid.uuid4(), "incident_id": incident_id, "tourist_id": tourist_id,
+                                   "distance_km": 1.0, "is_read": False, "created_at": created_at})
+            conn.execute(Incident.__table__.insert(), incidents)
+            if alerts:
+                conn.execute(Alert.__table__.insert(), alerts)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1] if len(values) > 1 else values[0]
+
+
+def start_server(port, env=None, workers=1):
+    """Run the app under uvicorn in a subprocess and wait until /health answers."""
+    import httpx
+
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    server = subprocess.Popen(command, cwd=ROOT, env=dict(os.environ, **(env or {})))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+@contextmanager
+def count_statements(engine):
+    """Count SQL statements sent to the database inside the block: ``with count_statements(engine) as n: ...; n[0]``."""
+    from sqlalchemy import event
+
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,284 @@
+"""
+Load test: seed a synthetic data set, then drive the real app under uvicorn
+through scripted scenarios and report throughput and latency per endpoint.
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --scenarios login,dashboard --duration 30 --concurrency 64
+    python -m benchmarks.load_test --json results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.load_test --compare results/main.json --tolerance 0.2
+
+Scenarios:
+    registration  burst of new tourist registrations
+    login         login storm by seeded tourists and authorities
+    sos           SOS requests, then the time for the fan-out backlog to drain
+    dashboard     authority feeds, statistics and incident details
+    alerts        tourists polling their alert feeds
+
+Each scenario runs for --duration seconds with --concurrency clients in one
+uvicorn server (--workers processes). --json writes the results with the
+commit, data set and settings; --compare prints the change against such a
+file and exits with status 1 when an endpoint's p95 latency or throughput is
+worse by more than --tolerance. Use BENCH_DATABASE_URL with a scratch
+Postgres database for production-like numbers; SQLite serialises writers.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+os.environ.setdefault("BCRYPT_ROUNDS", "10")  # server and seeded hashes must agree, or logins rehash
+
+from benchmarks.common import ROOT, percentile, random_point_near, start_server, use_database  # noqa: E402
+from benchmarks.synthetic import CENTER, SPREAD_KM, add_size_arguments, generate  # noqa: E402
+
+import httpx  # noqa: E402
+
+# Bulk seeding inserts trip the slow-query log in this process; the server still logs its own
+logging.getLogger("app.query_profiler").setLevel(logging.ERROR)
+
+SCENARIOS = ("registration", "login", "sos", "dashboard", "alerts")
+FANOUT_DRAIN_TIMEOUT_SECONDS = 300
+
+
+# ----------------------
+# Scenarios
+# ----------------------
+# Each returns a function that picks the next request: (endpoint label, method, path, JSON body)
+def registration(dataset):
+    def next_request(rng):
+        body = {
+            "email": f"load-{uuid.uuid4().hex}@bench.example.com", "password": dataset["password"],
+            "full_name": "Load Test", "document_type": "Passport", "document_number": "0000",
+            "nationality": "IN", "trip_start": "2026-01-01", "trip_end": "2026-01-15",
+            "emergency_contact_name": "Contact", "emergency_contact_phone": "0000000000"
+        }
+        return "POST /api/auth/register/tourist", "POST", "/api/auth/register/tourist", body
+    return next_request
+
+
+def login(dataset):
+    def next_request(rng):
+        body = {"email": rng.choice(dataset["emails"]), "password": dataset["password"]}
+        return "POST /api/auth/login", "POST", "/api/auth/login", body
+    return next_request
+
+
+def sos(dataset):
+    def next_request(rng):
+        lat, lon = random_point_near(*CENTER, SPREAD_KM, rng)
+        path = f"/api/tourist/sos?tourist_id={rng.choice(dataset['tourist_ids'])}"
+        return "POST /api/tourist/sos", "POST", path, {"latitude": lat, "longitude": lon}
+    return next_request
+
+
+def dashboard(dataset):
+    def next_request(rng):
+        roll = rng.random()
+        if roll < 0.4:
+            return "GET /api/authority/incidents", "GET", "/api/authority/incidents?limit=50", None
+        if roll < 0.6:
+            return ("GET /api/authority/incidents/status/{status}", "GET",
+                    "/api/authority/incidents/status/Active?limit=50", None)
+        if roll < 0.8:
+            return "GET /api/authority/alerts", "GET", "/api/authority/alerts?limit=50", None
+        if roll < 0.9:
+            return "GET /api/authority/statistics/tourists", "GET", "/api/authority/statistics/tourists", None
+        path = f"/api/authority/incidents/{rng.choice(dataset['incident_ids'])}/details"
+        return "GET /api/authority/incidents/{incident_id}/details", "GET", path, None
+    return next_request
+
+
+def alerts(dataset):
+    def next_request(rng):
+        path = f"/api/tourist/alerts/{rng.choice(dataset['tourist_ids'])}"
+        return "GET /api/tourist/alerts/{tourist_id}", "GET", path, None
+    return next_request
+
+
+# ----------------------
+# Running
+# ----------------------
+async def run_scenario(base_url, next_request, concurrency, duration, seed):
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)  # endpoint -> status code (0 for transport errors)
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client, rng):
+        while time.monotonic() < deadline:
+            endpoint, method, path, body = next_request(rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            if 200 <= status < 300:
+                latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            else:
+                errors[endpoint][status] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, random.Random(seed * 1000 + index)) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    results = []
+    for endpoint in sorted(set(latencies) | set(errors)):
+        values = latencies[endpoint]
+        results.append({
+            "endpoint": endpoint,
+            "requests": len(values) + sum(errors[endpoint].values()),
+            "errors": sum(errors[endpoint].values()),
+            "error_statuses": {str(status): count for status, count in sorted(errors[endpoint].items())},
+            "throughput_rps": round(len(values) / elapsed, 2),
+            # None rather than NaN when nothing succeeded, so the report stays valid JSON
+            "p50_ms": round(percentile(values, 50), 2) if values else None,
+            "p95_ms": round(percentile(values, 95), 2) if values else None,
+            "p99_ms": round(percentile(values, 99), 2) if values else None,
+        })
+    return results
+
+
+def wait_for_fanout(base_url):
+    """Seconds until the SOS fan-out backlog is empty, or None on timeout."""
+    start = time.monotonic()
+    while time.monotonic() - start < FANOUT_DRAIN_TIMEOUT_SECONDS:
+        if httpx.get(f"{base_url}/api/authority/fanout/status?limit=1", timeout=30).json()["backlog"] == 0:
+            return round(time.monotonic() - start, 2)
+        time.sleep(0.2)
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------
+# Reporting
+# ----------------------
+def _ms(value):
+    return f"{value:>8.1f}" if value is not None else f"{'-':>8}"
+
+
+def print_results(results):
+    print(f"{'scenario':<13} {'endpoint':<52} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in results:
+        print(f"{row['scenario']:<13} {row['endpoint']:<52} {row['requests']:>8} {row['errors']:>6} "
+              f"{row['throughput_rps']:>8.1f} {_ms(row['p50_ms'])} {_ms(row['p95_ms'])} {_ms(row['p99_ms'])}")
+    for row in results:
+        if row["errors"]:
+            print(f"  {row['endpoint']} errors by status (0 = connection error): {row['error_statuses']}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Print changes against a previous --json report; return the number of regressions."""
+    with open(baseline_path) as baseline_file:
+        baseline = {(row["scenario"], row["endpoint"]): row for row in json.load(baseline_file)["results"]}
+
+    def change(new, old):
+        return (new - old) / old if old else 0.0
+
+    regressions = 0
+    print(f"\nAgainst {baseline_path} (tolerance {tolerance:.0%}):")
+    for row in results:
+        old = baseline.get((row["scenario"], row["endpoint"]))
+        if old is None:
+            print(f"  new   {row['scenario']} {row['endpoint']}")
+            continue
+        # p95 is None when nothing succeeded; the throughput change then carries the verdict
+        row_p95, old_p95 = row["p95_ms"] or 0.0, old["p95_ms"] or 0.0
+        p95 = change(row_p95, old_p95)
+        throughput = change(row["throughput_rps"], old["throughput_rps"])
+        worse = p95 > tolerance or throughput < -tolerance
+        regressions += worse
+        print(f"  {'WORSE' if worse else 'ok   '} {row['scenario']} {row['endpoint']}: "
+              f"p95 {old_p95:.1f} -> {row_p95:.1f} ms ({p95:+.0%}), "
+              f"{old['throughput_rps']:.1f} -> {row['throughput_rps']:.1f} req/s ({throughput:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with synthetic data.")
+    add_size_arguments(parser)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", dest="json_path", help="write machine-readable results here")
+    parser.add_argument("--compare", dest="baseline_path", help="previous --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    engine = use_database("load_test")
+    seed_start = time.perf_counter()
+    dataset = generate(engine, args.tourists, args.authorities, args.incidents, args.alerts_per_incident, args.seed)
+    print(f"Seeded {len(dataset['tourist_ids'])} tourists, {len(dataset['authority_ids'])} authorities, "
+          f"{len(dataset['incident_ids'])} incidents in {time.perf_counter() - seed_start:.1f}s")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.port, {"FANOUT_POLL_INTERVAL_SECONDS": "1"}, workers=args.workers)
+    results, extra = [], {}
+    try:
+        for index, name in enumerate(scenarios):
+            next_request = globals()[name](dataset)
+            for row in asyncio.run(run_scenario(base_url, next_request, args.concurrency, args.duration,
+                                                args.seed + index)):
+                results.append({"scenario": name, **row})
+            if name == "sos":
+                extra["sos_fanout_drain_seconds"] = wait_for_fanout(base_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_results(results)
+    for key, value in extra.items():
+        print(f"{key}: {value}")
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "database": engine.dialect.name,
+                "dataset": {"tourists": args.tourists, "authorities": args.authorities, "incidents": args.incidents,
+                            "alerts_per_incident": args.alerts_per_incident, "seed": args.seed},
+                "duration_seconds": args.duration,
+                "concurrency": args.concurrency,
+                "workers": args.workers,
+                "bcrypt_rounds": int(os.environ["BCRYPT_ROUNDS"]),
+            },
+            "results": results,
+            "extra": extra,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.json_path}")
+
+    if args.baseline_path and compare(results, args.baseline_path, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Synthetic data set for load tests: tourists, authorities, incidents and alerts.
+
+    python -m benchmarks.synthetic --tourists 10000 --incidents 50000
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.synthetic --alerts-per-incident 50
+
+Tourists are scattered within SPREAD_KM of the city centre. Each incident is
+reported by a random tourist at a random point, spread over the last
+HISTORY_DAYS, and alerts a sample of the tourists (distances are real). Every
+user gets the same password, so load tests can log in as anyone. Statistics
+counters and heatmap tiles are reconciled afterwards, since the bulk inserts
+bypass them.
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import (
+    CHUNK_SIZE,
+    bench_email,
+    random_point_near,
+    seed_authorities,
+    seed_tourists,
+    use_database,
+)
+
+PASSWORD = "bench-password"
+CENTER = (28.6139, 77.2090)
+SPREAD_KM = 10
+HISTORY_DAYS = 30
+CATEGORIES = ("Theft", "Harassment", "Medical", "Accident")
+STATUSES = (("Active", 0.7), ("Resolved", 0.3))
+PRIORITIES = (("Low", 0.3), ("Medium", 0.4), ("High", 0.2), ("Critical", 0.1))
+
+
+def _weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def seed_incident_mix(engine, tourists, count, alerts_per_incident, rng):
+    """Insert count incidents from random reporters, each alerting a random sample of tourists. Returns incident ids."""
+    from app.geo import haversine_km
+    from app.models import Alert, Incident
+
+    tourist_ids = list(tourists)
+    now = datetime.utcnow()
+    incident_ids = []
+    with engine.begin() as conn:
+        for start in range(0, count, CHUNK_SIZE):
+            incidents, alerts = [], []
+            for _ in range(min(CHUNK_SIZE, count - start)):
+                incident_id = uuid.uuid4()
+                incident_ids.append(incident_id)
+                lat, lon = random_point_near(*CENTER, SPREAD_KM, rng)
+                created_at = now - timedelta(seconds=rng.uniform(0, HISTORY_DAYS * 86400))
+                incidents.append({
+                    "incident_id": incident_id, "tourist_id": rng.choice(tourist_ids), "title": "Synthetic incident",
+                    "description": "Generated for load testing", "category": rng.choice(CATEGORIES),
+                    "latitude": lat, "longitude": lon, "status": _weighted(rng, STATUSES),
+                    "priority": _weighted(rng, PRIORITIES), "created_at": created_at, "updated_at": created_at
+                })
+                for tourist_id in rng.sample(tourist_ids, min(alerts_per_incident, len(tourist_ids))):
+                    t_lat, t_lon = tourists[tourist_id]
+                    alerts.append({
+                        "alert_id": uuid.uuid4(), "incident_id": incident_id, "tourist_id": tourist_id,
+                        "distance_km": round(haversine_km(lat, lon, t_lat, t_lon), 3),
+                        "is_read": False, "created_at": created_at
+                    })
+            conn.execute(Incident.__table__.insert(), incidents)
+            if alerts:
+                conn.execute(Alert.__table__.insert(), alerts)
+    return incident_ids
+
+
+def generate(engine, tourists=2_000, authorities=20, incidents=5_000, alerts_per_incident=10, seed=1):
+    """
+    Seed the database behind engine and return what load tests need to
+    address it: {"tourist_ids", "authority_ids", "emails", "incident_ids", "password"}.
+    """
+    from app.database import SessionLocal
+    from app.heatmap import reconcile as reconcile_heatmap
+    from app.statistics import reconcile
+    from app.utils import hash_password
+
+    rng = random.Random(seed)
+    password_hash = hash_password(PASSWORD)
+    points = [random_point_near(*CENTER, SPREAD_KM, rng) for _ in range(tourists)]
+    tourist_ids = seed_tourists(engine, points, password_hash=password_hash)
+    authority_ids = seed_authorities(engine, authorities, password_hash=password_hash)
+    incident_ids = seed_incident_mix(engine, dict(zip(tourist_ids, points)), incidents, alerts_per_incident, rng)
+
+    db = SessionLocal()
+    try:
+        reconcile(db)
+        reconcile_heatmap(db)
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "tourist_ids": tourist_ids,
+        "authority_ids": authority_ids,
+        "emails": [bench_email(user_id) for user_id in tourist_ids + authority_ids],
+        "incident_ids": incident_ids,
+        "password": PASSWORD,
+    }
+
+
+def add_size_arguments(parser):
+    parser.add_argument("--tourists", type=int, default=2_000)
+    parser.add_argument("--authorities", type=int, default=20)
+    parser.add_argument("--incidents", type=int, default=5_000)
+    parser.add_argument("--alerts-per-incident", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_size_arguments(parser)
+    args = parser.parse_args()
+    engine = use_database("synthetic")
+    dataset = generate(engine, args.tourists, args.authorities, args.incidents, args.alerts_per_incident, args.seed)
+    print(f"Seeded {engine.url.render_as_string(hide_password=True)}: {len(dataset['tourist_ids'])} tourists, "
+          f"{len(dataset['authority_ids'])} authorities, {len(dataset['incident_ids'])} incidents, "
+          f"{len(dataset['incident_ids']) * min(args.alerts_per_incident, args.tourists)} alerts; "
+          f"password {PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    main()
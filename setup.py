@@ -50,8 +50,9 @@ def install_dependencies():
 def run_migrations():
     """Run database migrations"""
     print("🔄 Running database migrations...")
-    # Since we're using SQLAlchemy with create_all, migrations are automatic
-    print("✅ Database tables will be created automatically on first run")
+    # Tables are created and versioned migrations (app/migrations.py) applied on startup
+    print("✅ Database tables and migrations will be applied automatically on first run")
+    print("   To migrate without starting the server: python -m app.migrations")
 
 def start_server():
     """Start the FastAPI server"""